@@ -1,15 +1,16 @@
 import requests
 import os
-import time
 from typing import Optional, Dict
-from dotenv import load_dotenv
 
-load_dotenv()
+from config import load_env
+from metrics import throttle_sleep, track_api_call
+from rate_limiter import get_rate_limiter
 
 class ArmadoClient:
     """Client pour interagir avec l'API Armado"""
     
     def __init__(self):
+        load_env()
         self.api_key = os.getenv('ARMADO_API_KEY')
         if not self.api_key:
             raise ValueError("ARMADO_API_KEY non définie dans les variables d'environnement")
@@ -17,6 +18,7 @@ class ArmadoClient:
         self.base_url = os.getenv('ARMADO_BASE_URL', 'https://api.myarmado.fr')
         self.timeout = int(os.getenv('ARMADO_TIMEOUT', '10'))
         self.max_retries = 3
+        self.rate_limiter = get_rate_limiter('armado')
         
         self.headers = {
             'ApiKey': self.api_key,
@@ -29,13 +31,16 @@ class ArmadoClient:
         """
         for attempt in range(self.max_retries):
             try:
-                response = requests.request(
-                    method=method,
-                    url=url,
-                    headers=self.headers,
-                    timeout=self.timeout,
-                    **kwargs
-                )
+                self.rate_limiter.acquire()
+                with track_api_call('armado', method.lower(), attempt=attempt + 1) as call:
+                    response = requests.request(
+                        method=method,
+                        url=url,
+                        headers=self.headers,
+                        timeout=self.timeout,
+                        **kwargs
+                    )
+                    call.status = response.status_code
                 
                 # Si c'est un succès ou une erreur client (4xx), on retourne directement
                 if response.status_code < 500:
@@ -45,7 +50,7 @@ class ArmadoClient:
                 if attempt < self.max_retries - 1:
                     wait_time = 0.5 * (2 ** attempt)  # 0.5s, 1s, 2s
                     print(f"[Armado] Erreur {response.status_code}, retry dans {wait_time}s (tentative {attempt + 1}/{self.max_retries})")
-                    time.sleep(wait_time)
+                    throttle_sleep(wait_time, 'armado_retry')
                 else:
                     print(f"[Armado] Erreur {response.status_code} après {self.max_retries} tentatives")
                     return response
@@ -54,7 +59,7 @@ class ArmadoClient:
                 if attempt < self.max_retries - 1:
                     wait_time = 0.5 * (2 ** attempt)
                     print(f"[Armado] Erreur de connexion: {e}, retry dans {wait_time}s (tentative {attempt + 1}/{self.max_retries})")
-                    time.sleep(wait_time)
+                    throttle_sleep(wait_time, 'armado_retry')
                 else:
                     print(f"[Armado] Erreur de connexion après {self.max_retries} tentatives: {e}")
                     raise
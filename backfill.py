@@ -0,0 +1,132 @@
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, time, timedelta
+from typing import Callable, List, Set, Tuple
+
+Partition = Tuple[datetime, datetime]
+
+def parse_date(value: str) -> date:
+    """Parse une date AAAA-MM-JJ (argument de ligne de commande)"""
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def split_partitions(since: date, until: date, granularity: str = 'day') -> List[Partition]:
+    """
+    Découpe l'intervalle [since, until] (bornes incluses) en partitions
+
+    Args:
+        since: Premier jour
+        until: Dernier jour (inclus)
+        granularity: 'day' ou 'week'
+
+    Returns:
+        Liste de (début inclus, fin exclue) en heure locale
+    """
+    if granularity not in ('day', 'week'):
+        raise ValueError(f"Granularité inconnue: {granularity} (attendu: day ou week)")
+    if until < since:
+        raise ValueError("La date de fin doit être postérieure à la date de début")
+
+    step = timedelta(days=1 if granularity == 'day' else 7)
+    end_day = until + timedelta(days=1)
+
+    partitions = []
+    current = since
+    while current < end_day:
+        next_day = min(current + step, end_day)
+        partitions.append((
+            datetime.combine(current, time.min).astimezone(),
+            datetime.combine(next_day, time.min).astimezone()
+        ))
+        current = next_day
+    return partitions
+
+def partition_key(partition: Partition) -> str:
+    """Clé d'une partition dans le fichier de points de reprise"""
+    start, end = partition
+    return f"{start.date().isoformat()}/{end.date().isoformat()}"
+
+class BackfillRunner:
+    """
+    Rattrapage d'une période en partitions traitées en parallèle
+
+    Chaque partition terminée avec succès est enregistrée dans
+    `checkpoint_file` : une exécution interrompue reprend là où elle s'est
+    arrêtée. Les appels aux APIs restent soumis aux limites de débit
+    partagées (rate_limiter), quel que soit le nombre de workers.
+    """
+
+    def __init__(self, process_partition: Callable[[datetime, datetime], bool],
+                 checkpoint_file: str, workers: int = 4):
+        self.process_partition = process_partition
+        self.checkpoint_file = checkpoint_file
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+        self.completed = self.load_checkpoint()
+
+    def load_checkpoint(self) -> Set[str]:
+        """Charge les partitions déjà terminées"""
+        try:
+            if os.path.exists(self.checkpoint_file):
+                with open(self.checkpoint_file, 'r') as f:
+                    return set(json.load(f).get('completed', []))
+            return set()
+        except Exception as e:
+            print(f"Erreur lors du chargement des points de reprise: {e}")
+            return set()
+
+    def save_checkpoint(self):
+        """Sauvegarde les partitions terminées"""
+        try:
+            with open(self.checkpoint_file, 'w') as f:
+                json.dump({'completed': sorted(self.completed)}, f, indent=2)
+        except Exception as e:
+            print(f"Erreur lors de la sauvegarde des points de reprise: {e}")
+
+    def _run_partition(self, partition: Partition) -> bool:
+        start, end = partition
+        key = partition_key(partition)
+        print(f"[Backfill] ▶ Partition {key}")
+
+        try:
+            success = self.process_partition(start, end)
+        except Exception as e:
+            print(f"[Backfill] ✗ Partition {key}: {e}")
+            return False
+
+        if success:
+            with self._lock:
+                self.completed.add(key)
+                self.save_checkpoint()
+            print(f"[Backfill] ✓ Partition {key} terminée")
+        else:
+            print(f"[Backfill] ⚠ Partition {key} incomplète, elle sera reprise")
+        return success
+
+    def run(self, since: date, until: date, granularity: str = 'day') -> bool:
+        """
+        Traite toutes les partitions non terminées de la période
+
+        Returns:
+            True si toutes les partitions sont terminées
+        """
+        partitions = split_partitions(since, until, granularity)
+        pending = [p for p in partitions if partition_key(p) not in self.completed]
+
+        print(f"=== Backfill du {since.isoformat()} au {until.isoformat()} ===")
+        print(f"Partitions: {len(partitions)} ({granularity}), déjà terminées: {len(partitions) - len(pending)}, "
+              f"workers: {self.workers}")
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._run_partition, p) for p in pending]
+            for future in as_completed(futures):
+                if not future.result():
+                    failed += 1
+
+        if failed:
+            print(f"\n⚠ {failed} partition(s) incomplète(s) - relancez la même commande pour reprendre")
+        else:
+            print(f"\n✓ Backfill terminé ({len(partitions)} partitions)")
+        return failed == 0
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Benchmarks des chemins critiques (CPU) de l'intégration
+
+Mesure le temps et le pic mémoire, pour 10k / 100k / 1M factures
+synthétiques (generate_invoices.py), de :
+- main : create_task_from_invoice, extract_client_name, format_date
+  et la sélection des factures de process_paid_invoices_today
+- tempo_integration : extract_invoice_number_from_label, get_payment_amount,
+  is_invoice_fully_paid et la sélection des factures payées du jour
+- invoice_record : la conversion des factures de l'API en InvoiceRecord et
+  le test de la date de modification (updated_on)
+- invoice_columns : la classification des 7 derniers jours, jour par jour,
+  sur les mêmes colonnes (NumPy si installé)
+- label_parsing : l'analyse des libellés (tous les formats produits par
+  generate_invoices.py : Facture, Avoir, sans préfixe, texte libre), cache
+  vidé puis cache chaud
+
+Comme en production, les cas des intégrations reçoivent les factures déjà
+converties ; seul le cas de conversion reçoit les factures brutes.
+
+Les résultats peuvent être sauvegardés comme référence (JSON) puis
+comparés : le script sort en erreur si un cas régresse au-delà du seuil.
+
+    python bench_hot_paths.py --sizes 10000,100000 --save bench_baseline.json
+    python bench_hot_paths.py --sizes 10000,100000 --compare bench_baseline.json --threshold 0.2
+"""
+
+import gc
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from generate_invoices import InvoiceGenerator
+from invoice_record import normalize_invoices
+from invoice_columns import NUMPY_AVAILABLE, InvoiceColumns, classify_window
+from label_parsing import clear_label_cache, parse_label
+from main import PennylaneSheetsIntegration
+from tempo_integration import TempoIntegration
+
+# Sortie non nulle en cas de régression (distincte des erreurs d'usage d'argparse)
+EXIT_REGRESSION = 1
+
+# Cas mesurés sur les factures brutes de l'API (les autres reçoivent des InvoiceRecord)
+RAW_INVOICE_CASES = {'invoice_record.normalize_invoices'}
+
+def build_integrations() -> Tuple[PennylaneSheetsIntegration, TempoIntegration]:
+    """Instancie les intégrations sans clients API (seules les méthodes pures sont mesurées)"""
+    integration = PennylaneSheetsIntegration.__new__(PennylaneSheetsIntegration)
+    integration.processed_items = set()
+    tempo = TempoIntegration.__new__(TempoIntegration)
+    tempo.processed_reglements = {}
+    return integration, tempo
+
+def build_cases(integration: PennylaneSheetsIntegration,
+                tempo: TempoIntegration) -> Dict[str, Callable[[List[Dict]], object]]:
+    """Cas mesurés : chaque fonction traite la liste complète des factures (voir case_input)"""
+    yesterday = (datetime.now() - timedelta(days=1)).date()
+    today = datetime.now().date()
+
+    return {
+        'main.create_task_from_invoice': lambda invoices: [integration.create_task_from_invoice(inv) for inv in invoices],
+        'main.extract_client_name': lambda invoices: [integration.extract_client_name(inv.label) for inv in invoices],
+        'main.format_date': lambda invoices: [integration.format_date(inv.date) for inv in invoices],
+        'main.select_invoices_to_process': lambda invoices: integration.select_invoices_to_process(invoices, yesterday),
+        'tempo.extract_invoice_number_from_label': lambda invoices: [tempo.extract_invoice_number_from_label(inv.label) for inv in invoices],
+        'tempo.get_payment_amount': lambda invoices: [tempo.get_payment_amount(inv) for inv in invoices],
+        'tempo.is_invoice_fully_paid': lambda invoices: [tempo.is_invoice_fully_paid(inv) for inv in invoices],
+        'tempo.select_paid_invoices': lambda invoices: tempo.select_paid_invoices(invoices, today),
+        'invoice_record.normalize_invoices': normalize_invoices,
+        'invoice_record.updated_on': lambda invoices: [inv.updated_on(yesterday) for inv in invoices],
+        'invoice_columns.classify_7_days': classify_last_days,
+        'label_parsing.parse_label': parse_labels_cold,
+        'label_parsing.parse_label_cached': lambda invoices: [parse_label(inv.label) for inv in invoices],
+    }
+
+def parse_labels_cold(invoices: List) -> List:
+    """Analyse des libellés sans l'aide du cache (coût de la première conversion)"""
+    clear_label_cache()
+    return [parse_label(inv.label) for inv in invoices]
+
+def classify_last_days(invoices: List, days: int = 7) -> List:
+    """Classification jour par jour d'une semaine, colonnes chargées une seule fois"""
+    columns = InvoiceColumns(invoices) if NUMPY_AVAILABLE else None
+    today = datetime.now().date()
+    return [classify_window(invoices, today - timedelta(days=offset), columns=columns) for offset in range(1, days + 1)]
+
+def case_input(name: str, raw_invoices: List[Dict], records: List) -> List:
+    """Jeu de factures d'un cas : brutes pour la conversion, converties sinon"""
+    return raw_invoices if name in RAW_INVOICE_CASES else records
+
+def measure(func: Callable[[List[Dict]], object], invoices: List[Dict], repeat: int = 3) -> Dict:
+    """
+    Mesure un cas : meilleur temps sur `repeat` exécutions, puis pic mémoire
+    (tracemalloc, dans une exécution séparée pour ne pas fausser le temps)
+    """
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func(invoices)
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    func(invoices)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    best = min(timings)
+    return {
+        'size': len(invoices),
+        'seconds': best,
+        'ns_per_invoice': best / len(invoices) * 1e9 if invoices else 0.0,
+        'peak_kib': peak / 1024,
+    }
+
+def run_benchmarks(sizes: List[int], repeat: int = 3, pattern: Optional[str] = None, seed: int = 0) -> Dict:
+    """Exécute tous les cas (filtrés par `pattern`) pour chaque taille"""
+    integration, tempo = build_integrations()
+    cases = build_cases(integration, tempo)
+    if pattern:
+        cases = {name: func for name, func in cases.items() if pattern in name}
+
+    # Les modifications se concentrent sur les derniers jours : une part réaliste tombe « hier »
+    generator = InvoiceGenerator(seed=seed, end=datetime.now(timezone(timedelta(hours=1))), recent_bias=3.0)
+    print(f"Génération de {max(sizes)} factures synthétiques...")
+    dataset = list(generator.iter_invoices(max(sizes)))
+    records = normalize_invoices(dataset)
+
+    results = {}
+    for size in sorted(sizes):
+        for name, func in cases.items():
+            key = f"{name}@{size}"
+            results[key] = measure(func, case_input(name, dataset, records)[:size], repeat)
+            result = results[key]
+            print(f"  {key:<50} {result['seconds'] * 1000:>10.1f} ms  "
+                  f"{result['ns_per_invoice']:>8.0f} ns/facture  {result['peak_kib']:>10.0f} KiB")
+
+    return {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+def compare_results(current: Dict, baseline: Dict, threshold: float = 0.2,
+                    memory_threshold: Optional[float] = None, min_delta: float = 0.002) -> List[str]:
+    """
+    Compare deux exécutions
+
+    Args:
+        threshold: Hausse relative du temps tolérée (0.2 = +20 %)
+        memory_threshold: Hausse relative du pic mémoire tolérée (défaut: threshold)
+        min_delta: Écart de temps absolu (secondes) en dessous duquel on ignore le bruit de mesure
+
+    Returns:
+        Liste des régressions (vide si aucune)
+    """
+    if memory_threshold is None:
+        memory_threshold = threshold
+
+    regressions = []
+    for key, result in current['results'].items():
+        reference = baseline.get('results', {}).get(key)
+        if not reference:
+            continue
+
+        slower = result['seconds'] - reference['seconds']
+        if reference['seconds'] > 0 and slower > min_delta and result['seconds'] > reference['seconds'] * (1 + threshold):
+            regressions.append(f"{key}: temps {reference['seconds'] * 1000:.1f} ms → {result['seconds'] * 1000:.1f} ms "
+                               f"(+{(result['seconds'] / reference['seconds'] - 1) * 100:.0f}%)")
+        if reference['peak_kib'] > 0 and result['peak_kib'] > reference['peak_kib'] * (1 + memory_threshold):
+            regressions.append(f"{key}: mémoire {reference['peak_kib']:.0f} KiB → {result['peak_kib']:.0f} KiB "
+                               f"(+{(result['peak_kib'] / reference['peak_kib'] - 1) * 100:.0f}%)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks des chemins critiques (temps et mémoire)')
+    parser.add_argument('--sizes', default='10000,100000',
+                        help='Tailles des jeux de factures, séparées par des virgules (ex: 10000,100000,1000000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Nombre de mesures par cas (meilleur temps retenu)')
+    parser.add_argument('--filter', help='Ne mesure que les cas dont le nom contient ce texte')
+    parser.add_argument('--seed', type=int, default=0, help='Graine du jeu de factures')
+    parser.add_argument('--save', metavar='FICHIER', help='Sauvegarde les résultats comme référence JSON')
+    parser.add_argument('--compare', metavar='FICHIER', help='Compare avec une référence JSON')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Régression de temps tolérée (0.2 = +20%%)')
+    parser.add_argument('--memory-threshold', type=float, help='Régression mémoire tolérée (défaut: --threshold)')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    current = run_benchmarks(sizes, args.repeat, args.filter, args.seed)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f"\n✓ Référence sauvegardée dans {args.save}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_results(current, baseline, args.threshold, args.memory_threshold)
+        if regressions:
+            print(f"\n✗ {len(regressions)} régression(s) par rapport à {args.compare}:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(EXIT_REGRESSION)
+        print(f"\n✓ Aucune régression par rapport à {args.compare} (seuil {args.threshold * 100:.0f}%)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Banc de débit de bout en bout de l'intégration (main.py --auto)
+
+Exécute PennylaneSheetsIntegration.run_once (ou run_backfill avec plusieurs
+workers) contre les APIs simulées (fake_apis.py) alimentées par des factures
+synthétiques (generate_invoices.py), et mesure :
+- le débit (factures traitées par seconde)
+- les appels API par facture, par destination
+- les latences p50/p95/p99 par étape (page Pennylane, tâche Sheets, Tempo, Armado, facture)
+- la répartition du temps entre travail et attentes (time.sleep), par origine
+
+`--sleep-scale` raccourcit les attentes pour mesurer vite une exécution
+longue : les délais fixes sont multipliés par le facteur et les débits des
+limiteurs divisés d'autant, puis le temps d'attente réel est extrapolé.
+Chaque paramètre accepte plusieurs valeurs (balayage) :
+
+    python bench_throughput.py --invoices 2000 --latency lan,prod --page-size 50,100
+    python bench_throughput.py --mode backfill --days 7 --workers 1,2,4 --sleep-scale 0.05
+"""
+
+import io
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import tempfile
+import itertools
+import threading
+import contextlib
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+from unittest.mock import patch
+
+from fake_apis import APIS, FakeApiServer, FaultProfile
+from generate_invoices import InvoiceGenerator
+from main import PennylaneSheetsIntegration
+from rate_limiter import DEFAULT_RATES, reset_rate_limiters
+
+# Profils de latence des APIs simulées (millisecondes)
+LATENCY_PROFILES = {
+    'none': {},
+    'lan': {api: FaultProfile(latency_ms=5) for api in APIS},
+    'prod': {
+        'pennylane': FaultProfile(latency_ms=180, jitter_ms=60),
+        'sheets': FaultProfile(latency_ms=250, jitter_ms=100),
+        'tempo': FaultProfile(latency_ms=120, jitter_ms=40),
+        'armado': FaultProfile(latency_ms=90, jitter_ms=30),
+    },
+    'degraded': {
+        'pennylane': FaultProfile(latency_ms=500, jitter_ms=200),
+        'sheets': FaultProfile(latency_ms=700, jitter_ms=300, error_rate_429=0.01),
+        'tempo': FaultProfile(latency_ms=350, jitter_ms=100, error_rate_5xx=0.02),
+        'armado': FaultProfile(latency_ms=250, jitter_ms=100, error_rate_5xx=0.02),
+    },
+}
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Percentile (rang le plus proche) d'une liste triée"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+class StageTimer:
+    """Durées mesurées par étape, partagées entre threads"""
+
+    def __init__(self):
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def wrap(self, stage: str, func: Callable) -> Callable:
+        """Retourne `func` instrumentée pour l'étape `stage`"""
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.durations[stage].append(time.perf_counter() - start)
+        return timed
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for stage, values in sorted(self.durations.items()):
+            ordered = sorted(values)
+            result[stage] = {
+                'count': len(ordered),
+                'p50_ms': percentile(ordered, 50) * 1000,
+                'p95_ms': percentile(ordered, 95) * 1000,
+                'p99_ms': percentile(ordered, 99) * 1000,
+                'total_s': sum(ordered),
+            }
+        return result
+
+class SleepMeter:
+    """
+    Remplace time.sleep pour mesurer (et éventuellement raccourcir) les attentes
+
+    Les attentes sont ventilées par module appelant. Les attentes des
+    limiteurs de débit ne sont pas raccourcies ici : leurs débits sont
+    accélérés du même facteur (voir run_scenario).
+    """
+
+    def __init__(self, scale: float = 1.0):
+        self.scale = scale
+        self.actual: Dict[str, float] = defaultdict(float)
+        self.projected: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+        self._real_sleep = time.sleep
+
+    def sleep(self, seconds: float):
+        frame = sys._getframe(1)
+        if frame.f_globals.get('__name__') == 'metrics':
+            # throttle_sleep : l'attente est attribuée au module qui l'a demandée
+            frame = frame.f_back
+        source = frame.f_globals.get('__name__', '?')
+        if source == 'rate_limiter':
+            actual, projected = seconds, seconds / self.scale if self.scale else 0.0
+        else:
+            actual, projected = seconds * self.scale, seconds
+
+        start = time.perf_counter()
+        if actual > 0:
+            self._real_sleep(actual)
+        with self._lock:
+            self.actual[source] += time.perf_counter() - start
+            self.projected[source] += projected
+
+def build_integration(timer: StageTimer):
+    """Crée l'intégration (clients configurés par l'environnement) et instrumente ses étapes"""
+    integration = PennylaneSheetsIntegration()
+    pennylane = integration.pennylane_client
+    pennylane._get = timer.wrap('pennylane.page', pennylane._get)
+    sheets = integration.sheets_client
+    sheets.create_task = timer.wrap('sheets.create_task', sheets.create_task)
+    integration.sync_to_tempo = timer.wrap('tempo.sync', integration.sync_to_tempo)
+    integration.sync_to_armado = timer.wrap('armado.sync', integration.sync_to_armado)
+    integration.process_invoice = timer.wrap('invoice.total', integration.process_invoice)
+    return integration
+
+def run_scenario(invoices: int, mode: str = 'auto', workers: int = 1, page_size: int = 100,
+                 latency: str = 'lan', sleep_scale: float = 1.0, days: int = 7,
+                 rate_limits: bool = True, seed: int = 0, verbose: bool = False) -> Dict:
+    """
+    Exécute un scénario complet dans un répertoire temporaire
+
+    Returns:
+        Rapport du scénario (débit, appels, latences, attentes)
+    """
+    generator = InvoiceGenerator(seed=seed, end=datetime.now(timezone(timedelta(hours=1))),
+                                 days=max(days, 30), recent_bias=3.0)
+    server = FakeApiServer(generator.iter_invoices(invoices), profiles=LATENCY_PROFILES[latency], seed=seed)
+
+    env = server.env()
+    env['PENNYLANE_PAGE_SIZE'] = str(page_size)
+    for env_var, default_rate in DEFAULT_RATES.values():
+        rate = float(os.getenv(env_var, str(default_rate))) if rate_limits else 0.0
+        env[env_var] = str(rate / sleep_scale if sleep_scale else 0.0)
+
+    timer = StageTimer()
+    meter = SleepMeter(sleep_scale)
+    work_dir = tempfile.mkdtemp(prefix='bench-throughput-')
+    previous_dir = os.getcwd()
+    output = sys.stdout if verbose else io.StringIO()
+
+    server.start()
+    try:
+        os.chdir(work_dir)
+        with patch.dict(os.environ, env), patch('time.sleep', meter.sleep), contextlib.redirect_stdout(output):
+            reset_rate_limiters()
+            integration = build_integration(timer)
+            start = time.perf_counter()
+            if mode == 'backfill':
+                since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+                integration.run_backfill(since, workers=workers)
+            else:
+                try:
+                    integration.run_once()
+                except SystemExit:
+                    pass
+            wall = time.perf_counter() - start
+        processed = len(integration.processed_items)
+    finally:
+        reset_rate_limiters()
+        os.chdir(previous_dir)
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    sleep_actual = sum(meter.actual.values())
+    sleep_projected = sum(meter.projected.values())
+    threads = workers if mode == 'backfill' else 1
+    # Travail = temps des threads hors attentes ; approximation si plusieurs workers
+    work = max(0.0, wall - sleep_actual / threads)
+    projected_wall = work + sleep_projected / threads
+
+    calls = defaultdict(int)
+    for (api, _method), count in server.request_counts.items():
+        calls[api] += count
+
+    return {
+        'scenario': {
+            'mode': mode, 'invoices': invoices, 'workers': threads, 'page_size': page_size,
+            'latency': latency, 'sleep_scale': sleep_scale, 'rate_limits': rate_limits,
+        },
+        'processed': processed,
+        'wall_s': wall,
+        'work_s': work,
+        'sleep_actual_s': sleep_actual,
+        'sleep_projected_s': sleep_projected,
+        'projected_wall_s': projected_wall,
+        'invoices_per_s': processed / projected_wall if projected_wall else 0.0,
+        'sleep_by_source_s': dict(meter.projected),
+        'api_calls': dict(calls),
+        'api_calls_per_invoice': {api: count / processed for api, count in calls.items()} if processed else {},
+        'http_errors': {f"{api}:{status}": count for (api, status), count in server.status_counts.items()
+                        if status >= 400},
+        'stages': timer.summary(),
+    }
+
+def print_report(report: Dict):
+    scenario = report['scenario']
+    print(f"\n=== {scenario['mode']} | {scenario['invoices']} factures | workers={scenario['workers']} | "
+          f"page={scenario['page_size']} | latence={scenario['latency']} | sleep×{scenario['sleep_scale']} ===")
+    print(f"Factures traitées: {report['processed']}  →  {report['invoices_per_s']:.2f} factures/s (extrapolé)")
+    print(f"Durée mesurée: {report['wall_s']:.1f}s, extrapolée: {report['projected_wall_s']:.1f}s "
+          f"(travail {report['work_s']:.1f}s, attentes {report['sleep_projected_s']:.1f}s)")
+    if report['sleep_by_source_s']:
+        sources = ', '.join(f"{source} {seconds:.1f}s" for source, seconds in
+                            sorted(report['sleep_by_source_s'].items(), key=lambda item: -item[1]))
+        print(f"Attentes par origine: {sources}")
+    if report['api_calls_per_invoice']:
+        calls = ', '.join(f"{api} {count:.2f}" for api, count in sorted(report['api_calls_per_invoice'].items()))
+        print(f"Appels API par facture: {calls}")
+    if report['http_errors']:
+        print(f"Erreurs HTTP: {report['http_errors']}")
+    print(f"{'Étape':<22}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, stats in report['stages'].items():
+        print(f"{stage:<22}{stats['count']:>7}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+
+def _values(text: str, cast) -> List:
+    return [cast(value) for value in text.split(',') if value.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc de débit de bout en bout contre les APIs simulées")
+    parser.add_argument('--invoices', type=int, default=2000, help='Nombre de factures dans Pennylane simulé')
+    parser.add_argument('--mode', choices=['auto', 'backfill'], default='auto',
+                        help='auto = run_once (série), backfill = run_backfill (--workers en parallèle)')
+    parser.add_argument('--days', type=int, default=7, help='Période du backfill en jours')
+    parser.add_argument('--workers', default='1', help='Workers du backfill (ex: 1,2,4)')
+    parser.add_argument('--page-size', default='100', help='Taille des pages Pennylane (ex: 50,100)')
+    parser.add_argument('--latency', default='lan', help=f"Profils de latence ({', '.join(LATENCY_PROFILES)})")
+    parser.add_argument('--sleep-scale', type=float, default=1.0,
+                        help='Facteur appliqué aux attentes (0.05 = 20× plus rapide, durées extrapolées)')
+    parser.add_argument('--no-rate-limits', action='store_true', help='Désactive les limiteurs de débit')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', metavar='FICHIER', help='Écrit les rapports en JSON')
+    parser.add_argument('--verbose', action='store_true', help="Affiche la sortie de l'intégration")
+    args = parser.parse_args()
+
+    if args.sleep_scale <= 0:
+        parser.error('--sleep-scale doit être strictement positif')
+    for latency in _values(args.latency, str):
+        if latency not in LATENCY_PROFILES:
+            parser.error(f"Profil de latence inconnu: {latency}")
+
+    workers = _values(args.workers, int) if args.mode == 'backfill' else [1]
+    reports = []
+    for worker_count, page_size, latency in itertools.product(
+            workers, _values(args.page_size, int), _values(args.latency, str)):
+        report = run_scenario(args.invoices, args.mode, worker_count, page_size, latency,
+                              args.sleep_scale, args.days, not args.no_rate_limits, args.seed, args.verbose)
+        print_report(report)
+        reports.append(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
+        print(f"\n✓ Rapports écrits dans {args.json}")
+
+if __name__ == '__main__':
+    main()
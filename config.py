@@ -0,0 +1,22 @@
+"""
+Chargement de la configuration (.env)
+
+Le fichier .env est lu une seule fois par processus, au premier appel de
+load_env() (création d'un client ou démarrage d'un point d'entrée).
+"""
+
+import threading
+
+_loaded = False
+_lock = threading.Lock()
+
+def load_env():
+    """Charge le fichier .env dans l'environnement (sans écraser les variables existantes)"""
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if not _loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _loaded = True
@@ -0,0 +1,755 @@
+#!/usr/bin/env python3
+"""
+Serveurs de substitution locaux pour Pennylane, Tempo, Armado et Google Sheets
+
+Reproduisent les endpoints utilisés par l'intégration afin de mesurer le
+débit de bout en bout sans toucher aux APIs de production. Chaque API est
+servie sous un préfixe du même serveur HTTP :
+
+    /pennylane   GET /customer_invoices (curseur, filtre), GET /customer_invoices/{id}
+    /tempo       GET /FACTURE, POST /FACTUREREGLEMENT
+    /armado      GET /v1/bill?reference=, PUT /v1/bill/{id}
+    /sheets      v4/spreadsheets/{id} (get, :batchUpdate), values get/update/append,
+                 values:batchGet, values:batchUpdate, POST /batch (requêtes HTTP multipart)
+
+Latence, quota (requêtes par minute) et injection d'erreurs 429/5xx sont
+configurables par API. Les clients existants pointent vers ces serveurs via
+leurs variables d'environnement (voir FakeApiServer.env()).
+"""
+
+import re
+import gzip
+import json
+import email
+import time
+import random
+import argparse
+import threading
+from collections import Counter, deque
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+APIS = ('pennylane', 'tempo', 'armado', 'sheets')
+FAKE_SPREADSHEET_ID = 'fake-spreadsheet'
+
+# Référence capturée à l'import : la latence simulée n'est pas affectée par
+# les remplacements de time.sleep (bench_throughput.py mesure les attentes des clients)
+_real_sleep = time.sleep
+
+@dataclass
+class FaultProfile:
+    """Comportement simulé d'une API : latence, quota et erreurs"""
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    quota_per_minute: int = 0  # 0 = illimité
+    error_rate_429: float = 0.0
+    error_rate_5xx: float = 0.0
+
+class HttpError(Exception):
+    """Erreur HTTP renvoyée par un endpoint simulé"""
+
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+# ---------------------------------------------------------------------------
+# Notation A1 (Google Sheets)
+# ---------------------------------------------------------------------------
+
+_CELL_RE = re.compile(r'^([A-Z]*)(\d*)$')
+
+def column_index(letters: str) -> int:
+    """Convertit une colonne A1 (A, L, AA) en index 0"""
+    index = 0
+    for char in letters:
+        index = index * 26 + (ord(char) - ord('A') + 1)
+    return index - 1
+
+def column_letters(index: int) -> str:
+    """Convertit un index de colonne 0 en lettres A1 (0 → A, 26 → AA)"""
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+def parse_a1_range(range_name: str) -> Tuple[str, int, Optional[int], int, Optional[int]]:
+    """
+    Découpe une plage A1 ('Feuille'!A1:H1, Feuille!A:A, Feuille!L5)
+
+    Returns:
+        (feuille, ligne début, ligne fin incluse ou None, colonne début, colonne fin incluse ou None)
+        Lignes et colonnes en index 0.
+    """
+    sheet, _, cells = range_name.rpartition('!')
+    if not sheet:
+        sheet, cells = cells, ''
+    if sheet.startswith("'") and sheet.endswith("'"):
+        sheet = sheet[1:-1].replace("''", "'")
+
+    if not cells:
+        return sheet, 0, None, 0, None
+
+    start, _, end = cells.partition(':')
+    start_col, start_row = _CELL_RE.match(start.upper()).groups()
+    if end:
+        end_col, end_row = _CELL_RE.match(end.upper()).groups()
+    else:
+        end_col, end_row = start_col, start_row
+
+    return (
+        sheet,
+        int(start_row) - 1 if start_row else 0,
+        int(end_row) - 1 if end_row else None,
+        column_index(start_col) if start_col else 0,
+        column_index(end_col) if end_col else None,
+    )
+
+class FakeSpreadsheet:
+    """Classeur en mémoire : une grille de valeurs par feuille"""
+
+    def __init__(self, title: str = 'Fake Spreadsheet', sheet_names: Iterable[str] = ()):
+        self.title = title
+        self.sheets: Dict[str, Dict] = {}
+        self._next_sheet_id = 0
+        for name in sheet_names:
+            self.add_sheet(name)
+
+    def add_sheet(self, title: str, row_count: int = 1000, column_count: int = 26,
+                  sheet_id: Optional[int] = None) -> Dict:
+        if title in self.sheets:
+            raise HttpError(400, f'A sheet with the name "{title}" already exists')
+        if sheet_id is None:
+            sheet_id = self._next_sheet_id
+        elif any(sheet['properties']['sheetId'] == sheet_id for sheet in self.sheets.values()):
+            raise HttpError(400, f'A sheet with the id {sheet_id} already exists')
+        sheet = {
+            'properties': {
+                'sheetId': sheet_id,
+                'title': title,
+                'index': len(self.sheets),
+                'gridProperties': {'rowCount': row_count, 'columnCount': column_count},
+            },
+            'rows': [],
+        }
+        self._next_sheet_id = max(self._next_sheet_id, sheet_id) + 1
+        self.sheets[title] = sheet
+        return sheet
+
+    def _sheet(self, title: str) -> Dict:
+        if title not in self.sheets:
+            raise HttpError(400, f'Unable to parse range: {title}')
+        return self.sheets[title]
+
+    def _sheet_by_id(self, sheet_id: int) -> Dict:
+        for sheet in self.sheets.values():
+            if sheet['properties']['sheetId'] == sheet_id:
+                return sheet
+        raise HttpError(400, f'No grid with id: {sheet_id}')
+
+    def get_values(self, range_name: str) -> Dict:
+        title, row_start, row_end, col_start, col_end = parse_a1_range(range_name)
+        rows = self._sheet(title)['rows']
+        row_end = len(rows) - 1 if row_end is None else min(row_end, len(rows) - 1)
+
+        values = []
+        for row in rows[row_start:row_end + 1]:
+            cells = row[col_start:None if col_end is None else col_end + 1]
+            while cells and cells[-1] == '':
+                cells = cells[:-1]
+            values.append(cells)
+        # L'API omet les lignes vides en fin de plage
+        while values and not values[-1]:
+            values.pop()
+
+        result = {'range': range_name, 'majorDimension': 'ROWS'}
+        if values:
+            result['values'] = values
+        return result
+
+    def update_values(self, range_name: str, values: List[List]) -> Dict:
+        title, row_start, _, col_start, _ = parse_a1_range(range_name)
+        sheet = self._sheet(title)
+        self._write(sheet, row_start, col_start, values)
+        return {
+            'spreadsheetId': FAKE_SPREADSHEET_ID,
+            'updatedRange': range_name,
+            'updatedRows': len(values),
+            'updatedCells': sum(len(row) for row in values),
+        }
+
+    def append_values(self, range_name: str, values: List[List]) -> Dict:
+        title, _, _, col_start, _ = parse_a1_range(range_name)
+        sheet = self._sheet(title)
+        row_start = len(sheet['rows'])
+        self._write(sheet, row_start, col_start, values)
+        width = max((len(row) for row in values), default=1)
+        updated_range = (f"{title}!{column_letters(col_start)}{row_start + 1}:"
+                         f"{column_letters(col_start + width - 1)}{row_start + len(values)}")
+        return {
+            'spreadsheetId': FAKE_SPREADSHEET_ID,
+            'tableRange': range_name,
+            'updates': {'updatedRange': updated_range, 'updatedRows': len(values),
+                        'updatedCells': sum(len(row) for row in values)},
+        }
+
+    def _write(self, sheet: Dict, row_start: int, col_start: int, values: List[List]):
+        rows = sheet['rows']
+        grid = sheet['properties']['gridProperties']
+        for offset, row_values in enumerate(values):
+            row_index = row_start + offset
+            while len(rows) <= row_index:
+                rows.append([])
+            row = rows[row_index]
+            needed = col_start + len(row_values)
+            if len(row) < needed:
+                row.extend([''] * (needed - len(row)))
+            for col_offset, value in enumerate(row_values):
+                row[col_start + col_offset] = '' if value is None else str(value)
+        grid['rowCount'] = max(grid['rowCount'], len(rows))
+
+    @staticmethod
+    def _cell_values(body: Dict) -> List[List[str]]:
+        """Valeurs des lignes (RowData) d'une requête appendCells / updateCells"""
+        return [
+            [cell.get('userEnteredValue', {}).get('stringValue', '') for cell in row.get('values', [])]
+            for row in body.get('rows', [])
+        ]
+
+    def batch_update(self, requests: List[Dict]) -> List[Dict]:
+        """Applique les requêtes de spreadsheets.batchUpdate prises en charge"""
+        replies = []
+        for request in requests:
+            if 'addSheet' in request:
+                properties = request['addSheet'].get('properties', {})
+                grid = properties.get('gridProperties', {})
+                sheet = self.add_sheet(properties['title'], grid.get('rowCount', 1000),
+                                       grid.get('columnCount', 26), properties.get('sheetId'))
+                replies.append({'addSheet': {'properties': sheet['properties']}})
+            elif 'appendCells' in request:
+                body = request['appendCells']
+                sheet = self._sheet_by_id(body['sheetId'])
+                self._write(sheet, len(sheet['rows']), 0, self._cell_values(body))
+                replies.append({})
+            elif 'updateCells' in request:
+                body = request['updateCells']
+                start = body['start']
+                self._write(self._sheet_by_id(start['sheetId']), start.get('rowIndex', 0),
+                            start.get('columnIndex', 0), self._cell_values(body))
+                replies.append({})
+            elif 'deleteDimension' in request:
+                dim_range = request['deleteDimension']['range']
+                sheet = self._sheet_by_id(dim_range['sheetId'])
+                if dim_range.get('dimension', 'ROWS') == 'ROWS':
+                    del sheet['rows'][dim_range['startIndex']:dim_range['endIndex']]
+                    grid = sheet['properties']['gridProperties']
+                    grid['rowCount'] -= dim_range['endIndex'] - dim_range['startIndex']
+                replies.append({})
+            elif 'updateSheetProperties' in request:
+                body = request['updateSheetProperties']
+                sheet = self._sheet_by_id(body['properties']['sheetId'])
+                grid = body['properties'].get('gridProperties', {})
+                sheet['properties']['gridProperties'].update(grid)
+                replies.append({})
+            else:
+                # Mise en forme (repeatCell, autoResizeDimensions...) : sans effet sur les valeurs
+                replies.append({})
+        return replies
+
+    def metadata(self, spreadsheet_id: str) -> Dict:
+        return {
+            'spreadsheetId': spreadsheet_id,
+            'properties': {'title': self.title},
+            'sheets': [{'properties': sheet['properties']} for sheet in self.sheets.values()],
+        }
+
+# ---------------------------------------------------------------------------
+# Filtres Pennylane
+# ---------------------------------------------------------------------------
+
+def parse_pennylane_filter(filter_expr: Optional[str]) -> List[Tuple[str, str, str]]:
+    """Parse un filtre v2 : JSON [{field, operator, value}] ou ancien format champ:op:valeur"""
+    if not filter_expr:
+        return []
+    try:
+        conditions = json.loads(filter_expr)
+        return [(c['field'], c['operator'], c['value']) for c in conditions]
+    except (ValueError, TypeError, KeyError):
+        conditions = []
+        for part in filter_expr.split(','):
+            field, operator, value = part.split(':', 2)
+            conditions.append((field, operator, value))
+        return conditions
+
+def _comparable(value):
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, (int, float)):
+        return value
+    text = str(value)
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+def matches_filter(invoice: Dict, conditions: List[Tuple[str, str, str]]) -> bool:
+    """True si la facture satisfait toutes les conditions"""
+    for field, operator, value in conditions:
+        actual = invoice.get(field)
+        if actual is None:
+            return False
+        if operator == 'in':
+            if str(actual) not in [str(v) for v in (value if isinstance(value, list) else str(value).split(','))]:
+                return False
+            continue
+
+        left, right = _comparable(actual), _comparable(value)
+        if type(left) is not type(right):
+            left, right = str(actual), str(value)
+        # Les dates ISO 8601 du même fuseau se comparent lexicographiquement
+        if operator == 'eq' and not left == right:
+            return False
+        if operator == 'not_eq' and not left != right:
+            return False
+        if operator == 'gt' and not left > right:
+            return False
+        if operator == 'gteq' and not left >= right:
+            return False
+        if operator == 'lt' and not left < right:
+            return False
+        if operator == 'lteq' and not left <= right:
+            return False
+    return True
+
+# ---------------------------------------------------------------------------
+# Serveur
+# ---------------------------------------------------------------------------
+
+class FakeApiServer:
+    """
+    Serveur HTTP local simulant les quatre APIs
+
+    Args:
+        invoices: Factures Pennylane servies par /customer_invoices
+        profiles: FaultProfile par API ('pennylane', 'tempo', 'armado', 'sheets')
+        sheet_name: Feuille créée au démarrage dans le classeur simulé
+        seed: Graine de l'injection d'erreurs (exécutions reproductibles)
+    """
+
+    def __init__(self, invoices: Optional[Iterable[Dict]] = None,
+                 profiles: Optional[Dict[str, FaultProfile]] = None,
+                 host: str = '127.0.0.1', port: int = 0,
+                 sheet_name: str = 'Tâches', seed: int = 0):
+        self.profiles = {api: FaultProfile() for api in APIS}
+        self.profiles.update(profiles or {})
+        self.sheet_name = sheet_name
+        self.spreadsheet = FakeSpreadsheet(sheet_names=[sheet_name])
+
+        self.invoices: List[Dict] = []
+        self._invoices_by_id: Dict[str, Dict] = {}
+        self.add_invoices(invoices or [])
+
+        self.tempo_factures: Dict[str, Dict] = {}
+        self.tempo_reglements: List[Dict] = []
+        self.armado_bills: Dict[int, Dict] = {}
+        self._armado_by_reference: Dict[str, int] = {}
+
+        self.request_counts: Counter = Counter()
+        self.status_counts: Counter = Counter()
+        self._quota_windows: Dict[str, deque] = {api: deque() for api in APIS}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._thread = None
+
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.host, self.port = self.httpd.server_address[:2]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def env(self) -> Dict[str, str]:
+        """Variables d'environnement qui dirigent les clients vers ce serveur"""
+        return {
+            'PENNYLANE_BASE_URL': f"{self.base_url}/pennylane",
+            'PENNYLANE_API_KEY': 'fake-pennylane-key',
+            'TEMPO_BASE_URL': f"{self.base_url}/tempo",
+            'TEMPO_DOSSIER': 'FAKE',
+            'TEMPO_USERNAME': 'fake',
+            'TEMPO_PASSWORD': 'fake',
+            'ARMADO_BASE_URL': f"{self.base_url}/armado",
+            'ARMADO_API_KEY': 'fake-armado-key',
+            'GOOGLE_SHEETS_API_ENDPOINT': f"{self.base_url}/sheets/",
+            'SPREADSHEET_ID': FAKE_SPREADSHEET_ID,
+            'SPREADSHEET_NAME': self.sheet_name,
+        }
+
+    def add_invoices(self, invoices: Iterable[Dict]):
+        """Ajoute des factures Pennylane (triées par ID pour la pagination)"""
+        for invoice in invoices:
+            self.invoices.append(invoice)
+            self._invoices_by_id[str(invoice.get('id'))] = invoice
+        self.invoices.sort(key=lambda invoice: _comparable(invoice.get('id', 0)))
+
+    # -- Simulation des contraintes -----------------------------------------
+
+    def _apply_profile(self, api: str):
+        profile = self.profiles[api]
+
+        if profile.latency_ms or profile.jitter_ms:
+            with self._lock:
+                jitter = self._random.uniform(0, profile.jitter_ms) if profile.jitter_ms else 0.0
+            _real_sleep((profile.latency_ms + jitter) / 1000)
+
+        with self._lock:
+            if profile.quota_per_minute:
+                window = self._quota_windows[api]
+                now = time.monotonic()
+                while window and now - window[0] >= 60:
+                    window.popleft()
+                if len(window) >= profile.quota_per_minute:
+                    retry_after = max(1, int(60 - (now - window[0])) + 1)
+                    raise HttpError(429, 'Quota exceeded', {'Retry-After': str(retry_after)})
+                window.append(now)
+
+            draw = self._random.random()
+        if draw < profile.error_rate_429:
+            raise HttpError(429, 'Too Many Requests (injected)', {'Retry-After': '1'})
+        if draw < profile.error_rate_429 + profile.error_rate_5xx:
+            raise HttpError(503, 'Service Unavailable (injected)')
+
+    # -- Pennylane ----------------------------------------------------------
+
+    def _pennylane(self, method: str, path: str, query: Dict, body) -> Dict:
+        if method != 'GET':
+            raise HttpError(405, 'Method not allowed')
+
+        match = re.fullmatch(r'(?:/api/external/v2)?/customer_invoices(?:/([^/]+))?', path)
+        if not match:
+            raise HttpError(404, 'Not found')
+
+        invoice_id = match.group(1)
+        if invoice_id:
+            invoice = self._invoices_by_id.get(invoice_id)
+            if invoice is None:
+                raise HttpError(404, 'Invoice not found')
+            return invoice
+
+        limit = min(int(query.get('limit', ['20'])[0]), 100)
+        offset = int(query.get('cursor', ['0'])[0] or 0)
+        conditions = parse_pennylane_filter(query.get('filter', [None])[0])
+
+        items = []
+        position = offset
+        while position < len(self.invoices) and len(items) < limit:
+            invoice = self.invoices[position]
+            position += 1
+            if matches_filter(invoice, conditions):
+                items.append(invoice)
+
+        # Le curseur est la position de la prochaine facture correspondante
+        while position < len(self.invoices) and not matches_filter(self.invoices[position], conditions):
+            position += 1
+        has_more = position < len(self.invoices)
+        return {
+            'items': items,
+            'has_more': has_more,
+            'next_cursor': str(position) if has_more else None,
+        }
+
+    # -- Tempo --------------------------------------------------------------
+
+    def _tempo(self, method: str, path: str, query: Dict, body, headers) -> Dict:
+        if not headers.get('Authorization', '').startswith('Basic '):
+            raise HttpError(401, 'Unauthorized')
+
+        if path == '/FACTURE' and method == 'GET':
+            facture_id = query.get('ID', [''])[0]
+            with self._lock:
+                facture = self.tempo_factures.setdefault(facture_id, {
+                    'ID': facture_id, 'Dossier': query.get('Dossier', [''])[0],
+                    'FactureRegle': 'NON', 'MontantReglementPartielTotal': 0.0
+                })
+                return dict(facture)
+
+        if path == '/FACTUREREGLEMENT' and method == 'POST':
+            if not isinstance(body, dict) or 'IdFacture' not in body:
+                raise HttpError(400, 'IdFacture manquant')
+            with self._lock:
+                self.tempo_reglements.append(body)
+                facture = self.tempo_factures.setdefault(str(body['IdFacture']), {
+                    'ID': str(body['IdFacture']), 'FactureRegle': 'NON', 'MontantReglementPartielTotal': 0.0
+                })
+                if 'MontantReglementPartiel' in body:
+                    facture['MontantReglementPartielTotal'] += float(body['MontantReglementPartiel'])
+                if 'MontantReglementPartielTotal' in body:
+                    facture['MontantReglementPartielTotal'] = float(body['MontantReglementPartielTotal'])
+                if body.get('FactureRegle') == 'OUI':
+                    facture['FactureRegle'] = 'OUI'
+            return {'Statut': 'OK'}
+
+        raise HttpError(404, 'Not found')
+
+    # -- Armado -------------------------------------------------------------
+
+    def _armado(self, method: str, path: str, query: Dict, body, headers) -> Dict:
+        if not headers.get('ApiKey'):
+            raise HttpError(401, 'Unauthorized')
+
+        if path == '/v1/bill' and method == 'GET':
+            reference = query.get('reference', [''])[0]
+            if reference.startswith('TEST_CONNECTION'):
+                return {'list': []}
+            with self._lock:
+                # Toute référence demandée existe côté Armado (provisionnement à la volée)
+                if reference not in self._armado_by_reference:
+                    bill_id = len(self.armado_bills) + 1
+                    self.armado_bills[bill_id] = {'id': bill_id, 'reference': reference,
+                                                  'paymentType': None, 'paymentDate': None}
+                    self._armado_by_reference[reference] = bill_id
+                return {'list': [dict(self.armado_bills[self._armado_by_reference[reference]])]}
+
+        match = re.fullmatch(r'/v1/bill/(\d+)', path)
+        if match and method == 'PUT':
+            with self._lock:
+                bill = self.armado_bills.get(int(match.group(1)))
+                if bill is None:
+                    raise HttpError(404, 'Bill not found')
+                bill.update({k: v for k, v in (body or {}).items() if k in ('paymentType', 'paymentDate')})
+                return dict(bill)
+
+        raise HttpError(404, 'Not found')
+
+    # -- Google Sheets ------------------------------------------------------
+
+    def _sheets(self, method: str, path: str, query: Dict, body) -> Dict:
+        match = re.fullmatch(r'/v4/spreadsheets/([^/:]+)(.*)', path)
+        if not match:
+            raise HttpError(404, 'Not found')
+        spreadsheet_id, rest = match.group(1), unquote(match.group(2))
+        body = body or {}
+
+        with self._lock:
+            sheet = self.spreadsheet
+            if rest == '' and method == 'GET':
+                return sheet.metadata(spreadsheet_id)
+            if rest == ':batchUpdate' and method == 'POST':
+                return {'spreadsheetId': spreadsheet_id, 'replies': sheet.batch_update(body.get('requests', []))}
+            if rest == '/values:batchGet' and method == 'GET':
+                return {'spreadsheetId': spreadsheet_id,
+                        'valueRanges': [sheet.get_values(r) for r in query.get('ranges', [])]}
+            if rest == '/values:batchUpdate' and method == 'POST':
+                responses = [sheet.update_values(d['range'], d.get('values', [])) for d in body.get('data', [])]
+                return {'spreadsheetId': spreadsheet_id, 'totalUpdatedRows': sum(r['updatedRows'] for r in responses),
+                        'responses': responses}
+
+            values_match = re.fullmatch(r'/values/(.+?)(:append)?', rest)
+            if values_match:
+                range_name, append = values_match.groups()
+                if append and method == 'POST':
+                    return sheet.append_values(range_name, body.get('values', []))
+                if method == 'GET':
+                    return sheet.get_values(range_name)
+                if method == 'PUT':
+                    return sheet.update_values(range_name, body.get('values', []))
+
+        raise HttpError(404, 'Not found')
+
+    def _sheets_batch(self, method: str, raw: bytes, content_type: str) -> Tuple[str, bytes]:
+        """Requête HTTP multipart (BatchHttpRequest) : chaque partie est une requête Sheets"""
+        if method != 'POST' or not content_type.startswith('multipart/mixed'):
+            raise HttpError(400, 'Expected a multipart/mixed batch request')
+        message = email.message_from_bytes(f'Content-Type: {content_type}\r\n\r\n'.encode('utf-8') + raw)
+
+        boundary = f'batch_{random.getrandbits(64):016x}'
+        parts = []
+        for part in message.get_payload():
+            request_line, _, rest = part.get_payload().partition('\n')
+            part_method, target, _ = request_line.split(' ', 2)
+            body = rest.replace('\r\n', '\n').partition('\n\n')[2]
+            url = urlsplit(target)
+            # Chemin complet de la partie (/sheets/v4/...) : préfixe de l'API retiré
+            sub_path = '/' + url.path.lstrip('/').partition('/')[2]
+            try:
+                status, data = 200, self._sheets(part_method, sub_path, parse_qs(url.query),
+                                                 json.loads(body) if body.strip() else None)
+            except (HttpError, json.JSONDecodeError) as e:
+                status = getattr(e, 'status', 400)
+                data = {'error': {'code': status, 'message': getattr(e, 'message', str(e))}}
+            parts.append(
+                f'--{boundary}\r\nContent-Type: application/http\r\n'
+                f"Content-ID: <response-{part['Content-ID'][1:]}\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                f'Content-Type: application/json; charset=UTF-8\r\n\r\n'
+                f'{json.dumps(data, ensure_ascii=False)}\r\n'
+            )
+        parts.append(f'--{boundary}--\r\n')
+        return f'multipart/mixed; boundary={boundary}', ''.join(parts).encode('utf-8')
+
+    # -- HTTP ---------------------------------------------------------------
+
+    def _make_handler(self):
+        server = self
+
+        class FakeApiHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # En-têtes et corps partent en deux écritures : sans TCP_NODELAY, l'ACK
+            # retardé du client ajoute ~40 ms à chaque requête keep-alive
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                self._dispatch('GET')
+
+            def do_POST(self):
+                self._dispatch('POST')
+
+            def do_PUT(self):
+                self._dispatch('PUT')
+
+            def _dispatch(self, method: str):
+                url = urlsplit(self.path)
+                query = parse_qs(url.query)
+                length = int(self.headers.get('Content-Length', 0))
+                raw = self.rfile.read(length) if length else b''
+
+                api, _, sub_path = url.path.lstrip('/').partition('/')
+                sub_path = '/' + sub_path
+
+                try:
+                    if api not in APIS:
+                        raise HttpError(404, 'Unknown API')
+                    with server._lock:
+                        server.request_counts[(api, method)] += 1
+                    server._apply_profile(api)
+
+                    if api == 'sheets' and sub_path == '/batch':
+                        # Corps multipart/mixed : une requête Sheets par partie
+                        content_type, content = server._sheets_batch(method, raw, self.headers.get('Content-Type', ''))
+                        self._send(200, content_type, content, api)
+                        return
+
+                    try:
+                        body = json.loads(raw) if raw else None
+                    except json.JSONDecodeError:
+                        raise HttpError(400, 'Invalid JSON')
+
+                    if api == 'pennylane':
+                        data = server._pennylane(method, sub_path, query, body)
+                    elif api == 'tempo':
+                        data = server._tempo(method, sub_path, query, body, self.headers)
+                    elif api == 'armado':
+                        data = server._armado(method, sub_path, query, body, self.headers)
+                    else:
+                        data = server._sheets(method, sub_path, query, body)
+                    self._send_json(200, data, api)
+                except HttpError as e:
+                    self._send_json(e.status, {'error': {'code': e.status, 'message': e.message}}, api, e.headers)
+
+            def _send_json(self, status: int, data, api: str, headers: Optional[Dict[str, str]] = None):
+                content = json.dumps(data, ensure_ascii=False).encode('utf-8')
+                self._send(status, 'application/json; charset=UTF-8', content, api, headers)
+
+            def _send(self, status: int, content_type: str, content: bytes, api: str,
+                      headers: Optional[Dict[str, str]] = None):
+                with server._lock:
+                    server.status_counts[(api, status)] += 1
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(content)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return FakeApiHandler
+
+    def start(self):
+        """Démarre le serveur en arrière-plan"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-apis', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Arrête le serveur"""
+        if self._thread:
+            self.httpd.shutdown()
+            self._thread.join(timeout=5)
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def load_invoices_jsonl(path: str) -> List[Dict]:
+    """Charge des factures depuis un fichier JSON Lines (.gz accepté)"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def parse_api_options(values: List[str], cast) -> Dict[str, float]:
+    """Parse des options 'api=valeur' (ou 'valeur' pour toutes les APIs)"""
+    options = {}
+    for value in values or []:
+        if '=' in value:
+            api, _, raw = value.partition('=')
+            if api not in APIS:
+                raise ValueError(f"API inconnue: {api} (attendu: {', '.join(APIS)})")
+            options[api] = cast(raw)
+        else:
+            for api in APIS:
+                options[api] = cast(value)
+    return options
+
+def main():
+    parser = argparse.ArgumentParser(description='Serveurs de substitution locaux des APIs (tests de charge)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8700)
+    parser.add_argument('--invoices', help='Fichier JSON Lines de factures Pennylane à servir')
+    parser.add_argument('--sheet-name', default='Tâches', help='Nom de la feuille simulée')
+    parser.add_argument('--latency-ms', action='append', metavar='[API=]MS', help='Latence par requête')
+    parser.add_argument('--jitter-ms', action='append', metavar='[API=]MS', help='Gigue aléatoire ajoutée')
+    parser.add_argument('--quota', action='append', metavar='[API=]N', help='Quota en requêtes/minute')
+    parser.add_argument('--error-429', action='append', metavar='[API=]TAUX', help='Taux de 429 injectées')
+    parser.add_argument('--error-5xx', action='append', metavar='[API=]TAUX', help='Taux de 503 injectées')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    profiles = {api: FaultProfile() for api in APIS}
+    for attribute, values, cast in (
+        ('latency_ms', args.latency_ms, float),
+        ('jitter_ms', args.jitter_ms, float),
+        ('quota_per_minute', args.quota, int),
+        ('error_rate_429', args.error_429, float),
+        ('error_rate_5xx', args.error_5xx, float),
+    ):
+        for api, value in parse_api_options(values, cast).items():
+            setattr(profiles[api], attribute, value)
+
+    invoices = load_invoices_jsonl(args.invoices) if args.invoices else []
+    server = FakeApiServer(invoices, profiles, args.host, args.port, args.sheet_name, args.seed)
+
+    print(f"✓ APIs simulées sur {server.base_url} ({len(invoices)} factures)")
+    print("Variables d'environnement à utiliser :")
+    for name, value in server.env().items():
+        print(f"  export {name}={value}")
+
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\nArrêt des APIs simulées")
+    finally:
+        server.httpd.server_close()
+
+if __name__ == '__main__':
+    main()
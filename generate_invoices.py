@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Générateur de jeux de factures Pennylane synthétiques (tests de montée en charge)
+
+Produit des factures au format de l'API v2 (customer_invoices) couvrant les
+formats de libellé analysés par extract_client_name et
+extract_invoice_number_from_label (Facture / Avoir / sans préfixe), les
+avoirs, les paiements partiels et une distribution de updated_at
+concentrée sur les derniers jours.
+
+Chaque facture ne dépend que de (graine, index) : la génération est
+reproductible et se fait en flux, de 1 000 à 1 000 000 de factures, vers un
+fichier JSON Lines ou directement vers les APIs simulées (fake_apis.py).
+"""
+
+import sys
+import gzip
+import json
+import math
+import random
+import argparse
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, Optional, TextIO
+
+CLIENT_PREFIXES = ['EURO', 'PROJET', 'GROUPE', 'SOCIETE', 'CABINET', 'HOTEL', 'CAMPING', 'AGENCE']
+CLIENT_NAMES = ['DISNEY', 'AQUAPARK', 'LES PINS', 'MARTIN', 'DURAND', 'OCEANE', 'ALPES', 'ATLANTIQUE',
+                'BELLEVUE', 'SOLEIL', 'HORIZON', 'RIVIERA', 'CENTRAL', 'DU LAC', 'MONTAGNE']
+CLIENT_SUFFIXES = ['SAS', 'SARL', 'ASSOCIES SAS', 'SA', 'EURL', '']
+
+# Répartition des cas (poids relatifs)
+DEFAULT_MIX = {
+    'paid': 0.50,
+    'partially_paid': 0.15,
+    'unpaid': 0.25,
+    'credit_note': 0.10,
+}
+
+# Répartition des formats de libellé
+LABEL_FORMATS = {
+    'facture': 0.70,      # "Facture CLIENT - 20498 (label généré)"
+    'unprefixed': 0.20,   # "CLIENT - 20498 (label généré)"
+    'free_text': 0.10,    # libellé saisi à la main, sans " - "
+}
+
+def _pick(rng: random.Random, weights: Dict[str, float]) -> str:
+    draw = rng.random() * sum(weights.values())
+    for key, weight in weights.items():
+        draw -= weight
+        if draw < 0:
+            return key
+    return key
+
+@lru_cache(maxsize=None)
+def _client_name(customer_id: int) -> str:
+    # Le nom dépend uniquement du client : les mêmes clients reviennent dans tout le jeu
+    client_rng = random.Random(customer_id)
+    parts = [client_rng.choice(CLIENT_PREFIXES), client_rng.choice(CLIENT_NAMES), client_rng.choice(CLIENT_SUFFIXES)]
+    if client_rng.random() < 0.1:
+        # Quelques noms contiennent un tiret simple (sans espaces), qui ne doit pas couper le nom
+        parts[1] = f"{parts[1]}-{client_rng.choice(CLIENT_NAMES)}"
+    return ' '.join(part for part in parts if part)
+
+class InvoiceGenerator:
+    """
+    Génère des factures Pennylane synthétiques de façon déterministe
+
+    Args:
+        seed: Graine du jeu de données
+        end: Date de la modification la plus récente (défaut: maintenant)
+        days: Profondeur de l'historique en jours
+        recent_bias: Âge moyen (jours) des modifications, distribution exponentielle ;
+            plus la valeur est petite, plus les modifications se concentrent sur les derniers jours
+        customers: Nombre de clients distincts
+        mix: Répartition des cas (voir DEFAULT_MIX)
+    """
+
+    def __init__(self, seed: int = 0, end: Optional[datetime] = None, days: int = 365,
+                 recent_bias: float = 7.0, customers: int = 500,
+                 mix: Optional[Dict[str, float]] = None):
+        self.seed = seed
+        self.end = end or datetime.now(timezone(timedelta(hours=1))).replace(microsecond=0)
+        self.days = days
+        self.recent_bias = recent_bias
+        self.customers = max(1, customers)
+        self.mix = mix or DEFAULT_MIX
+        self.first_invoice_number = 20000
+
+    def _updated_at(self, rng: random.Random) -> datetime:
+        # Exponentielle tronquée : beaucoup de modifications récentes, une longue traîne
+        age_days = min(rng.expovariate(1 / self.recent_bias), self.days) if self.recent_bias > 0 \
+            else rng.uniform(0, self.days)
+        return (self.end - timedelta(days=age_days)).replace(microsecond=0)
+
+    def invoice(self, index: int) -> Dict:
+        """Facture d'index donné (toujours identique pour une même graine)"""
+        rng = random.Random(self.seed * 1_000_000_007 + index)
+        kind = _pick(rng, self.mix)
+        customer_id = 1 + int(self.customers * rng.random() ** 2)  # quelques gros clients
+        client_name = _client_name(customer_id)
+        number = self.first_invoice_number + index
+
+        updated_at = self._updated_at(rng)
+        issued_at = updated_at - timedelta(days=rng.randint(0, 60))
+
+        amount = round(math.exp(rng.gauss(6.5, 1.2)), 2)  # log-normale, médiane ~665 €
+        if kind == 'credit_note':
+            amount = -amount
+            remaining = 0.0
+            status = 'credit_note'
+            paid = False
+        elif kind == 'paid':
+            remaining = 0.0
+            status = 'paid'
+            paid = True
+        elif kind == 'partially_paid':
+            remaining = round(amount * rng.uniform(0.1, 0.9), 2)
+            status = 'partially_paid'
+            paid = False
+        else:
+            remaining = amount
+            status = rng.choice(['upcoming', 'late'])
+            paid = False
+
+        label_format = _pick(rng, LABEL_FORMATS)
+        if kind == 'credit_note' and label_format != 'free_text':
+            label = f"Avoir {client_name} - {number} (label généré)"
+        elif label_format == 'facture':
+            label = f"Facture {client_name} - {number} (label généré)"
+        elif label_format == 'unprefixed':
+            label = f"{client_name} - {number} (label généré)"
+        else:
+            label = f"{client_name} prestation {issued_at.strftime('%m/%Y')}"
+
+        prefix = 'AV' if kind == 'credit_note' else 'F'
+        return {
+            'id': index + 1,
+            'invoice_number': f"{prefix}-{issued_at.year}-{number}",
+            'label': label,
+            'status': status,
+            'paid': paid,
+            'amount': f"{amount:.2f}",
+            'currency': 'EUR',
+            'currency_amount': f"{amount:.2f}",
+            'remaining_amount_with_tax': f"{remaining:.2f}",
+            'date': issued_at.date().isoformat(),
+            'deadline': (issued_at + timedelta(days=30)).date().isoformat(),
+            'customer': {'id': customer_id, 'name': client_name},
+            'created_at': issued_at.isoformat(),
+            'updated_at': updated_at.isoformat(),
+        }
+
+    def iter_invoices(self, count: int, start: int = 0) -> Iterator[Dict]:
+        """Génère `count` factures en flux à partir de l'index `start`"""
+        for index in range(start, start + count):
+            yield self.invoice(index)
+
+def write_jsonl(invoices: Iterator[Dict], output: TextIO) -> int:
+    """Écrit les factures en JSON Lines, retourne le nombre de lignes"""
+    count = 0
+    for invoice in invoices:
+        output.write(json.dumps(invoice, ensure_ascii=False))
+        output.write('\n')
+        count += 1
+    return count
+
+def open_output(path: str) -> TextIO:
+    """Ouvre la sortie ('-' pour stdout, .gz compressé)"""
+    if path == '-':
+        return sys.stdout
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt', encoding='utf-8')
+    return open(path, 'w', encoding='utf-8')
+
+def main():
+    parser = argparse.ArgumentParser(description='Génère des factures Pennylane synthétiques')
+    parser.add_argument('--count', type=int, default=1000, help='Nombre de factures (1k à 1M)')
+    parser.add_argument('--seed', type=int, default=0, help='Graine (jeu reproductible)')
+    parser.add_argument('--days', type=int, default=365, help="Profondeur de l'historique en jours")
+    parser.add_argument('--recent-bias', type=float, default=7.0,
+                        help='Âge moyen des modifications en jours (0 = répartition uniforme)')
+    parser.add_argument('--customers', type=int, default=500, help='Nombre de clients distincts')
+    parser.add_argument('--end', help='Date de la modification la plus récente (ISO 8601, défaut: maintenant)')
+    parser.add_argument('--output', '-o', default='-', help='Fichier JSON Lines (.gz accepté, - pour stdout)')
+    parser.add_argument('--serve', type=int, metavar='PORT',
+                        help='Sert les factures via les APIs simulées (fake_apis.py) au lieu de les écrire')
+    args = parser.parse_args()
+
+    end = datetime.fromisoformat(args.end) if args.end else None
+    generator = InvoiceGenerator(args.seed, end, args.days, args.recent_bias, args.customers)
+
+    if args.serve is not None:
+        from fake_apis import FakeApiServer
+
+        server = FakeApiServer(generator.iter_invoices(args.count), port=args.serve)
+        print(f"✓ {args.count} factures servies sur {server.base_url}/pennylane")
+        for name, value in server.env().items():
+            print(f"  export {name}={value}")
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            print("\nArrêt des APIs simulées")
+        finally:
+            server.httpd.server_close()
+        return
+
+    output = open_output(args.output)
+    try:
+        count = write_jsonl(generator.iter_invoices(args.count), output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"✓ {count} factures générées", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,297 @@
 import os
+import re
 import json
-import uuid
 import time
-from datetime import datetime
-from typing import Dict, Optional
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
+import uuid
+import threading
+from datetime import datetime, timedelta
+from functools import cached_property
+from typing import Callable, Dict, List, Optional, Tuple
 from googleapiclient.errors import HttpError
-from dotenv import load_dotenv
 
-load_dotenv()
+from config import load_env
+from metrics import throttle_sleep, track_api_call
+from rate_limiter import get_rate_limiter
+
+# Métadonnées utiles du classeur : titre et correspondance nom de feuille → sheetId
+# (sans masque, spreadsheets.get renvoie aussi la mise en forme de toutes les feuilles)
+SHEET_METADATA_FIELDS = 'properties.title,sheets.properties(sheetId,title)'
+
+# Espace de noms des ID de tâches (UUIDv5) : une facture dans un état de paiement donné
+# a toujours le même ID, quel que soit le runner ou le nombre de réessais
+TASK_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, 'https://app.pennylane.com/customer_invoices')
+
+def derive_task_id(task_data: Dict) -> str:
+    """
+    ID de la tâche, dérivé (UUIDv5) de la facture Pennylane et de son état de paiement
+    
+    Une même facture dans le même état donne toujours le même ID : un envoi
+    réessayé ou rejoué est reconnu localement, sans relire la feuille. Un
+    nouveau paiement change l'état, donc l'ID. Sans référence de facture,
+    l'ID est aléatoire.
+    """
+    invoice_key = task_data.get('invoice_id') or task_data.get('invoice_number')
+    if not invoice_key:
+        return str(uuid.uuid4())
+    payment_state = task_data.get('payment_status') or task_data.get('task_name', '')
+    name = f"{invoice_key}:{payment_state}:{task_data.get('payment_amount', '')}"
+    return str(uuid.uuid5(TASK_ID_NAMESPACE, name))
+
+# Colonnes A à S de la feuille des tâches
+TASK_COLUMN_COUNT = 19
+
+# Lignes vides laissées sous les tâches quand la grille est réduite après archivage
+ARCHIVE_SPARE_ROWS = 100
+
+class TaskWriteBuffer:
+    """
+    File d'écriture différée (write-behind) des tâches Google Sheets
+    
+    Chaque tâche est ajoutée à un journal JSON Lines local, puis écrite par lots
+    par un thread de fond dès que `batch_size` tâches attendent ou que la plus
+    ancienne attend depuis `max_delay` secondes. Le journal n'est réduit
+    qu'après une écriture réussie : après un arrêt brutal, les tâches en attente
+    sont reprises au démarrage suivant (les ID déterministes rendent la
+    réécriture sans effet).
+    """
+    
+    def __init__(self, write_batch: Callable[[List[Dict]], Dict], journal_path: str,
+                 batch_size: int = 50, max_delay: float = 5.0):
+        self._write_batch = write_batch
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.last_error: Optional[Exception] = None
+        
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._pending = self._load_journal()
+        self._oldest = time.monotonic() if self._pending else None
+        if self._pending:
+            print(f"↻ {len(self._pending)} tâche(s) non écrite(s) reprise(s) depuis {journal_path}")
+        self._journal = open(journal_path, 'a', encoding='utf-8')
+        
+        self._thread = threading.Thread(target=self._run, name='sheets-write-behind', daemon=True)
+        self._thread.start()
+    
+    def _load_journal(self) -> List[Dict]:
+        if not os.path.exists(self.journal_path):
+            return []
+        entries = []
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Dernière ligne tronquée par un arrêt brutal : jamais confirmée à l'appelant
+                    continue
+        return entries
+    
+    def _rewrite_journal(self):
+        """Réécrit le journal avec les seules tâches en attente (appelé sous self._condition)"""
+        self._journal.close()
+        temp_path = f"{self.journal_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for task_data in self._pending:
+                f.write(json.dumps(task_data, ensure_ascii=False, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.journal_path)
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+    
+    @property
+    def pending_count(self) -> int:
+        with self._condition:
+            return len(self._pending)
+    
+    def enqueue(self, task_data: Dict):
+        """Ajoute une tâche à la file, après l'avoir écrite dans le journal"""
+        line = json.dumps(task_data, ensure_ascii=False, default=str)
+        with self._condition:
+            self._journal.write(line + '\n')
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._pending.append(task_data)
+            if self._oldest is None:
+                # File vide : le thread de fond attend sans échéance, il doit calculer celle-ci
+                self._oldest = time.monotonic()
+                self._condition.notify()
+            elif len(self._pending) >= self.batch_size:
+                self._condition.notify()
+    
+    def flush(self) -> bool:
+        """
+        Écrit toutes les tâches en attente
+        
+        Returns:
+            True si la file est vide, False si l'écriture a échoué (tâches conservées)
+        """
+        with self._flush_lock:
+            with self._condition:
+                batch = list(self._pending)
+            if not batch:
+                return True
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                self.last_error = e
+                print(f"⚠ Écriture différée Google Sheets échouée, {len(batch)} tâche(s) conservée(s): {e}")
+                with self._condition:
+                    # Nouvel essai après max_delay
+                    self._oldest = time.monotonic()
+                    self._condition.notify()
+                return False
+            with self._condition:
+                del self._pending[:len(batch)]
+                self._oldest = time.monotonic() if self._pending else None
+                self._rewrite_journal()
+            return True
+    
+    def _due(self) -> bool:
+        return len(self._pending) >= self.batch_size or \
+            (self._oldest is not None and time.monotonic() - self._oldest >= self.max_delay)
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._due():
+                    timeout = None if self._oldest is None else \
+                        max(self._oldest + self.max_delay - time.monotonic(), 0)
+                    self._condition.wait(timeout)
+            self.flush()
+
+class BatchResult:
+    """Résultat d'une requête ajoutée à un SheetsRequestBatch, disponible après son envoi"""
+    
+    __slots__ = ('operation', 'response', 'error')
+    
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.response = None
+        self.error: Optional[Exception] = None
+    
+    def result(self):
+        """Réponse de la requête, ou l'erreur HTTP qu'elle a reçue"""
+        if self.error is not None:
+            raise self.error
+        return self.response
+
+class SheetsRequestBatch:
+    """
+    Regroupe plusieurs opérations Sheets pour limiter les allers-retours HTTP
+    
+    Les requêtes spreadsheets.batchUpdate ajoutées par add_sheet_requests sont
+    fusionnées en un seul batchUpdate (un seul appel au quota) ; les autres
+    requêtes partent avec lui dans une requête HTTP multipart (BatchHttpRequest,
+    un aller-retour, chaque partie restant comptée dans le quota). La réponse ou
+    l'erreur de chaque opération est rendue à son appelant par un BatchResult.
+    
+    Usage:
+        with client.batch() as batch:
+            written = batch.add(values.batchUpdate(...), 'values.batchUpdate')
+            appended = batch.add(values.append(...), 'values.append')
+        appended.result()
+    """
+    
+    def __init__(self, client: 'GoogleSheetsClient'):
+        self.client = client
+        self._requests: List[tuple] = []
+        self._sheet_requests: List[Dict] = []
+        self._sheet_results: List[tuple] = []
+    
+    def add(self, request, operation: str) -> BatchResult:
+        """Ajoute une requête préparée (HttpRequest de googleapiclient)"""
+        result = BatchResult(operation)
+        self._requests.append((request, result))
+        return result
+    
+    def add_sheet_requests(self, requests: List[Dict]) -> BatchResult:
+        """Ajoute des requêtes spreadsheets.batchUpdate ; le résultat est la liste de leurs réponses"""
+        result = BatchResult('batchUpdate')
+        self._sheet_results.append((len(self._sheet_requests), len(requests), result))
+        self._sheet_requests.extend(requests)
+        return result
+    
+    def execute(self):
+        """Envoie les requêtes accumulées (les erreurs sont rendues par chaque BatchResult)"""
+        entries = list(self._requests)
+        merged = None
+        if self._sheet_requests:
+            merged = BatchResult('batchUpdate')
+            entries.append((self.client._spreadsheets.batchUpdate(
+                spreadsheetId=self.client.spreadsheet_id,
+                body={'requests': self._sheet_requests}
+            ), merged))
+        self._requests, self._sheet_requests = [], []
+        
+        if len(entries) == 1:
+            request, result = entries[0]
+            try:
+                result.response = self.client._execute_with_quota_retry(request, result.operation)
+            except HttpError as e:
+                result.error = e
+        elif entries:
+            self._execute_http_batch(entries)
+        
+        if merged is not None:
+            replies = merged.response.get('replies', []) if merged.error is None else []
+            for start, count, result in self._sheet_results:
+                result.error = merged.error
+                result.response = replies[start:start + count]
+        self._sheet_results = []
+    
+    def _execute_http_batch(self, entries: List[tuple]):
+        from googleapiclient.http import BatchHttpRequest
+        
+        def on_response(request_id, response, exception):
+            result = entries[int(request_id)][1]
+            result.response, result.error = response, exception
+        
+        http_batch = BatchHttpRequest(callback=on_response, batch_uri=self.client.batch_uri)
+        for index, (request, _) in enumerate(entries):
+            http_batch.add(request, request_id=str(index))
+            # Chaque partie compte dans le quota Sheets
+            self.client.rate_limiter.acquire()
+        
+        with track_api_call('sheets', 'batch', size=len(entries)) as call:
+            try:
+                http_batch.execute()
+            except HttpError as e:
+                call.status = e.resp.status
+                for _, result in entries:
+                    result.error = e
+                return
+        
+        throttled = [(request, result) for request, result in entries
+                     if isinstance(result.error, HttpError) and result.error.resp.status == 429]
+        if throttled:
+            print(f"⚠️ Quota dépassé, attente de 60 secondes avant de réessayer...")
+            throttle_sleep(60, 'sheets_quota')
+            for request, result in throttled:
+                try:
+                    result.response, result.error = self.client._execute(request, result.operation), None
+                except HttpError as e:
+                    result.error = e
+    
+    def __enter__(self) -> 'SheetsRequestBatch':
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.execute()
 
 class GoogleSheetsClient:
     """Client pour interagir avec Google Sheets"""
     
     def __init__(self):
+        load_env()
         self.credentials_file = os.getenv('GOOGLE_SHEETS_CREDENTIALS_FILE', 'credentials.json')
         self.spreadsheet_id = os.getenv('SPREADSHEET_ID')
         self.sheet_name = os.getenv('SPREADSHEET_NAME')
+        # Point d'accès alternatif de l'API (APIs simulées locales, voir fake_apis.py)
+        self.api_endpoint = os.getenv('GOOGLE_SHEETS_API_ENDPOINT')
+        # Requêtes HTTP multipart (le document de découverte vise toujours l'API de production)
+        self.batch_uri = f"{(self.api_endpoint or 'https://sheets.googleapis.com/').rstrip('/')}/batch"
         
         if not self.spreadsheet_id:
             raise ValueError("SPREADSHEET_ID non définie dans les variables d'environnement")
@@ -27,17 +301,57 @@ class GoogleSheetsClient:
         
         # Configuration des scopes nécessaires
         self.scopes = [
-            'https://www.googleapis.com/auth/spreadsheets',
-            'https://www.googleapis.com/auth/drive'
+            'https://www.googleapis.com/auth/spreadsheets'
         ]
         
-        # Initialisation des services
-        self.credentials = self._get_credentials()
-        self.sheets_service = build('sheets', 'v4', credentials=self.credentials)
-        self.drive_service = build('drive', 'v3', credentials=self.credentials)
+        # Limite de quota partagée et verrou d'écriture (la recherche de la
+        # prochaine ligne vide puis l'écriture ne doivent pas s'entrelacer)
+        self.rate_limiter = get_rate_limiter('sheets')
+        self._write_lock = threading.Lock()
+        
+        # Cache des métadonnées (nom de feuille → sheetId), chargé au premier besoin
+        self.spreadsheet_title = None
+        self._sheet_ids: Optional[Dict[str, int]] = None
+        
+        # Index des tâches présentes (numéro de facture → ligne), chargé par load_task_index
+        self._task_rows: Optional[Dict[str, Dict]] = None
+        
+        # Écriture différée des tâches (SHEETS_WRITE_BEHIND), file créée à la première tâche
+        self.write_behind = os.getenv('SHEETS_WRITE_BEHIND', 'false').lower() == 'true'
+        self.journal_file = os.getenv('SHEETS_JOURNAL_FILE', 'sheets_journal.jsonl')
+        self.flush_size = int(os.getenv('SHEETS_FLUSH_SIZE', '50'))
+        self.flush_interval = float(os.getenv('SHEETS_FLUSH_INTERVAL', '5'))
+        self._write_buffer: Optional[TaskWriteBuffer] = None
+        self._buffer_lock = threading.Lock()
+    
+    @cached_property
+    def sheets_service(self):
+        """Service Sheets v4, construit au premier appel (credentials et googleapiclient chargés à ce moment)"""
+        from googleapiclient.discovery import build
+        
+        client_options = {'api_endpoint': self.api_endpoint} if self.api_endpoint else None
+        # Document de découverte embarqué dans googleapiclient : aucun téléchargement au démarrage
+        return build('sheets', 'v4', credentials=self._get_credentials(), client_options=client_options,
+                     static_discovery=True, cache_discovery=False)
+    
+    # Ressources réutilisées : spreadsheets() et values() reconstruisent leurs
+    # méthodes à partir du document de découverte à chaque appel
+    @cached_property
+    def _spreadsheets(self):
+        return self.sheets_service.spreadsheets()
+    
+    @cached_property
+    def _values(self):
+        return self._spreadsheets.values()
     
     def _get_credentials(self):
         """Charge les credentials depuis le fichier JSON"""
+        if self.api_endpoint and not os.path.exists(self.credentials_file):
+            # Les APIs simulées n'authentifient pas les requêtes
+            from google.auth.credentials import AnonymousCredentials
+            return AnonymousCredentials()
+        
+        from google.oauth2.service_account import Credentials
         try:
             return Credentials.from_service_account_file(
                 self.credentials_file, 
@@ -46,22 +360,59 @@ class GoogleSheetsClient:
         except Exception as e:
             raise Exception(f"Erreur lors du chargement des credentials: {e}")
     
-    def generate_unique_id(self) -> str:
-        """Génère un ID unique aléatoire"""
-        return str(uuid.uuid4())
+    def _execute(self, request, operation: str) -> Dict:
+        """Exécute une requête de l'API Sheets en respectant le quota partagé"""
+        self.rate_limiter.acquire()
+        with track_api_call('sheets', operation) as call:
+            try:
+                return request.execute()
+            except HttpError as e:
+                call.status = e.resp.status
+                raise
+    
+    def batch(self) -> SheetsRequestBatch:
+        """Accumulateur de requêtes, envoyées ensemble à la sortie du bloc `with`"""
+        return SheetsRequestBatch(self)
+    
+    def generate_unique_id(self, task_data: Optional[Dict] = None) -> str:
+        """ID de la tâche, dérivé de la facture et de son état de paiement (voir derive_task_id)"""
+        return derive_task_id(task_data or {})
+    
+    @staticmethod
+    def _is_derived_id(task_id: str) -> bool:
+        """Vrai pour un ID déterministe (UUIDv5), faux pour les ID aléatoires des anciennes lignes"""
+        try:
+            return uuid.UUID(task_id).version == 5
+        except ValueError:
+            return False
+    
+    def load_sheet_ids(self) -> Dict[str, int]:
+        """Charge (une seule requête, masquée par `fields`) la correspondance nom de feuille → sheetId"""
+        spreadsheet = self._execute(self._spreadsheets.get(
+            spreadsheetId=self.spreadsheet_id,
+            fields=SHEET_METADATA_FIELDS
+        ), 'get')
+        
+        self.spreadsheet_title = spreadsheet.get('properties', {}).get('title')
+        self._sheet_ids = {
+            sheet['properties']['title']: sheet['properties']['sheetId']
+            for sheet in spreadsheet.get('sheets', [])
+        }
+        return self._sheet_ids
+    
+    def get_sheet_id(self, title: Optional[str] = None) -> Optional[int]:
+        """sheetId d'une feuille (défaut: la feuille des tâches), depuis le cache des métadonnées"""
+        if self._sheet_ids is None:
+            self.load_sheet_ids()
+        return self._sheet_ids.get(title or self.sheet_name)
     
     def get_or_create_sheet(self) -> str:
         """Trouve ou crée la feuille dans le spreadsheet existant"""
         try:
             # Récupérer les informations du spreadsheet
-            spreadsheet = self.sheets_service.spreadsheets().get(
-                spreadsheetId=self.spreadsheet_id
-            ).execute()
+            sheet_names = list(self.load_sheet_ids())
             
-            sheets = spreadsheet.get('sheets', [])
-            sheet_names = [sheet['properties']['title'] for sheet in sheets]
-            
-            print(f"✓ Spreadsheet trouvé: {spreadsheet['properties']['title']}")
+            print(f"✓ Spreadsheet trouvé: {self.spreadsheet_title}")
             print(f"  Feuilles disponibles: {sheet_names}")
             
             # Vérifier si la feuille existe
@@ -77,30 +428,35 @@ class GoogleSheetsClient:
             return None
     
     def create_sheet(self) -> str:
-        """Crée une nouvelle feuille dans le spreadsheet existant"""
+        """Crée une nouvelle feuille dans le spreadsheet existant, avec ses en-têtes"""
         try:
-            # Créer la nouvelle feuille
-            request = {
-                'addSheet': {
-                    'properties': {
-                        'title': self.sheet_name,
-                        'gridProperties': {
-                            'rowCount': 1000,
-                            'columnCount': 8
+            # sheetId choisi ici : création, en-têtes et mise en forme partent dans le même batchUpdate
+            if self._sheet_ids is None:
+                self.load_sheet_ids()
+            sheet_id = max(self._sheet_ids.values(), default=0) + 1
+            
+            with self.batch() as batch:
+                added = batch.add_sheet_requests([{
+                    'addSheet': {
+                        'properties': {
+                            'sheetId': sheet_id,
+                            'title': self.sheet_name,
+                            'gridProperties': {
+                                'rowCount': 1000,
+                                'columnCount': TASK_COLUMN_COUNT
+                            }
                         }
                     }
-                }
-            }
+                }])
+                headers = batch.add_sheet_requests(self._header_requests(sheet_id))
             
-            self.sheets_service.spreadsheets().batchUpdate(
-                spreadsheetId=self.spreadsheet_id,
-                body={'requests': [request]}
-            ).execute()
+            # La réponse contient les propriétés de la nouvelle feuille : pas de relecture des métadonnées
+            properties = added.result()[0]['addSheet']['properties']
+            self._sheet_ids[properties['title']] = properties['sheetId']
+            headers.result()
             
             print(f"✓ Nouvelle feuille '{self.sheet_name}' créée")
-            
-            # Configurer les en-têtes
-            self.setup_headers()
+            print("✓ En-têtes configurés avec formatage")
             
             return self.sheet_name
             
@@ -108,103 +464,309 @@ class GoogleSheetsClient:
             print(f"Erreur lors de la création de la feuille: {e}")
             return None
     
+    def _header_requests(self, sheet_id: int) -> List[Dict]:
+        """Requêtes batchUpdate écrivant et mettant en forme la ligne d'en-têtes"""
+        headers = [
+            'ID',
+            'Statut', 
+            'Date',
+            'Nom de la tâche',
+            'Champs modifiés',
+            'ID Mission',
+            'Modification faite par',
+            'Commentaire interne'
+        ]
+        
+        return [
+            {
+                'updateCells': {
+                    'start': {'sheetId': sheet_id, 'rowIndex': 0, 'columnIndex': 0},
+                    'rows': [{'values': [{'userEnteredValue': {'stringValue': header}} for header in headers]}],
+                    'fields': 'userEnteredValue'
+                }
+            },
+            {
+                'repeatCell': {
+                    'range': {
+                        'sheetId': sheet_id,
+                        'startRowIndex': 0,
+                        'endRowIndex': 1,
+                        'startColumnIndex': 0,
+                        'endColumnIndex': len(headers)
+                    },
+                    'cell': {
+                        'userEnteredFormat': {
+                            'backgroundColor': {
+                                'red': 0.2,
+                                'green': 0.6,
+                                'blue': 0.9
+                            },
+                            'textFormat': {
+                                'bold': True,
+                                'foregroundColor': {
+                                    'red': 1,
+                                    'green': 1,
+                                    'blue': 1
+                                }
+                            }
+                        }
+                    },
+                    'fields': 'userEnteredFormat(backgroundColor,textFormat)'
+                }
+            },
+            {
+                'autoResizeDimensions': {
+                    'dimensions': {
+                        'sheetId': sheet_id,
+                        'dimension': 'COLUMNS',
+                        'startIndex': 0,
+                        'endIndex': len(headers)
+                    }
+                }
+            }
+        ]
+    
     def setup_headers(self):
-        """Configure les en-têtes de la feuille"""
+        """Configure les en-têtes de la feuille (valeurs et mise en forme en un seul batchUpdate)"""
         try:
-            headers = [
-                'ID',
-                'Statut', 
-                'Date',
-                'Nom de la tâche',
-                'Champs modifiés',
-                'ID Mission',
-                'Modification faite par',
-                'Commentaire interne'
-            ]
+            sheet_id = self.get_sheet_id()
+            if sheet_id is None:
+                print(f"⚠ Feuille '{self.sheet_name}' introuvable, en-têtes non configurés")
+                return
             
-            # Écrire les en-têtes
-            range_name = f'{self.sheet_name}!A1:H1'
-            body = {
-                'values': [headers]
-            }
+            with self.batch() as batch:
+                headers = batch.add_sheet_requests(self._header_requests(sheet_id))
+            headers.result()
             
-            self.sheets_service.spreadsheets().values().update(
-                spreadsheetId=self.spreadsheet_id,
-                range=range_name,
-                valueInputOption='RAW',
-                body=body
-            ).execute()
+            print("✓ En-têtes configurés avec formatage")
             
-            # Formater les en-têtes (gras, couleur de fond)
-            # D'abord récupérer l'ID de la feuille
-            spreadsheet = self.sheets_service.spreadsheets().get(
-                spreadsheetId=self.spreadsheet_id
-            ).execute()
+        except HttpError as e:
+            print(f"Erreur lors de la configuration des en-têtes: {e}")
+    
+    def _read_task_columns(self, fields: Dict[str, str]) -> Dict[str, Dict]:
+        """
+        Lit des colonnes de la feuille par numéro de facture (colonne S), en une seule
+        requête values.batchGet masquée par `fields`
+        
+        Args:
+            fields: Nom du champ → lettre de la colonne (ex: {'id': 'A'})
             
-            sheet_id = None
-            for sheet in spreadsheet.get('sheets', []):
-                if sheet['properties']['title'] == self.sheet_name:
-                    sheet_id = sheet['properties']['sheetId']
-                    break
+        Returns:
+            {numéro de facture: {'row': ligne, champ: valeur, ...}}
+        """
+        columns = list(fields.values()) + ['S']
+        result = self._execute(self._values.batchGet(
+            spreadsheetId=self.spreadsheet_id,
+            ranges=[f'{self.sheet_name}!{column}:{column}' for column in columns],
+            fields='valueRanges.values'
+        ), 'values.batchGet')
+        
+        *values, invoice_numbers = [
+            [row[0] if row else '' for row in value_range.get('values', [])]
+            for value_range in result.get('valueRanges', [])
+        ]
+        
+        task_rows = {}
+        # Ligne 1 : en-têtes
+        for index in range(1, len(invoice_numbers)):
+            if invoice_numbers[index]:
+                task_rows[invoice_numbers[index]] = {'row': index + 1}
+                for name, column_values in zip(fields, values):
+                    task_rows[invoice_numbers[index]][name] = column_values[index] if index < len(column_values) else ''
+        return task_rows
+    
+    def load_task_index(self) -> Dict[str, Dict]:
+        """
+        Indexe les tâches déjà présentes dans la feuille par numéro de facture (colonne S)
+        
+        Une seule lecture (colonnes A, D et S) donne l'ID, le nom de tâche et la
+        ligne de chaque facture : la déduplication ne dépend pas de l'état local.
+        """
+        self._task_rows = self._read_task_columns({'id': 'A', 'task_name': 'D'})
+        return self._task_rows
+    
+    def read_task_statuses(self) -> Dict[str, Dict]:
+        """
+        Statut de chaque tâche, en une seule lecture (colonnes A, B et S)
+        
+        Returns:
+            {numéro de facture: {'row': ligne, 'id': ID, 'status': statut}}
+        """
+        return self._read_task_columns({'id': 'A', 'status': 'B'})
+    
+    def _execute_with_quota_retry(self, request, operation: str) -> Dict:
+        """Exécute une requête, avec un nouvel essai après 60 secondes si le quota est dépassé (429)"""
+        try:
+            return self._execute(request, operation)
+        except HttpError as e:
+            if e.resp.status != 429:
+                raise
+            print(f"⚠️ Quota dépassé, attente de 60 secondes avant de réessayer...")
+            throttle_sleep(60, 'sheets_quota')
+            return self._execute(request, operation)
+    
+    def upsert_tasks(self, tasks: List[Dict]) -> Dict[str, List[str]]:
+        """
+        Écrit un lot de tâches, avec le numéro de facture (colonne S) comme clé
+        
+        - facture absente de la feuille : nouvelle ligne (un seul values.append pour le lot)
+        - facture présente avec le même ID (même état de paiement, voir
+          generate_unique_id) : rien n'est écrit
+        - facture présente avec un autre ID (nouveau paiement) : ID, statut, date,
+          nom de la tâche, montants et commentaire de la ligne existante mis à jour
+          (un seul values.batchUpdate pour le lot) ; l'ID Mission est conservé
+        
+        Les lignes écrites avant les ID déterministes (ID aléatoires) sont comparées
+        sur le nom de la tâche.
+        
+        Returns:
+            Numéros de facture par résultat : {'created': [...], 'updated': [...], 'skipped': [...]}
+        """
+        return self._upsert_tasks(tasks)[0]
+    
+    def _upsert_tasks(self, tasks: List[Dict]) -> Tuple[Dict[str, List[str]], Dict[str, Dict]]:
+        """
+        upsert_tasks, avec une copie des lignes du lot dans l'index des tâches
+        
+        La copie est faite sous _write_lock : un autre lot en échec peut vider
+        l'index (self._task_rows = None) dès le verrou relâché.
+        
+        Returns:
+            (résultat de upsert_tasks, {numéro de facture: {'row', 'id', 'task_name'}})
+        """
+        result = {'created': [], 'updated': [], 'skipped': []}
+        current_datetime = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+        
+        # Une seule écriture par facture dans un lot : la dernière tâche l'emporte
+        latest = {}
+        for index, task_data in enumerate(tasks):
+            latest[task_data.get('invoice_number') or f'#{index}'] = task_data
+        
+        with self._write_lock:
+            if self._task_rows is None:
+                self.load_task_index()
             
-            if sheet_id is not None:
-                requests = [
-                    {
-                        'repeatCell': {
-                            'range': {
-                                'sheetId': sheet_id,
-                                'startRowIndex': 0,
-                                'endRowIndex': 1,
-                                'startColumnIndex': 0,
-                                'endColumnIndex': 8
-                            },
-                            'cell': {
-                                'userEnteredFormat': {
-                                    'backgroundColor': {
-                                        'red': 0.2,
-                                        'green': 0.6,
-                                        'blue': 0.9
-                                    },
-                                    'textFormat': {
-                                        'bold': True,
-                                        'foregroundColor': {
-                                            'red': 1,
-                                            'green': 1,
-                                            'blue': 1
-                                        }
-                                    }
-                                }
-                            },
-                            'fields': 'userEnteredFormat(backgroundColor,textFormat)'
-                        }
-                    },
-                    {
-                        'autoResizeDimensions': {
-                            'dimensions': {
-                                'sheetId': sheet_id,
-                                'dimension': 'COLUMNS',
-                                'startIndex': 0,
-                                'endIndex': 8
-                            }
-                        }
-                    }
-                ]
+            updates = []
+            updated = []
+            new_rows = []
+            created = []
+            for task_data in latest.values():
+                invoice_number = task_data.get('invoice_number', '')
+                task_name = task_data.get('task_name', 'Règlement de facture')
+                task_id = self.generate_unique_id(task_data)
+                existing = self._task_rows.get(invoice_number) if invoice_number else None
                 
-                self.sheets_service.spreadsheets().batchUpdate(
+                if existing and (existing['id'] == task_id or
+                                 (not self._is_derived_id(existing['id']) and existing['task_name'] == task_name)):
+                    result['skipped'].append(invoice_number)
+                elif existing:
+                    row = existing['row']
+                    updates.append({
+                        'range': f'{self.sheet_name}!A{row}:E{row}',
+                        'values': [[task_id, 'À faire', current_datetime, task_name,
+                                    task_data.get('champs_modifies', '')]]
+                    })
+                    updates.append({
+                        'range': f'{self.sheet_name}!H{row}',
+                        'values': [[task_data.get('commentaire_interne', '')]]
+                    })
+                    updated.append((invoice_number, task_id, task_name))
+                else:
+                    new_rows.append([
+                        task_id,  # A - ID dérivé de la facture et de son état de paiement
+                        'À faire',  # B - Statut
+                        current_datetime,  # C - Date = date du jour et heure
+                        task_name,  # D - Nom de la tâche
+                        task_data.get('champs_modifies', ''),  # E - Champs modifiés avec détails
+                        '',  # F - ID Mission = vide
+                        'Pennylane',  # G - Modification faite par
+                        task_data.get('commentaire_interne', ''),  # H - Commentaire interne avec statut
+                        '', '', '',  # I à K
+                        task_data.get('client_name', ''),  # L - ID client tempo
+                        '', '', '', '', '', '',  # M à R
+                        invoice_number,  # S - Numéro de contrat Tempo
+                    ])
+                    created.append((invoice_number, task_id, task_name))
+            
+            # Mise à jour et ajout envoyés dans la même requête HTTP multipart
+            with self.batch() as batch:
+                written = batch.add(self._values.batchUpdate(
+                    spreadsheetId=self.spreadsheet_id,
+                    body={'valueInputOption': 'RAW', 'data': updates}
+                ), 'values.batchUpdate') if updates else None
+                appended = batch.add(self._values.append(
                     spreadsheetId=self.spreadsheet_id,
-                    body={'requests': requests}
-                ).execute()
+                    range=f'{self.sheet_name}!A:S',
+                    valueInputOption='RAW',
+                    insertDataOption='INSERT_ROWS',
+                    body={'values': new_rows}
+                ), 'values.append') if new_rows else None
             
-            print("✓ En-têtes configurés avec formatage")
+            try:
+                if written:
+                    written.result()
+                    for invoice_number, task_id, task_name in updated:
+                        self._task_rows[invoice_number].update(id=task_id, task_name=task_name)
+                        result['updated'].append(invoice_number)
+                
+                if appended:
+                    first_row = self._first_updated_row(appended.result())
+                    for offset, (invoice_number, task_id, task_name) in enumerate(created):
+                        if invoice_number:
+                            self._task_rows[invoice_number] = {
+                                'row': first_row + offset if first_row else None,
+                                'id': task_id,
+                                'task_name': task_name,
+                            }
+                        result['created'].append(invoice_number)
+            except HttpError:
+                # Une des deux écritures a pu aboutir : l'index sera relu avant le prochain lot
+                self._task_rows = None
+                raise
             
-        except HttpError as e:
-            print(f"Erreur lors de la configuration des en-têtes: {e}")
+            rows = {invoice_number: dict(self._task_rows[invoice_number])
+                    for invoice_number in latest if invoice_number in self._task_rows}
+        
+        return result, rows
+    
+    @staticmethod
+    def _first_updated_row(append_response: Dict) -> Optional[int]:
+        """Première ligne écrite par values.append ('Tâches'!A12:S13 → 12)"""
+        match = re.search(r'![A-Z]+(\d+)', append_response.get('updates', {}).get('updatedRange', ''))
+        return int(match.group(1)) if match else None
+    
+    def _write_buffered(self, tasks: List[Dict]) -> Dict[str, List[str]]:
+        """Écrit un lot de la file d'écriture différée"""
+        result = self.upsert_tasks(tasks)
+        print(f"✓ Google Sheets: {len(result['created'])} tâche(s) créée(s), "
+              f"{len(result['updated'])} mise(s) à jour, {len(result['skipped'])} déjà présente(s)")
+        return result
+    
+    @property
+    def write_buffer(self) -> TaskWriteBuffer:
+        """File d'écriture différée, créée au premier appel (reprend le journal d'un arrêt brutal)"""
+        with self._buffer_lock:
+            if self._write_buffer is None:
+                self._write_buffer = TaskWriteBuffer(self._write_buffered, self.journal_file,
+                                                     self.flush_size, self.flush_interval)
+            return self._write_buffer
+    
+    def flush(self) -> bool:
+        """
+        Écrit les tâches en attente de la file d'écriture différée (fin d'exécution)
+        
+        Returns:
+            True si aucune tâche ne reste en attente
+        """
+        if self._write_buffer is None:
+            return True
+        return self._write_buffer.flush()
     
     def create_task(self, task_data: Dict) -> bool:
         """
-        Crée une nouvelle tâche dans la feuille
+        Crée une nouvelle tâche dans la feuille (voir upsert_tasks)
         Format spécifié par l'utilisateur avec calculs de montants améliorés:
-        - ID: ID unique aléatoire
+        - ID: dérivé de la facture et de son état de paiement (UUIDv5)
         - Statut: "A faire"
         - Date: date du jour et heure (horodatage)
         - Nom de la tâche: "Règlement de facture" ou "Règlement partiel de facture"
@@ -214,112 +776,161 @@ class GoogleSheetsClient:
         - Commentaire interne: "Date facture : X / Client / Statut : X (X%)"
         - Colonne L: ID client tempo = nom du client extrait du libellé
         - Colonne S: Numéro de contrat Tempo = numéro de facture
+        
+        Une facture déjà présente n'est pas dupliquée : sa ligne est mise à jour
+        si l'état de paiement a changé, laissée telle quelle sinon.
+        
+        Avec SHEETS_WRITE_BEHIND=true, la tâche est seulement ajoutée à la file
+        d'écriture différée (voir TaskWriteBuffer et flush).
         """
+        invoice_number = task_data.get('invoice_number', '')
+        if self.write_behind:
+            self.write_buffer.enqueue(task_data)
+            print(f"⧗ Tâche de la facture {invoice_number or 'N/A'} en file d'écriture Google Sheets")
+            return True
+        
         try:
-            # Préparer les données selon le format spécifié
-            current_datetime = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
-            unique_id = self.generate_unique_id()
-
-            # Utiliser les nouvelles données calculées
-            row_data = [
-                unique_id,  # ID = ID unique aléatoire
-                'À faire',  # Statut
-                current_datetime,  # Date = date du jour et heure
-                task_data.get('task_name', 'Règlement de facture'),  # Nom de la tâche
-                task_data.get('champs_modifies', ''),  # Champs modifiés avec détails
-                '',  # ID Mission = vide
-                'Pennylane',  # Modification faite par
-                task_data.get('commentaire_interne', '')  # Commentaire interne avec statut
-            ]
-
-            # Trouver la prochaine ligne vide dans la feuille spécifiée
-            range_name = f'{self.sheet_name}!A:A'
-            result = self.sheets_service.spreadsheets().values().get(
-                spreadsheetId=self.spreadsheet_id,
-                range=range_name
-            ).execute()
-
-            # Délai de 1 seconde pour respecter les limites de quota
-            time.sleep(1)
-
-            values = result.get('values', [])
-            next_row = len(values) + 1
-
-            # Écrire la nouvelle ligne principale (colonnes A à H)
-            range_name = f'{self.sheet_name}!A{next_row}:H{next_row}'
-            body = {
-                'values': [row_data]
-            }
-
-            self.sheets_service.spreadsheets().values().update(
+            result, rows = self._upsert_tasks([task_data])
+        except HttpError as e:
+            # Écriture partielle possible : relire la feuille avant la prochaine tâche
+            self._task_rows = None
+            print(f"Erreur lors de la création de la tâche: {e}")
+            return False
+        
+        entry = rows.get(invoice_number, {}) if invoice_number else {}
+        if result['skipped']:
+            print(f"↷ Facture {invoice_number} déjà présente à la ligne {entry.get('row', '?')} "
+                  f"dans '{self.sheet_name}'")
+            return True
+        
+        print(f"✓ Tâche {'mise à jour' if result['updated'] else 'créée'} à la ligne {entry.get('row', '?')} "
+              f"dans '{self.sheet_name}' (ID: {entry.get('id', 'N/A')})")
+        print(f"  - {task_data.get('payment_status', 'N/A')} ({task_data.get('payment_percentage', 0):.0f}%)")
+        print(f"  - Montant payé: {task_data.get('payment_amount', 'N/A')} sur {task_data.get('total_amount', 'N/A')}")
+        print(f"  - Numéro facture: {task_data.get('invoice_number', 'N/A')} (colonne S)")
+        print(f"  - Client: {task_data.get('client_name', 'N/A')} (colonne L)")
+        return True
+    
+    def archive_tasks(self, days: int, archive_spreadsheet_id: Optional[str] = None) -> Dict:
+        """
+        Archive les tâches traitées (statut autre que "À faire") datant de plus de `days` jours
+        
+        Les lignes sont déplacées dans un onglet mensuel « Archive AAAA-MM » (mois de
+        la colonne Date), dans ce classeur ou dans le classeur d'archive
+        (`archive_spreadsheet_id`, défaut: ARCHIVE_SPREADSHEET_ID). Une lecture de
+        la feuille, puis une requête batchUpdate : copie (appendCells), suppression
+        des lignes (deleteDimension) et réduction du nombre de lignes de la grille
+        (updateSheetProperties, ARCHIVE_SPARE_ROWS lignes vides conservées).
+        Dans le même classeur, copie et suppression sont appliquées ensemble ;
+        avec un classeur d'archive, la copie est faite avant la suppression.
+        
+        Returns:
+            {'archived': nombre de lignes, 'tabs': {onglet: nombre de lignes}}
+        """
+        target_id = archive_spreadsheet_id or os.getenv('ARCHIVE_SPREADSHEET_ID') or self.spreadsheet_id
+        external = target_id != self.spreadsheet_id
+        cutoff = datetime.now() - timedelta(days=days)
+        
+        with self._write_lock:
+            rows = self._execute(self._values.get(
                 spreadsheetId=self.spreadsheet_id,
-                range=range_name,
-                valueInputOption='RAW',
-                body=body
-            ).execute()
-
-            # Délai de 1 seconde après l'écriture
-            time.sleep(1)
-
-            # Écrire le nom du client dans la colonne L (ID client tempo)
-            client_range = f'{self.sheet_name}!L{next_row}'
-            client_body = {
-                'values': [[task_data.get('client_name', '')]]
-            }
+                range=f'{self.sheet_name}!A:S'
+            ), 'values.get').get('values', [])
             
-            self.sheets_service.spreadsheets().values().update(
-                spreadsheetId=self.spreadsheet_id,
-                range=client_range,
-                valueInputOption='RAW',
-                body=client_body
-            ).execute()
-
-            # Délai de 1 seconde
-            time.sleep(1)
-
-            # Écrire le numéro de facture dans la colonne S (Numéro de contrat Tempo)
-            invoice_range = f'{self.sheet_name}!S{next_row}'
-            invoice_body = {
-                'values': [[task_data.get('invoice_number', '')]]
+            headers = rows[0] if rows else []
+            tabs: Dict[str, List[List[str]]] = {}
+            archived_indexes = []
+            for index, row in enumerate(rows[1:], start=1):
+                status = row[1] if len(row) > 1 else ''
+                if not row or status in ('', 'À faire'):
+                    continue
+                try:
+                    task_date = datetime.strptime(row[2][:10], '%d/%m/%Y') if len(row) > 2 else None
+                except ValueError:
+                    task_date = None
+                if task_date is None or task_date >= cutoff:
+                    continue
+                tabs.setdefault(f"Archive {task_date.strftime('%Y-%m')}", []).append(row)
+                archived_indexes.append(index)
+            
+            # Onglets d'archive manquants, créés avec la ligne d'en-têtes
+            if external:
+                target_ids = {
+                    sheet['properties']['title']: sheet['properties']['sheetId']
+                    for sheet in self._execute(self._spreadsheets.get(
+                        spreadsheetId=target_id, fields=SHEET_METADATA_FIELDS
+                    ), 'get').get('sheets', [])
+                }
+            else:
+                target_ids = dict(self._sheet_ids if self._sheet_ids is not None else self.load_sheet_ids())
+            missing = [title for title in sorted(tabs) if title not in target_ids]
+            if missing:
+                response = self._execute(self._spreadsheets.batchUpdate(
+                    spreadsheetId=target_id,
+                    body={'requests': [{'addSheet': {'properties': {
+                        'title': title,
+                        'gridProperties': {'rowCount': 1, 'columnCount': TASK_COLUMN_COUNT},
+                    }}} for title in missing]}
+                ), 'batchUpdate')
+                for reply in response.get('replies', []):
+                    properties = reply['addSheet']['properties']
+                    target_ids[properties['title']] = properties['sheetId']
+                    if not external and self._sheet_ids is not None:
+                        self._sheet_ids[properties['title']] = properties['sheetId']
+                for title in missing:
+                    tabs[title].insert(0, headers)
+            
+            copy_requests = [{
+                'appendCells': {
+                    'sheetId': target_ids[title],
+                    'rows': [{'values': [{'userEnteredValue': {'stringValue': value}} for value in row]}
+                             for row in tab_rows],
+                    'fields': 'userEnteredValue',
+                }
+            } for title, tab_rows in sorted(tabs.items())]
+            
+            # Suppression par blocs de lignes contiguës, du bas vers le haut
+            blocks = []
+            for index in archived_indexes:
+                if blocks and blocks[-1][1] == index:
+                    blocks[-1][1] = index + 1
+                else:
+                    blocks.append([index, index + 1])
+            sheet_id = self.get_sheet_id()
+            delete_requests = [{
+                'deleteDimension': {
+                    'range': {'sheetId': sheet_id, 'dimension': 'ROWS', 'startIndex': start, 'endIndex': end}
+                }
+            } for start, end in reversed(blocks)]
+            shrink_request = {
+                'updateSheetProperties': {
+                    'properties': {
+                        'sheetId': sheet_id,
+                        'gridProperties': {
+                            'rowCount': max(len(rows) - len(archived_indexes), 1) + ARCHIVE_SPARE_ROWS,
+                        },
+                    },
+                    'fields': 'gridProperties.rowCount',
+                }
             }
             
-            self.sheets_service.spreadsheets().values().update(
+            if external and copy_requests:
+                self._execute(self._spreadsheets.batchUpdate(
+                    spreadsheetId=target_id, body={'requests': copy_requests}
+                ), 'batchUpdate')
+                copy_requests = []
+            self._execute(self._spreadsheets.batchUpdate(
                 spreadsheetId=self.spreadsheet_id,
-                range=invoice_range,
-                valueInputOption='RAW',
-                body=invoice_body
-            ).execute()
-
-            # Délai de 1 seconde après l'écriture
-            time.sleep(1)
-
-            print(f"✓ Tâche créée à la ligne {next_row} dans '{self.sheet_name}' (ID: {unique_id})")
-            print(f"  - {task_data.get('payment_status', 'N/A')} ({task_data.get('payment_percentage', 0):.0f}%)")
-            print(f"  - Montant payé: {task_data.get('payment_amount', 'N/A')} sur {task_data.get('total_amount', 'N/A')}")
-            print(f"  - Numéro facture: {task_data.get('invoice_number', 'N/A')} (colonne S)")
-            print(f"  - Client: {task_data.get('client_name', 'N/A')} (colonne L)")
-            return True
-
-        except HttpError as e:
-            if e.resp.status == 429:
-                print(f"⚠️ Quota dépassé, attente de 60 secondes avant de réessayer...")
-                time.sleep(60)
-                # Réessayer une fois après l'attente
-                try:
-                    self.sheets_service.spreadsheets().values().update(
-                        spreadsheetId=self.spreadsheet_id,
-                        range=range_name,
-                        valueInputOption='RAW',
-                        body=body
-                    ).execute()
-                    print(f"✓ Tâche créée après réessai (ID: {unique_id})")
-                    return True
-                except HttpError as retry_error:
-                    print(f"✗ Échec du réessai: {retry_error}")
-                    return False
-            else:
-                print(f"Erreur lors de la création de la tâche: {e}")
-                return False
+                body={'requests': copy_requests + delete_requests + [shrink_request]}
+            ), 'batchUpdate')
+            
+            # Les numéros de ligne ont changé : l'index sera relu à la prochaine tâche
+            self._task_rows = None
+        
+        return {
+            'archived': len(archived_indexes),
+            'tabs': {title: len(tab_rows) - (title in missing) for title, tab_rows in tabs.items()},
+        }
     
     def setup_spreadsheet(self):
         """Configuration initiale de la feuille"""
@@ -331,6 +942,17 @@ class GoogleSheetsClient:
         if sheet_name:
             print(f"✓ Feuille configurée: {sheet_name}")
             print(f"  URL: https://docs.google.com/spreadsheets/d/{self.spreadsheet_id}")
+            
+            # Index de déduplication des tâches déjà présentes dans la feuille
+            try:
+                task_rows = self.load_task_index()
+                print(f"✓ {len(task_rows)} facture(s) déjà présente(s) dans la feuille")
+            except HttpError as e:
+                print(f"⚠ Lecture des tâches existantes impossible, nouvel essai à la première tâche: {e}")
+            
+            # Reprise des tâches restées dans le journal d'écriture différée
+            if self.write_behind:
+                print(f"✓ Écriture différée activée ({self.write_buffer.pending_count} tâche(s) en attente)")
         else:
             print("✗ Erreur lors de la configuration de la feuille")
             raise Exception("Impossible de configurer la feuille")
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Classification en colonnes des lots de factures
+
+Un lot de factures (une page de l'API ou l'historique complet) est chargé
+en colonnes NumPy : montant, reste à payer, updated_at (jour calendaire
+dans le fuseau de l'API et horodatage) et code de statut. La classification
+payée / partiellement payée / sans paiement et les fenêtres de dates sont
+alors des comparaisons vectorisées avec des bornes calculées une seule
+fois. Chaque colonne est construite à son premier usage puis réutilisée :
+chaque fenêtre supplémentaire sur le même lot ne coûte que quelques
+millisecondes, et le résumé jour par jour d'un historique se fait en une
+passe (numpy.bincount).
+
+Les fonctions de sélection (classify_window, select_paid_on,
+select_paid_since, select_with_payment_since, daily_summary) sont
+partagées par les intégrations (main.py, tempo_integration.py) : sans colonnes, elles parcourent les factures une à une. Pour
+une seule fenêtre, ce parcours reste plus rapide que le chargement des
+colonnes depuis les InvoiceRecord ; les colonnes servent aux analyses qui
+interrogent plusieurs fois le même lot :
+
+    python invoice_columns.py --file factures.jsonl.gz --since 2024-01-01
+    python invoice_columns.py --since 2024-05-01 --until 2024-05-31   # factures Pennylane
+"""
+
+import sys
+import argparse
+from datetime import date, datetime, timedelta
+from functools import cached_property
+from operator import attrgetter
+from typing import Dict, List, Optional, Tuple
+
+from invoice_record import InvoiceRecord, normalize_invoices
+
+try:
+    import numpy
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Classification des paiements (voir InvoiceRecord.payment_status)
+PAYMENT_NONE = 0
+PAYMENT_PARTIAL = 1
+PAYMENT_PAID = 2
+
+# Codes des statuts Pennylane (les statuts inconnus partagent le code 0)
+STATUS_CODES = {
+    'credit_note': 1,
+    'paid': 2,
+    'partially_paid': 3,
+    'upcoming': 4,
+    'late': 5,
+    'draft': 6,
+    'cancelled': 7,
+}
+
+# Jour d'une facture sans updated_at : hors de toute fenêtre
+MISSING_DAY = -1
+
+class InvoiceColumns:
+    """Colonnes NumPy d'un lot de factures, dans l'ordre du lot (numpy requis)"""
+
+    def __init__(self, records: List[InvoiceRecord]):
+        if not NUMPY_AVAILABLE:
+            raise ValueError("Classification en colonnes indisponible : installer numpy (pip install numpy)")
+        self.records = records
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _column(self, field: str, dtype, convert=None):
+        # numpy.fromiter remplit la colonne sans liste intermédiaire
+        values = map(attrgetter(field), self.records)
+        if convert is not None:
+            values = map(convert, values)
+        return numpy.fromiter(values, dtype=dtype, count=len(self.records))
+
+    @cached_property
+    def amount(self):
+        return self._column('amount', numpy.float64)
+
+    @cached_property
+    def remaining(self):
+        return self._column('remaining_amount', numpy.float64)
+
+    @cached_property
+    def updated_day(self):
+        """Jour calendaire (ordinal) de updated_at dans le fuseau de l'API ; MISSING_DAY s'il est absent"""
+        return self._column('updated_at', numpy.int32,
+                            lambda updated_at: updated_at.toordinal() if updated_at is not None else MISSING_DAY)
+
+    @cached_property
+    def updated_ts(self):
+        """Horodatage (secondes) de updated_at, sans fuseau = heure locale ; NaN s'il est absent"""
+        return self._column('updated_at', numpy.float64,
+                            lambda updated_at: updated_at.timestamp() if updated_at is not None else numpy.nan)
+
+    @cached_property
+    def status_code(self):
+        return self._column('status', numpy.int8, lambda status: STATUS_CODES.get(status, 0))
+
+    @cached_property
+    def payment_code(self):
+        """PAYMENT_PAID, PAYMENT_PARTIAL ou PAYMENT_NONE pour chaque facture"""
+        paid_amount = self.amount - self.remaining
+        paid = (paid_amount >= self.amount) | (self.remaining <= 0)
+        codes = numpy.full(len(self.records), PAYMENT_NONE, dtype=numpy.int8)
+        codes[~paid & (paid_amount > 0)] = PAYMENT_PARTIAL
+        codes[paid] = PAYMENT_PAID
+        return codes
+
+    @cached_property
+    def regular(self):
+        """Factures hors avoirs"""
+        return self.status_code != STATUS_CODES['credit_note']
+
+    @cached_property
+    def _objects(self):
+        return numpy.fromiter(self.records, dtype=object, count=len(self.records))
+
+    def day_mask(self, start_day: date, end_day: Optional[date] = None):
+        """Factures modifiées entre deux jours inclus"""
+        start = start_day.toordinal()
+        end = (end_day or start_day).toordinal()
+        return (self.updated_day >= start) & (self.updated_day <= end)
+
+    def since_mask(self, since: datetime, until: Optional[datetime] = None):
+        """Factures modifiées dans [since, until[ (dates avec fuseau)"""
+        # NaN (updated_at absent) échoue à toutes les comparaisons
+        mask = self.updated_ts >= since.timestamp()
+        if until is not None:
+            mask &= self.updated_ts < until.timestamp()
+        return mask
+
+    def take(self, mask) -> List[InvoiceRecord]:
+        """Factures sélectionnées par un masque, dans l'ordre du lot"""
+        return self._objects[mask].tolist()
+
+def classify_window(invoices: List[InvoiceRecord], start_day: date, end_day: Optional[date] = None,
+                    columns: Optional[InvoiceColumns] = None
+                    ) -> Tuple[List[InvoiceRecord], List[InvoiceRecord], List[InvoiceRecord]]:
+    """
+    Classe les factures modifiées entre deux jours inclus
+
+    Args:
+        columns: Colonnes du lot (InvoiceColumns(invoices)) pour une classification vectorisée
+
+    Returns:
+        (factures hors avoirs, factures payées, factures partiellement payées)
+    """
+    if columns is not None:
+        selected = columns.regular & columns.day_mask(start_day, end_day)
+        return (columns.take(columns.regular),
+                columns.take(selected & (columns.payment_code == PAYMENT_PAID)),
+                columns.take(selected & (columns.payment_code == PAYMENT_PARTIAL)))
+
+    end_day = end_day or start_day
+    regular_invoices = [inv for inv in invoices if not inv.is_credit_note]
+    paid_invoices = []
+    partially_paid_invoices = []
+    for invoice in regular_invoices:
+        if not invoice.updated_between(start_day, end_day):
+            continue
+        payment_status = invoice.payment_status
+        if payment_status == "Payée":
+            paid_invoices.append(invoice)
+        elif payment_status == "Partiellement payée":
+            partially_paid_invoices.append(invoice)
+    return regular_invoices, paid_invoices, partially_paid_invoices
+
+def select_paid_on(invoices: List[InvoiceRecord], day: date,
+                   columns: Optional[InvoiceColumns] = None) -> Tuple[List[InvoiceRecord], List[InvoiceRecord]]:
+    """
+    Sélectionne les factures avec un montant payé positif, modifiées le jour donné
+
+    Returns:
+        (factures hors avoirs, factures avec paiement)
+    """
+    if columns is not None:
+        paid = (columns.amount - columns.remaining) > 0
+        return columns.take(columns.regular), columns.take(columns.regular & columns.day_mask(day) & paid)
+
+    regular_invoices = [inv for inv in invoices if not inv.is_credit_note]
+    return regular_invoices, [inv for inv in regular_invoices if inv.updated_on(day) and inv.paid_amount > 0]
+
+def select_paid_since(invoices: List[InvoiceRecord], since: datetime, until: Optional[datetime] = None,
+                      columns: Optional[InvoiceColumns] = None) -> List[InvoiceRecord]:
+    """Factures hors avoirs avec un montant payé positif, modifiées dans [since, until["""
+    if columns is not None:
+        paid = (columns.amount - columns.remaining) > 0
+        return columns.take(columns.regular & columns.since_mask(since, until) & paid)
+
+    return [
+        inv for inv in invoices
+        if not inv.is_credit_note
+        and inv.updated_since(since)
+        and (until is None or not inv.updated_since(until))
+        and inv.paid_amount > 0
+    ]
+
+def select_with_payment_since(invoices: List[InvoiceRecord], since: datetime, until: Optional[datetime] = None,
+                              columns: Optional[InvoiceColumns] = None) -> List[InvoiceRecord]:
+    """Factures hors avoirs payées ou partiellement payées, modifiées dans [since, until["""
+    if columns is not None:
+        return columns.take(columns.regular & columns.since_mask(since, until)
+                            & (columns.payment_code != PAYMENT_NONE))
+
+    return [
+        inv for inv in invoices
+        if not inv.is_credit_note
+        and inv.updated_since(since)
+        and (until is None or not inv.updated_since(until))
+        and inv.payment_status is not None
+    ]
+
+def daily_summary(invoices: List[InvoiceRecord], start_day: date, end_day: date,
+                  columns: Optional[InvoiceColumns] = None) -> List[Dict]:
+    """
+    Factures payées / partiellement payées et montant payé, par jour de modification
+
+    Returns:
+        Une entrée par jour de [start_day, end_day] :
+        {'day', 'paid', 'partially_paid', 'paid_amount'}
+    """
+    days = (end_day - start_day).days + 1
+    if days <= 0:
+        return []
+
+    if columns is not None:
+        selected = columns.regular & columns.day_mask(start_day, end_day) & (columns.payment_code != PAYMENT_NONE)
+        offsets = columns.updated_day[selected] - start_day.toordinal()
+        codes = columns.payment_code[selected]
+        paid = numpy.bincount(offsets[codes == PAYMENT_PAID], minlength=days)
+        partial = numpy.bincount(offsets[codes == PAYMENT_PARTIAL], minlength=days)
+        amounts = numpy.bincount(offsets, weights=(columns.amount - columns.remaining)[selected], minlength=days)
+        counts = zip(paid.tolist(), partial.tolist(), amounts.tolist())
+    else:
+        totals = [[0, 0, 0.0] for _ in range(days)]
+        start = start_day.toordinal()
+        for invoice in invoices:
+            if invoice.is_credit_note or not invoice.updated_between(start_day, end_day):
+                continue
+            payment_status = invoice.payment_status
+            if payment_status is None:
+                continue
+            total = totals[invoice.updated_at.toordinal() - start]
+            total[0 if payment_status == "Payée" else 1] += 1
+            total[2] += invoice.paid_amount
+        counts = totals
+
+    return [
+        {'day': start_day + timedelta(days=offset), 'paid': paid, 'partially_paid': partial, 'paid_amount': amount}
+        for offset, (paid, partial, amount) in enumerate(counts)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description='Résumé jour par jour des factures payées')
+    parser.add_argument('--file', help='Factures au format JSON Lines (.gz accepté, voir generate_invoices.py) '
+                                       'au lieu de l\'API Pennylane')
+    parser.add_argument('--since', required=True, help='Premier jour (AAAA-MM-JJ)')
+    parser.add_argument('--until', help='Dernier jour inclus (AAAA-MM-JJ, défaut: aujourd\'hui)')
+    args = parser.parse_args()
+
+    from backfill import parse_date
+    start_day = parse_date(args.since)
+    end_day = parse_date(args.until) if args.until else datetime.now().date()
+
+    if args.file:
+        from fake_apis import load_invoices_jsonl
+        invoices = normalize_invoices(load_invoices_jsonl(args.file))
+    else:
+        from pennylane_client import PennylaneClient
+        invoices = normalize_invoices(PennylaneClient().get_all_invoices())
+
+    columns = InvoiceColumns(invoices) if NUMPY_AVAILABLE else None
+    if columns is None:
+        print("⚠ numpy non installé : classification facture par facture", file=sys.stderr)
+
+    for entry in daily_summary(invoices, start_day, end_day, columns):
+        print(f"{entry['day'].isoformat()}  payées: {entry['paid']:>6}  partielles: {entry['partially_paid']:>6}  "
+              f"montant payé: {entry['paid_amount']:>14.2f}€")
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+class DurableInvoiceQueue:
+    """File d'attente persistante (SQLite) des factures Pennylane à traiter"""
+
+    def __init__(self, db_path: Optional[str] = None, max_attempts: int = 5,
+                 retry_delay: float = 5.0):
+        self.db_path = db_path or os.getenv('INVOICE_QUEUE_DB', 'invoice_queue.db')
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            '''CREATE TABLE IF NOT EXISTS invoice_queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                invoice_id TEXT NOT NULL,
+                event_type TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                available_at REAL NOT NULL DEFAULT 0,
+                enqueued_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )'''
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_invoice_queue_status ON invoice_queue (status, id)'
+        )
+
+        # Les éléments en cours lors d'un arrêt brutal redeviennent disponibles
+        self._conn.execute(
+            "UPDATE invoice_queue SET status = 'pending' WHERE status = 'processing'"
+        )
+        self._conn.commit()
+
+    def put(self, invoice_id, event_type: Optional[str] = None) -> bool:
+        """
+        Ajoute une facture à la file
+
+        Une facture déjà en attente n'est pas ajoutée une seconde fois :
+        son traitement lira de toute façon l'état le plus récent.
+
+        Returns:
+            True si la facture a été ajoutée, False si elle était déjà en attente
+        """
+        invoice_id = str(invoice_id)
+        now = datetime.now().isoformat()
+
+        with self._available:
+            existing = self._conn.execute(
+                "SELECT 1 FROM invoice_queue WHERE invoice_id = ? AND status = 'pending'",
+                (invoice_id,)
+            ).fetchone()
+            if existing:
+                return False
+
+            self._conn.execute(
+                'INSERT INTO invoice_queue (invoice_id, event_type, enqueued_at, updated_at) '
+                'VALUES (?, ?, ?, ?)',
+                (invoice_id, event_type, now, now)
+            )
+            self._conn.commit()
+            self._available.notify()
+            return True
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """
+        Réserve le prochain élément en attente
+
+        Args:
+            timeout: Délai d'attente maximal en secondes (None = attente infinie)
+
+        Returns:
+            Dict avec 'id', 'invoice_id', 'event_type', 'attempts' ou None si la file est vide
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._available:
+            while True:
+                now = time.time()
+                row = self._conn.execute(
+                    "SELECT id, invoice_id, event_type, attempts FROM invoice_queue "
+                    "WHERE status = 'pending' AND available_at <= ? ORDER BY id LIMIT 1",
+                    (now,)
+                ).fetchone()
+
+                if row:
+                    self._conn.execute(
+                        "UPDATE invoice_queue SET status = 'processing', updated_at = ? WHERE id = ?",
+                        (datetime.now().isoformat(), row[0])
+                    )
+                    self._conn.commit()
+                    return {'id': row[0], 'invoice_id': row[1], 'event_type': row[2], 'attempts': row[3]}
+
+                # Attendre le prochain élément différé (réessai) ou un nouvel ajout
+                wait = None
+                next_retry = self._conn.execute(
+                    "SELECT MIN(available_at) FROM invoice_queue WHERE status = 'pending'"
+                ).fetchone()[0]
+                if next_retry is not None:
+                    wait = max(next_retry - now, 0.01)
+
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._available.wait(wait)
+
+    def ack(self, entry_id: int):
+        """Marque un élément comme traité"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE invoice_queue SET status = 'done', updated_at = ? WHERE id = ?",
+                (datetime.now().isoformat(), entry_id)
+            )
+            self._conn.commit()
+
+    def nack(self, entry_id: int, error: str = '') -> bool:
+        """
+        Remet un élément en attente après un échec
+
+        Le réessai est différé de retry_delay * 2^(tentatives - 1) secondes.
+
+        Returns:
+            True si l'élément sera réessayé, False s'il est abandonné (trop de tentatives)
+        """
+        with self._available:
+            row = self._conn.execute(
+                'SELECT attempts FROM invoice_queue WHERE id = ?', (entry_id,)
+            ).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            status = 'pending' if attempts < self.max_attempts else 'failed'
+            available_at = time.time() + self.retry_delay * (2 ** (attempts - 1))
+
+            self._conn.execute(
+                'UPDATE invoice_queue SET status = ?, attempts = ?, last_error = ?, '
+                'available_at = ?, updated_at = ? WHERE id = ?',
+                (status, attempts, error, available_at, datetime.now().isoformat(), entry_id)
+            )
+            self._conn.commit()
+            if status == 'pending':
+                self._available.notify()
+            return status == 'pending'
+
+    def pending_count(self) -> int:
+        """Nombre d'éléments en attente ou en cours"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM invoice_queue WHERE status IN ('pending', 'processing')"
+            ).fetchone()
+            return row[0]
+
+    def close(self):
+        """Ferme la connexion SQLite"""
+        with self._lock:
+            self._conn.close()
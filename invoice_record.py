@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Factures Pennylane normalisées (InvoiceRecord)
+
+Chaque facture de l'API v2 est convertie une seule fois, à la récupération,
+en un InvoiceRecord compact (__slots__) : montants et date de modification
+déjà analysés, nom du client et numéro de facture Tempo extraits du libellé
+(label_parsing.py). Les champs imbriqués (customer, payments...) jamais lus
+ne sont pas conservés : la liste complète des factures d'une exécution
+occupe plusieurs fois moins de mémoire, et la sélection puis le traitement
+ne ré-analysent plus les mêmes valeurs.
+
+Les méthodes des intégrations acceptent encore une facture brute (dict) :
+elle est alors convertie à l'entrée (as_invoice_record).
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Union
+
+from label_parsing import parse_label
+
+def parse_amount(value) -> float:
+    """Montant de l'API (texte ou nombre, éventuellement vide) ; 0.0 s'il est illisible"""
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def parse_iso_datetime(value: Optional[str]) -> Optional[datetime]:
+    """Date ISO de l'API (suffixe 'Z' accepté) ; None si elle est absente ou illisible"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+
+@dataclass(slots=True)
+class InvoiceRecord:
+    """Facture Pennylane réduite aux champs utilisés par les intégrations"""
+
+    id: Optional[Union[int, str]]
+    invoice_number: Optional[str]
+    status: Optional[str]
+    label: str
+    date: Optional[str]
+    amount: float
+    remaining_amount: float
+    updated_at: Optional[datetime]
+    client_name: str
+    tempo_invoice_number: Optional[int]
+
+    @classmethod
+    def from_api(cls, item: Dict) -> 'InvoiceRecord':
+        """Convertit une facture de l'API v2 (customer_invoices)"""
+        label = item.get('label') or ''
+        client_name, tempo_invoice_number = parse_label(label)
+        return cls(
+            id=item.get('id'),
+            invoice_number=item.get('invoice_number'),
+            status=item.get('status'),
+            label=label,
+            date=item.get('date'),
+            amount=parse_amount(item.get('amount')),
+            remaining_amount=parse_amount(item.get('remaining_amount_with_tax')),
+            updated_at=parse_iso_datetime(item.get('updated_at')),
+            client_name=client_name,
+            tempo_invoice_number=tempo_invoice_number,
+        )
+
+    @property
+    def paid_amount(self) -> float:
+        return self.amount - self.remaining_amount
+
+    @property
+    def is_credit_note(self) -> bool:
+        return self.status == 'credit_note'
+
+    @property
+    def is_fully_paid(self) -> bool:
+        return self.remaining_amount <= 0
+
+    @property
+    def payment_status(self) -> Optional[str]:
+        """"Payée", "Partiellement payée" ou None si aucun paiement"""
+        paid_amount = self.paid_amount
+        if paid_amount >= self.amount or self.remaining_amount <= 0:
+            return "Payée"
+        if paid_amount > 0:
+            return "Partiellement payée"
+        return None
+
+    @property
+    def processed_key(self) -> str:
+        """
+        Clé de la facture dans processed_items.json : ID et état de paiement
+
+        Un nouveau paiement (partielle puis payée, second acompte) change la
+        clé : la facture est traitée de nouveau.
+        """
+        return f"{self.id}:{self.payment_status or 'Aucun'}:{self.paid_amount:.2f}"
+
+    def updated_on(self, day: date) -> bool:
+        """Modifiée le jour donné (dans le fuseau de la date de l'API)"""
+        return self.updated_at is not None and self.updated_at.date() == day
+
+    def updated_between(self, start_day: date, end_day: date) -> bool:
+        """Modifiée entre deux jours (inclus)"""
+        return self.updated_at is not None and start_day <= self.updated_at.date() <= end_day
+
+    def updated_since(self, since: datetime) -> bool:
+        """Modifiée à partir de `since` (date avec fuseau ; une date sans fuseau est locale)"""
+        if self.updated_at is None:
+            return False
+        updated_at = self.updated_at if self.updated_at.tzinfo is not None else self.updated_at.astimezone()
+        return updated_at >= since
+
+def as_invoice_record(invoice: Union[InvoiceRecord, Dict]) -> InvoiceRecord:
+    """Facture normalisée (une facture déjà convertie est renvoyée telle quelle)"""
+    if isinstance(invoice, InvoiceRecord):
+        return invoice
+    return InvoiceRecord.from_api(invoice)
+
+def normalize_invoices(items: Iterable[Union[InvoiceRecord, Dict]]) -> List[InvoiceRecord]:
+    """Convertit une liste de factures de l'API"""
+    return [as_invoice_record(item) for item in items]
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Analyse des libellés de factures Pennylane
+
+Un libellé donne le nom du client et le numéro de facture Tempo :
+
+    "Facture EURO DISNEY ASSOCIES SAS - 20498 (label généré)"
+    "Avoir PROJET X AQUAPARK - 20572 (label généré)"
+    "PROJET X AQUAPARK - 20572 (label généré)"
+
+parse_label lit les deux en une passe (expression du numéro précompilée) et
+mémorise les derniers libellés analysés : la conversion des factures
+(invoice_record.py), main.py et tempo_integration.py partagent les mêmes
+règles et le même cache.
+"""
+
+import re
+from functools import lru_cache
+from typing import Optional, Tuple
+
+# Libellés mémorisés (un par facture : couvre l'historique complet d'une exécution)
+LABEL_CACHE_SIZE = 131072
+
+SEPARATOR = ' - '
+# Premier nombre après un séparateur, avant le séparateur suivant
+NUMBER_PATTERN = re.compile(r' - (?:(?! - )\D)*(\d+)')
+
+def parse_label(label) -> Tuple[str, Optional[int]]:
+    """
+    Nom du client et numéro de facture Tempo d'un libellé
+
+    Nom du client : texte avant le premier " - " (après le préfixe "Facture " ou
+    "Avoir "), le libellé complet sans " - ", 'N/A' si le libellé est vide.
+    Numéro : premier nombre entre le premier et le second " - ", sinon None.
+
+    Returns:
+        (nom du client, numéro de facture ou None)
+    """
+    if not label:
+        return 'N/A', None
+    if not isinstance(label, str):
+        return label, None
+    return _parse_label(label)
+
+@lru_cache(maxsize=LABEL_CACHE_SIZE)
+def _parse_label(label: str) -> Tuple[str, Optional[int]]:
+    separator = label.find(SEPARATOR)
+    if separator == -1:
+        return label, None
+
+    # Le préfixe n'est retiré que si un séparateur le suit entièrement
+    client_name = None
+    if label.startswith('Facture '):
+        prefixed_separator = label.find(SEPARATOR, 8)
+        if prefixed_separator != -1:
+            client_name = label[8:prefixed_separator]
+    elif label.startswith('Avoir '):
+        prefixed_separator = label.find(SEPARATOR, 6)
+        if prefixed_separator != -1:
+            client_name = label[6:prefixed_separator]
+    if client_name is None:
+        client_name = label[:separator]
+
+    match = NUMBER_PATTERN.match(label, separator)
+    return client_name.strip(), int(match.group(1)) if match else None
+
+def clear_label_cache():
+    """Vide le cache des libellés analysés"""
+    _parse_label.cache_clear()
+
+def extract_client_name(label: str) -> str:
+    """Extrait le nom du client du label de facture"""
+    return parse_label(label)[0]
+
+def extract_invoice_number(label: str) -> Optional[int]:
+    """Extrait le numéro de facture Tempo du label Pennylane"""
+    return parse_label(label)[1]
@@ -1,30 +1,60 @@
 import os
 import json
-import schedule
 import time
+import threading
 import sys
 import argparse
 from datetime import datetime, timedelta
-from typing import List, Dict, Set
-from dotenv import load_dotenv
+from functools import cached_property
+from typing import List, Dict, Set, Optional, Tuple
 
 from pennylane_client import PennylaneClient
 from google_sheets_client import GoogleSheetsClient
+from invoice_record import InvoiceRecord, as_invoice_record, normalize_invoices
+from label_parsing import extract_client_name
+from invoice_columns import classify_window, select_with_payment_since
 from sync_payments import sync_with_error_handling
 from tempo_client import TempoClient
+from run_budget import RunBudget, EXIT_PARTIAL
+from config import load_env
+from metrics import track_stage, throttle_sleep, count_invoice, export_run_metrics
+from tracing import flush_traces
+from profiling import PROFILE_MODES, profile_call, profile_mode_from_env
 
-load_dotenv()
+load_env()
 
 class PennylaneSheetsIntegration:
     """Intégration entre Pennylane v2, Google Sheets, Tempo et Armado"""
     
-    def __init__(self, test_mode=False):
-        self.pennylane_client = PennylaneClient()
-        self.sheets_client = GoogleSheetsClient()
-        self.tempo_client = TempoClient()
+    def __init__(self, test_mode=False, time_budget: Optional[float] = None, task_sink: Optional[str] = None):
         self.processed_items_file = 'processed_items.json'
         self.processed_items = self.load_processed_items()
         self.test_mode = test_mode
+        self._state_lock = threading.Lock()
+        self.resume_state_file = 'resume_state.json'
+        # Budget de temps optionnel (exécutions limitées par le timeout de la CI)
+        self.budget = RunBudget(time_budget) if time_budget else None
+        # Destination des tâches (voir task_sinks.py) : Google Sheets par défaut
+        self.task_sink_spec = task_sink or os.getenv('TASK_SINK', 'sheets')
+    
+    # Clients créés au premier usage : un démarrage (mode test, vérification rapide)
+    # ne paie que les dépendances réellement utilisées
+    @cached_property
+    def pennylane_client(self) -> PennylaneClient:
+        return PennylaneClient()
+    
+    @cached_property
+    def sheets_client(self) -> GoogleSheetsClient:
+        return GoogleSheetsClient()
+    
+    @cached_property
+    def tempo_client(self) -> TempoClient:
+        return TempoClient()
+    
+    @cached_property
+    def task_sink(self):
+        from task_sinks import build_task_sink
+        return build_task_sink(self.task_sink_spec, lambda: self.sheets_client)
     
     def load_processed_items(self) -> Set[str]:
         """Charge la liste des éléments déjà traités"""
@@ -40,11 +70,52 @@ class PennylaneSheetsIntegration:
     def save_processed_items(self):
         """Sauvegarde la liste des éléments traités"""
         try:
+            with self._state_lock:
+                items = list(self.processed_items)
             with open(self.processed_items_file, 'w') as f:
-                json.dump(list(self.processed_items), f)
+                json.dump(items, f)
         except Exception as e:
             print(f"Erreur lors de la sauvegarde des éléments traités: {e}")
     
+    def flush_task_sink(self):
+        """Écrit les tâches en attente (file d'écriture différée, fichiers locaux, recopie vers Google Sheets)"""
+        # Destination jamais créée : seule une recopie vers Google Sheets interrompue
+        # lors d'une exécution précédente peut rester en attente (voir FanOutTaskSink)
+        from task_sinks import mirrors_to_sheets
+        if 'task_sink' not in self.__dict__ and not mirrors_to_sheets(self.task_sink_spec):
+            return
+        with track_stage('flush_tasks'):
+            if not self.task_sink.flush():
+                print("⚠ Tâches non écrites, conservées pour le prochain flush")
+    
+    def load_resume_date(self):
+        """Charge le premier jour restant d'une exécution partielle précédente"""
+        try:
+            if os.path.exists(self.resume_state_file):
+                with open(self.resume_state_file, 'r') as f:
+                    return datetime.strptime(json.load(f)['pending_since'], '%Y-%m-%d').date()
+            return None
+        except Exception as e:
+            print(f"Erreur lors du chargement de l'état de reprise: {e}")
+            return None
+    
+    def save_resume_date(self, pending_since):
+        """Enregistre le premier jour à reprendre lors de la prochaine exécution"""
+        try:
+            with open(self.resume_state_file, 'w') as f:
+                json.dump({'pending_since': pending_since.isoformat()}, f)
+        except Exception as e:
+            print(f"Erreur lors de la sauvegarde de l'état de reprise: {e}")
+    
+    def clear_resume_state(self):
+        """Supprime l'état de reprise après une exécution complète"""
+        if os.path.exists(self.resume_state_file):
+            os.remove(self.resume_state_file)
+    
+    def flush_state(self):
+        """Sauvegarde tout l'état local (éléments traités)"""
+        self.save_processed_items()
+    
     def format_date(self, date_str: str) -> str:
         """Formate une date pour l'affichage"""
         if not date_str:
@@ -75,53 +146,9 @@ class PennylaneSheetsIntegration:
         except:
             return False
     
-    def is_date_yesterday(self, date_str: str) -> bool:
-        """Vérifie si une date correspond à hier"""
-        if not date_str:
-            return False
-        try:
-            # Parser la date ISO
-            date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-            yesterday = (datetime.now() - timedelta(days=1)).date()
-            return date_obj.date() == yesterday
-        except:
-            return False
-    
     def extract_client_name(self, label: str) -> str:
         """Extrait le nom du client du label de facture"""
-        if not label:
-            return 'N/A'
-        
-        try:
-            # Format: "Facture EURO DISNEY ASSOCIES SAS - 20498 (label généré)"
-            if label.startswith('Facture '):
-                # Enlever "Facture " au début
-                without_prefix = label[8:]  # "EURO DISNEY ASSOCIES SAS - 20498 (label généré)"
-                
-                # Trouver le premier "-" et prendre ce qui est avant
-                if ' - ' in without_prefix:
-                    client_name = without_prefix.split(' - ')[0]
-                    return client_name.strip()
-            
-            # Format: "Avoir PROJET X AQUAPARK - 20572 (label généré)"
-            if label.startswith('Avoir '):
-                # Enlever "Avoir " au début
-                without_prefix = label[6:]  # "PROJET X AQUAPARK - 20572 (label généré)"
-                
-                # Trouver le premier "-" et prendre ce qui est avant
-                if ' - ' in without_prefix:
-                    client_name = without_prefix.split(' - ')[0]
-                    return client_name.strip()
-            
-            # Format: "PROJET X AQUAPARK - 20572 (label généré)" (sans préfixe)
-            if ' - ' in label:
-                client_name = label.split(' - ')[0]
-                return client_name.strip()
-            
-            # Si le format n'est pas reconnu, retourner le label complet
-            return label
-        except:
-            return label
+        return extract_client_name(label)
     
     def sync_to_armado(self, invoice_number: str, payment_status: str, payment_date: datetime) -> Dict:
         """
@@ -207,13 +234,13 @@ class PennylaneSheetsIntegration:
             print(f"[Tempo] ✗ {error_msg}")
             return {'success': False, 'data': None, 'error': error_msg}
     
-    def create_task_from_invoice(self, invoice: Dict) -> Dict:
+    def create_task_from_invoice(self, invoice: InvoiceRecord) -> Dict:
         """Crée les données de tâche à partir d'une facture Pennylane"""
         try:
-            # Calculs des montants avec gestion des valeurs None
-            total_amount = float(invoice.get('amount', 0) or 0)
-            remaining_amount = float(invoice.get('remaining_amount_with_tax', 0) or 0)
-            paid_amount = total_amount - remaining_amount
+            invoice = as_invoice_record(invoice)
+            total_amount = invoice.amount
+            remaining_amount = invoice.remaining_amount
+            paid_amount = invoice.paid_amount
             payment_percentage = (paid_amount / total_amount * 100) if total_amount > 0 else 0
             
             # Déterminer le statut de paiement
@@ -233,9 +260,9 @@ class PennylaneSheetsIntegration:
             remaining_formatted = f"{remaining_amount:.2f}€"
             
             # Informations de base
-            invoice_number = invoice.get('invoice_number', 'N/A')
-            invoice_date = self.format_date(invoice.get('date'))
-            client_name = self.extract_client_name(invoice.get('label', 'N/A'))
+            invoice_number = invoice.invoice_number or 'N/A'
+            invoice_date = self.format_date(invoice.date)
+            client_name = invoice.client_name
             
             # Construire les champs modifiés avec plus de détails
             champs_modifies = f"Montant total : {total_formatted} / Montant payé : {paid_formatted} / Reste : {remaining_formatted}"
@@ -244,6 +271,7 @@ class PennylaneSheetsIntegration:
             commentaire_interne = f"Date facture : {invoice_date} / Statut : {payment_status} ({payment_percentage:.0f}%)"
             
             return {
+                'invoice_id': invoice.id,
                 'invoice_number': invoice_number,
                 'invoice_date': invoice_date,
                 'payment_amount': paid_formatted,
@@ -261,119 +289,212 @@ class PennylaneSheetsIntegration:
             print(f"Erreur lors de la création des données de tâche: {e}")
             return {}
     
-    def process_paid_invoices_today(self):
-        """Traite les factures passées en statut payé hier (pour le workflow 3h du matin)"""
-        yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-        today = datetime.now().strftime('%Y-%m-%d')
-        print(f"\n=== Traitement des factures payées hier ({yesterday}) - {datetime.now().strftime('%d/%m/%Y %H:%M')} ===")
-
-        # Récupérer TOUTES les factures
-        all_invoices = self.pennylane_client.get_all_invoices()
+    def process_invoice(self, invoice: InvoiceRecord, payment_date: Optional[datetime] = None) -> bool:
+        """
+        Crée la tâche d'une facture puis synchronise Tempo et Armado
+        
+        Args:
+            invoice: Facture Pennylane (payée ou partiellement payée)
+            payment_date: Date de règlement transmise à Tempo/Armado (défaut: maintenant)
+            
+        Returns:
+            True si la tâche a été créée, False sinon
+        """
+        invoice = as_invoice_record(invoice)
+        with track_stage('process_invoice', invoice_id=invoice.id, invoice_number=invoice.invoice_number) as span:
+            # Créer la tâche avec les nouveaux calculs
+            task_data = self.create_task_from_invoice(invoice)
+        
+            if not task_data:
+                print(f"✗ Erreur lors de la création des données pour la facture {invoice.invoice_number or 'N/A'}")
+                span.set_error('Données de tâche invalides')
+                return False
 
-        # Filtrer uniquement les factures (pas les avoirs)
-        regular_invoices = [inv for inv in all_invoices if inv.get('status') != 'credit_note']
+            # Ajouter au Google Sheet
+            with track_stage('sheets_task'):
+                created = self.task_sink.create_task(task_data)
+            if not created:
+                print(f"  ✗ Erreur lors du traitement de la facture {invoice.invoice_number or 'N/A'}")
+                span.set_error('Tâche non créée')
+                return False
 
-        # Filtrer les factures avec paiement ET mises à jour hier
-        paid_invoices_yesterday = []
-        partially_paid_invoices_yesterday = []
+            with self._state_lock:
+                self.processed_items.add(invoice.processed_key)
+            print(f"  ✓ Facture {task_data['invoice_number']} traitée ({task_data['payment_status']})")
         
-        for invoice in regular_invoices:
-            # Vérifier si la facture a été mise à jour hier
-            if not self.is_date_yesterday(invoice.get('updated_at')):
-                continue
-                
-            # Calculer les montants avec gestion des valeurs None
-            total_amount = float(invoice.get('amount', 0) or 0)
-            remaining_amount = float(invoice.get('remaining_amount_with_tax', 0) or 0)
-            paid_amount = total_amount - remaining_amount
+            # Synchronisation Tempo et Armado UNIQUEMENT pour les factures complètement payées
+            if task_data['payment_status'] == "Payée":
+                # 1. Synchronisation Tempo
+                with track_stage('tempo_sync'):
+                    tempo_result = self.sync_to_tempo(
+                        invoice_number=task_data['invoice_number'],
+                        payment_amount=invoice.paid_amount,
+                        payment_date=payment_date or datetime.now(),
+                        # Statut "Payée" : montant payé atteint ou aucun reste à payer
+                        is_fully_paid=True
+                    )
             
-            # Classifier selon le montant payé
-            if paid_amount >= total_amount or remaining_amount <= 0:
-                paid_invoices_yesterday.append(invoice)
-            elif paid_amount > 0:
-                partially_paid_invoices_yesterday.append(invoice)
+                # Log du résultat Tempo (ne fait pas échouer le traitement principal)
+                if not tempo_result['success']:
+                    print(f"  ⚠ Synchronisation Tempo échouée: {tempo_result['error']}")
+            
+                # 2. Synchronisation Armado
+                with track_stage('armado_sync'):
+                    armado_result = self.sync_to_armado(
+                        invoice_number=task_data['invoice_number'],
+                        payment_status=task_data['payment_status'],
+                        payment_date=payment_date or datetime.now()
+                    )
+            
+                # Log du résultat Armado (ne fait pas échouer le traitement principal)
+                if not armado_result['success']:
+                    print(f"  ⚠ Synchronisation Armado échouée: {armado_result['error']}")
+            else:
+                print(f"  ℹ Facture partiellement payée - pas de synchronisation Tempo/Armado")
+        
+            return True
+    
+    def process_invoice_event(self, invoice_id: str) -> bool:
+        """
+        Traite une facture signalée par un webhook Pennylane
+        
+        Args:
+            invoice_id: ID Pennylane de la facture modifiée
+            
+        Returns:
+            True si l'événement est traité (ou ignoré), False s'il faut réessayer
+        """
+        invoice = self.pennylane_client.get_invoice(invoice_id)
+        if invoice is None:
+            print(f"✗ Facture {invoice_id} introuvable dans Pennylane")
+            return False
+        
+        invoice = InvoiceRecord.from_api(invoice)
+        if invoice.is_credit_note:
+            print(f"ℹ Avoir {invoice.invoice_number or invoice_id} ignoré")
+            return True
+        
+        if invoice.processed_key in self.processed_items:
+            print(f"ℹ Facture {invoice.invoice_number or invoice_id} déjà traitée dans cet état de paiement")
+            return True
+        
+        if invoice.payment_status is None:
+            print(f"ℹ Facture {invoice.invoice_number or invoice_id} sans paiement, ignorée")
+            return True
+        
+        if not self.process_invoice(invoice):
+            return False
+        
+        self.save_processed_items()
+        return True
+    
+    def select_invoices_to_process(self, all_invoices: List[InvoiceRecord], yesterday_date,
+                                   resume_from=None) -> Tuple[List[InvoiceRecord], List[InvoiceRecord], List[InvoiceRecord]]:
+        """
+        Sélectionne les factures (hors avoirs) mises à jour hier, ou depuis le jour à reprendre
+        
+        Returns:
+            (factures hors avoirs, factures payées, factures partiellement payées)
+        """
+        # Hors avoirs, avec paiement ET mises à jour hier (ou depuis le jour à reprendre),
+        # classées facture par facture : pour une seule fenêtre, c'est plus rapide que le
+        # chargement des colonnes NumPy (voir invoice_columns.py)
+        return classify_window(normalize_invoices(all_invoices), resume_from or yesterday_date, yesterday_date)
+    
+    def process_paid_invoices_today(self) -> bool:
+        """
+        Traite les factures passées en statut payé hier (pour le workflow 3h du matin)
+        
+        Si l'exécution précédente s'est arrêtée avant la fin (budget de temps),
+        la fenêtre commence au premier jour non terminé.
+        
+        Returns:
+            True si toutes les factures ont été traitées, False si l'exécution est partielle
+        """
+        yesterday_date = (datetime.now() - timedelta(days=1)).date()
+        yesterday = yesterday_date.strftime('%Y-%m-%d')
+        resume_from = self.load_resume_date()
+        if resume_from and resume_from >= yesterday_date:
+            resume_from = None
+        
+        print(f"\n=== Traitement des factures payées hier ({yesterday}) - {datetime.now().strftime('%d/%m/%Y %H:%M')} ===")
+        if resume_from:
+            print(f"↻ Reprise d'une exécution partielle depuis le {resume_from.strftime('%d/%m/%Y')}")
+
+        # Récupérer TOUTES les factures
+        with track_stage('fetch_invoices'):
+            # Conversion unique en factures compactes (voir invoice_record.py)
+            all_invoices = normalize_invoices(self.pennylane_client.get_all_invoices())
 
+        with track_stage('select_invoices'):
+            regular_invoices, paid_invoices_yesterday, partially_paid_invoices_yesterday = \
+                self.select_invoices_to_process(all_invoices, yesterday_date, resume_from)
         all_invoices_to_process = paid_invoices_yesterday + partially_paid_invoices_yesterday
 
         print(f"Nombre total de factures analysées: {len(regular_invoices)}")
         print(f"  - Factures payées hier: {len(paid_invoices_yesterday)}")
         print(f"  - Factures partiellement payées hier: {len(partially_paid_invoices_yesterday)}")
-        print(f"  - Avoirs ignorés: {len([inv for inv in all_invoices if inv.get('status') == 'credit_note'])}")
+        print(f"  - Avoirs ignorés: {len(all_invoices) - len(regular_invoices)}")
 
         processed_count = 0
+        partial = False
 
         for invoice in all_invoices_to_process:
-            invoice_id = invoice.get('id')
-
-            # Vérifier si déjà traité
-            if invoice_id in self.processed_items:
+            # Vérifier si déjà traité dans cet état de paiement
+            if invoice.processed_key in self.processed_items:
                 continue
 
-            # Créer la tâche avec les nouveaux calculs
-            task_data = self.create_task_from_invoice(invoice)
-            
-            if not task_data:
-                print(f"✗ Erreur lors de la création des données pour la facture {invoice.get('invoice_number', 'N/A')}")
-                continue
+            # Ne pas commencer une facture qui risque de dépasser le budget de temps
+            if self.budget and not self.budget.can_start_item():
+                partial = True
+                print(f"\n⏸ Budget de temps presque épuisé ({self.budget.summary()})")
+                break
 
-            # Ajouter au Google Sheet
-            if self.sheets_client.create_task(task_data):
-                self.processed_items.add(invoice_id)
+            start = time.monotonic()
+            success = self.process_invoice(invoice)
+            count_invoice('success' if success else 'error')
+            if success:
                 processed_count += 1
-                print(f"  ✓ Facture {task_data['invoice_number']} traitée ({task_data['payment_status']})")
-                
-                # Synchronisation Tempo et Armado UNIQUEMENT pour les factures complètement payées
-                if task_data['payment_status'] == "Payée":
-                    # Calculer les montants pour Tempo
-                    total_amount = float(invoice.get('amount', 0) or 0)
-                    remaining_amount = float(invoice.get('remaining_amount_with_tax', 0) or 0)
-                    paid_amount = total_amount - remaining_amount
-                    is_fully_paid = paid_amount >= total_amount or remaining_amount <= 0
-                    
-                    # 1. Synchronisation Tempo
-                    tempo_result = self.sync_to_tempo(
-                        invoice_number=task_data['invoice_number'],
-                        payment_amount=paid_amount,
-                        payment_date=datetime.now(),
-                        is_fully_paid=is_fully_paid
-                    )
-                    
-                    # Log du résultat Tempo (ne fait pas échouer le traitement principal)
-                    if not tempo_result['success']:
-                        print(f"  ⚠ Synchronisation Tempo échouée: {tempo_result['error']}")
-                    
-                    # 2. Synchronisation Armado
-                    armado_result = self.sync_to_armado(
-                        invoice_number=task_data['invoice_number'],
-                        payment_status=task_data['payment_status'],
-                        payment_date=datetime.now()
-                    )
-                    
-                    # Log du résultat Armado (ne fait pas échouer le traitement principal)
-                    if not armado_result['success']:
-                        print(f"  ⚠ Synchronisation Armado échouée: {armado_result['error']}")
-                else:
-                    print(f"  ℹ Facture partiellement payée - pas de synchronisation Tempo/Armado")
-                
-            else:
-                print(f"  ✗ Erreur lors du traitement de la facture {invoice.get('invoice_number', 'N/A')}")
+                # Point de sauvegarde régulier pour limiter la perte en cas d'arrêt brutal
+                if processed_count % 10 == 0:
+                    self.flush_state()
 
             # Délai de 1 seconde entre chaque facture pour éviter les quotas
-            time.sleep(1)
+            throttle_sleep(1, 'invoice_delay')
+            
+            if self.budget:
+                self.budget.record_item(time.monotonic() - start)
 
         # Sauvegarder les éléments traités
+        if processed_count > 0 or partial:
+            with track_stage('flush_state'):
+                self.flush_state()
+        
         if processed_count > 0:
-            self.save_processed_items()
             print(f"\n{processed_count} nouvelles factures traitées (payées hier)")
         else:
             print("\nAucune nouvelle facture payée hier")
+        
+        if partial:
+            self.save_resume_date(resume_from or yesterday_date)
+            remaining = sum(1 for inv in all_invoices_to_process if inv.processed_key not in self.processed_items)
+            print(f"⏸ {remaining} facture(s) restante(s), reprise à la prochaine exécution")
+            return False
+        
+        self.clear_resume_state()
+        return True
     
     def run_initial_setup(self):
         """Configuration initiale"""
         print("=== Configuration initiale ===")
         
-        # Configuration du Google Sheet
-        self.sheets_client.setup_spreadsheet()
+        # Configuration du Google Sheet (s'il fait partie des destinations des tâches)
+        from task_sinks import parse_task_sink_spec
+        sinks = parse_task_sink_spec(self.task_sink_spec)
+        if any(kind == 'sheets' for kind, _ in sinks):
+            self.sheets_client.setup_spreadsheet()
+        if self.task_sink_spec != 'sheets':
+            print(f"✓ Destination des tâches: {self.task_sink_spec}")
         
         # Test de connexion Pennylane
         print("\nTest de connexion Pennylane v2...")
@@ -402,32 +523,162 @@ class PennylaneSheetsIntegration:
     def run_once(self):
         """Exécute une fois le traitement complet"""
         try:
-            self.process_paid_invoices_today()
+            completed = self.process_paid_invoices_today()
         except Exception as e:
             print(f"Erreur lors du traitement: {e}")
             sys.exit(1)  # Code d'erreur pour GitHub Actions
+        finally:
+            self.flush_task_sink()
+            export_run_metrics('sheets')
+            flush_traces()
+        
+        if completed is False:
+            # Code distinct : exécution partielle, à reprendre la prochaine fois
+            sys.exit(EXIT_PARTIAL)
+    
+    def poll_updates(self, since: datetime, stop_event: Optional[threading.Event] = None) -> bool:
+        """
+        Traite les factures payées modifiées depuis `since` (polling incrémental)
+        
+        Args:
+            since: Date de début du dernier poll réussi
+            stop_event: Événement d'arrêt vérifié entre deux factures
+            
+        Returns:
+            True si toutes les factures ont été traitées, False sinon (poll à reprendre)
+        """
+        invoices = normalize_invoices(self.pennylane_client.get_invoices_updated_since(since))
+        
+        invoices_to_process = [
+            inv for inv in select_with_payment_since(invoices, since)
+            if inv.processed_key not in self.processed_items
+        ]
+        print(f"Factures payées à traiter: {len(invoices_to_process)}")
+        
+        processed_count = 0
+        failed_count = 0
+        stopped = False
+        
+        for invoice in invoices_to_process:
+            if stop_event is not None and stop_event.is_set():
+                stopped = True
+                break
+            
+            if self.process_invoice(invoice):
+                processed_count += 1
+                count_invoice('success')
+            else:
+                failed_count += 1
+                count_invoice('error')
+            
+            # Délai de 1 seconde entre chaque facture pour éviter les quotas
+            throttle_sleep(1, 'invoice_delay')
+        
+        if processed_count > 0:
+            self.save_processed_items()
+            print(f"\n{processed_count} nouvelles factures traitées")
+        
+        if failed_count > 0:
+            print(f"⚠ {failed_count} facture(s) en échec, elles seront reprises au prochain poll")
+        
+        self.flush_task_sink()
+        return not stopped and failed_count == 0
+    
+    def backfill_partition(self, start: datetime, end: datetime) -> bool:
+        """
+        Traite les factures payées modifiées dans [start, end[ (une partition du backfill)
+        
+        Returns:
+            True si toutes les factures de la partition ont été traitées
+        """
+        invoices = normalize_invoices(self.pennylane_client.get_invoices_updated_since(start, until=end))
+        
+        invoices_to_process = [
+            inv for inv in select_with_payment_since(invoices, start, until=end)
+            if inv.processed_key not in self.processed_items
+        ]
+        
+        failed_count = 0
+        for invoice in invoices_to_process:
+            # La date de modification sert de date de règlement pour Tempo/Armado
+            if not self.process_invoice(invoice, payment_date=invoice.updated_at):
+                failed_count += 1
+        
+        self.save_processed_items()
+        return failed_count == 0
     
-    def run_scheduled(self):
-        """Exécute le traitement de manière planifiée (tous les midis)"""
-        print("Démarrage du traitement planifié (tous les midis à 12h00)...")
+    def run_backfill(self, since: str, until: Optional[str] = None,
+                     granularity: str = 'day', workers: int = 4) -> bool:
+        """
+        Rattrape les factures payées sur une période (dates AAAA-MM-JJ incluses)
         
-        # Traitement tous les midis à 12h00
-        schedule.every().day.at("12:00").do(self.run_once)
+        Args:
+            since: Premier jour à traiter
+            until: Dernier jour à traiter (défaut: hier)
+            granularity: Découpage en partitions 'day' ou 'week'
+            workers: Nombre de partitions traitées en parallèle
+            
+        Returns:
+            True si toutes les partitions sont terminées
+        """
+        from backfill import BackfillRunner, parse_date
         
-        # Traitement initial
-        print("Exécution du traitement initial...")
-        self.run_once()
+        until_date = parse_date(until) if until else (datetime.now() - timedelta(days=1)).date()
+        runner = BackfillRunner(self.backfill_partition, 'backfill_checkpoint.json', workers=workers)
+        try:
+            return runner.run(parse_date(since), until_date, granularity)
+        finally:
+            self.flush_task_sink()
+            export_run_metrics('sheets')
+            flush_traces()
+    
+    def run_scheduled(self, interval_minutes: Optional[float] = None):
+        """Surveillance continue : polling incrémental de Pennylane jusqu'à SIGTERM"""
+        from polling_daemon import PollingDaemon
         
-        # Boucle de surveillance
-        while True:
-            schedule.run_pending()
-            time.sleep(60)  # Vérifier toutes les minutes
+        daemon = PollingDaemon(
+            self.poll_updates,
+            state_file='poll_state.json',
+            interval_minutes=interval_minutes
+        )
+        daemon.run()
+    
+    def run_webhook_server(self, host: Optional[str] = None, port: Optional[int] = None):
+        """Reçoit les webhooks Pennylane et traite les factures modifiées en continu"""
+        from webhook_server import PennylaneWebhookServer
+        
+        print("Démarrage du mode webhook (traitement au fil de l'eau)...")
+        server = PennylaneWebhookServer(self.process_invoice_event, host=host, port=port,
+                                        flush=self.flush_task_sink)
+        try:
+            server.serve_forever()
+        finally:
+            export_run_metrics('sheets')
+            flush_traces()
 
 def main():
     """Fonction principale"""
     parser = argparse.ArgumentParser(description='Intégration Pennylane v2 - Google Sheets - Tempo - Armado')
     parser.add_argument('--auto', action='store_true', help='Mode automatique pour GitHub Actions')
     parser.add_argument('--test-mode', action='store_true', help='Mode test (désactive la synchronisation Armado)')
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help=f'Durée maximale en secondes : arrêt propre avant l\'échéance (code de sortie {EXIT_PARTIAL})')
+    parser.add_argument('--daemon', action='store_true', help='Polling incrémental continu de Pennylane (arrêt propre sur SIGTERM)')
+    parser.add_argument('--interval', type=float, default=None, help='Intervalle du polling en minutes (défaut: POLL_INTERVAL_MINUTES ou 15)')
+    parser.add_argument('--since', type=str, default=None, help='Backfill : premier jour à traiter (AAAA-MM-JJ)')
+    parser.add_argument('--until', type=str, default=None, help='Backfill : dernier jour à traiter (AAAA-MM-JJ, défaut: hier)')
+    parser.add_argument('--partition', choices=['day', 'week'], default='day', help='Backfill : découpage de la période')
+    parser.add_argument('--workers', type=int, default=4, help='Backfill : partitions traitées en parallèle')
+    parser.add_argument('--serve', action='store_true', help='Serveur de webhooks Pennylane (traitement au fil de l\'eau)')
+    parser.add_argument('--host', type=str, default=None, help='Adresse d\'écoute du serveur de webhooks (défaut: WEBHOOK_HOST ou 0.0.0.0)')
+    parser.add_argument('--port', type=int, default=None, help='Port du serveur de webhooks (défaut: WEBHOOK_PORT ou 8080)')
+    parser.add_argument('--task-sink', type=str, default=None,
+                        help='Destination des tâches : sheets, sqlite[:chemin], csv[:chemin], parquet[:chemin], '
+                             'séparées par des virgules (défaut: TASK_SINK ou sheets)')
+    parser.add_argument('--archive-days', type=int, default=None, metavar='N',
+                        help='Maintenance : archive les tâches traitées de plus de N jours puis réduit la feuille')
+    parser.add_argument('--profile', nargs='?', const='all', choices=PROFILE_MODES, default=None,
+                        help='Profile l\'exécution unique ou le backfill : cprofile, sample ou all (défaut: PROFILE_RUN)')
     args = parser.parse_args()
     
     print("=== Intégration Pennylane v2 - Google Sheets - Tempo - Armado ===\n")
@@ -438,13 +689,43 @@ def main():
         print("🧪 Mode test activé - synchronisation Tempo et Armado désactivée")
     
     try:
-        integration = PennylaneSheetsIntegration(test_mode=test_mode)
+        integration = PennylaneSheetsIntegration(test_mode=test_mode, time_budget=args.time_budget,
+                                                 task_sink=args.task_sink)
         
-        if args.auto:
+        # Profilage optionnel de l'exécution unique / du backfill
+        profile_mode = args.profile or profile_mode_from_env()
+        run_once = integration.run_once
+        run_backfill = integration.run_backfill
+        if profile_mode:
+            print(f"⏱ Profilage activé ({profile_mode})")
+            run_once = lambda: profile_call(integration.run_once, 'main', profile_mode)
+            run_backfill = lambda *backfill_args: profile_call(
+                lambda: integration.run_backfill(*backfill_args), 'main-backfill', profile_mode)
+        
+        if args.archive_days is not None:
+            # Maintenance : archivage des tâches traitées
+            result = integration.sheets_client.archive_tasks(args.archive_days)
+            for title, count in sorted(result['tabs'].items()):
+                print(f"  - {title}: {count} tâche(s)")
+            print(f"✓ {result['archived']} tâche(s) archivée(s)")
+        elif args.since:
+            # Mode backfill : rattrapage d'une période
+            integration.run_initial_setup()
+            if not run_backfill(args.since, args.until, args.partition, args.workers):
+                sys.exit(1)
+        elif args.daemon:
+            # Mode démon : polling incrémental
+            integration.run_initial_setup()
+            integration.run_scheduled(interval_minutes=args.interval)
+        elif args.serve:
+            # Mode webhook : traitement événementiel
+            integration.run_initial_setup()
+            integration.run_webhook_server(host=args.host, port=args.port)
+        elif args.auto:
             # Mode automatique pour GitHub Actions
             print("Mode automatique activé (GitHub Actions)")
             integration.run_initial_setup()
-            integration.run_once()
+            run_once()
             print("✓ Traitement automatique terminé avec succès")
         else:
             # Mode interactif
@@ -454,19 +735,19 @@ def main():
             # Demander le mode d'exécution
             print("\nChoisissez le mode d'exécution:")
             print("1. Exécution unique (traitement des factures payées aujourd'hui)")
-            print("2. Surveillance continue (tous les midis à 12h00)")
+            print("2. Surveillance continue (polling incrémental de Pennylane)")
             
             choice = input("\nVotre choix (1 ou 2): ").strip()
             
             if choice == "1":
                 print("\nExécution unique...")
-                integration.run_once()
+                run_once()
             elif choice == "2":
                 print("\nDémarrage de la surveillance continue...")
-                integration.run_scheduled()
+                integration.run_scheduled(interval_minutes=args.interval)
             else:
                 print("Choix invalide. Exécution unique par défaut.")
-                integration.run_once()
+                run_once()
             
     except Exception as e:
         print(f"Erreur lors de l'initialisation: {e}")
@@ -0,0 +1,266 @@
+"""
+Métriques d'exécution : appels API, durées des étapes et attentes
+
+Compteurs et histogrammes de latence en mémoire, partagés entre threads,
+exportés en fin d'exécution :
+- au format textfile Prometheus (collecteur textfile de node_exporter)
+  si METRICS_TEXTFILE est défini
+- en rapport JSON si METRICS_REPORT est défini
+
+Les mêmes points de mesure alimentent les traces (tracing.py).
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Tuple
+
+from tracing import trace_span, record_span
+
+PREFIX = 'pennylane_sync_'
+
+# Bornes des histogrammes de latence (secondes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+class MetricsRegistry:
+    """Registre de métriques (compteurs, jauges, histogrammes) avec labels"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._values: Dict[str, Dict[LabelKey, object]] = {}
+        self.started_at = time.time()
+
+    def _declare(self, name: str, kind: str, help_text: str):
+        if name not in self._help:
+            self._help[name] = (kind, help_text)
+            self._values[name] = {}
+
+    def inc(self, name: str, value: float = 1.0, help_text: str = '', **labels):
+        """Incrémente un compteur"""
+        key = _label_key(labels)
+        with self._lock:
+            self._declare(name, 'counter', help_text)
+            self._values[name][key] = self._values[name].get(key, 0.0) + value
+
+    def set(self, name: str, value: float, help_text: str = '', **labels):
+        """Fixe une jauge"""
+        key = _label_key(labels)
+        with self._lock:
+            self._declare(name, 'gauge', help_text)
+            self._values[name][key] = value
+
+    def observe(self, name: str, value: float, help_text: str = '', buckets=DEFAULT_BUCKETS, **labels):
+        """Ajoute une observation à un histogramme"""
+        key = _label_key(labels)
+        with self._lock:
+            self._declare(name, 'histogram', help_text)
+            histogram = self._values[name].get(key)
+            if histogram is None:
+                histogram = self._values[name][key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def get(self, name: str, **labels):
+        """Valeur d'un compteur / d'une jauge (None si absente)"""
+        with self._lock:
+            return self._values.get(name, {}).get(_label_key(labels))
+
+    def reset(self):
+        """Vide le registre (nouvelle exécution)"""
+        with self._lock:
+            self._help.clear()
+            self._values.clear()
+            self.started_at = time.time()
+
+    def to_prometheus(self) -> str:
+        """Exporte au format texte Prometheus"""
+        lines = []
+        with self._lock:
+            for name in sorted(self._help):
+                kind, help_text = self._help[name]
+                full_name = PREFIX + name
+                if help_text:
+                    lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                for key, value in sorted(self._values[name].items()):
+                    if kind == 'histogram':
+                        for bound, count in value.cumulative():
+                            lines.append(f"{full_name}_bucket{_format_labels(key, ('le', repr(bound)))} {count}")
+                        lines.append(f"{full_name}_bucket{_format_labels(key, ('le', '+Inf'))} {value.count}")
+                        lines.append(f"{full_name}_sum{_format_labels(key)} {value.sum}")
+                        lines.append(f"{full_name}_count{_format_labels(key)} {value.count}")
+                    else:
+                        lines.append(f"{full_name}{_format_labels(key)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self) -> Dict:
+        """Exporte en dictionnaire (rapport JSON)"""
+        report = {}
+        with self._lock:
+            for name in sorted(self._help):
+                kind, help_text = self._help[name]
+                samples = []
+                for key, value in sorted(self._values[name].items()):
+                    sample = {'labels': dict(key)}
+                    if kind == 'histogram':
+                        sample.update({
+                            'count': value.count,
+                            'sum': round(value.sum, 6),
+                            'avg': round(value.sum / value.count, 6) if value.count else 0.0,
+                            'max': round(value.max, 6),
+                        })
+                    else:
+                        sample['value'] = value
+                    samples.append(sample)
+                report[name] = {'type': kind, 'help': help_text, 'samples': samples}
+        return report
+
+    def write_textfile(self, path: str):
+        """Écrit le textfile Prometheus de façon atomique (fichier temporaire puis renommage)"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def write_report(self, path: str):
+        """Écrit le rapport JSON de l'exécution"""
+        report = {
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat(timespec='seconds'),
+            'duration_s': round(time.time() - self.started_at, 3),
+            'metrics': self.to_dict(),
+        }
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+registry = MetricsRegistry()
+
+class ApiCall:
+    """Appel API en cours de mesure (le statut peut être renseigné par l'appelant)"""
+
+    def __init__(self):
+        self.status = 'ok'
+
+@contextmanager
+def track_api_call(api: str, operation: str, **attributes) -> Iterator[ApiCall]:
+    """
+    Mesure un appel sortant : compteur par statut, histogramme de latence et span
+
+    Usage:
+        with track_api_call('tempo', 'post_reglement') as call:
+            response = session.post(...)
+            call.status = response.status_code
+
+    Les `attributes` (ex: attempt=2) ne sont ajoutés qu'au span, pas aux labels.
+    """
+    call = ApiCall()
+    start = time.perf_counter()
+    with trace_span(f"{api}.{operation}", api=api, operation=operation, **attributes) as span:
+        try:
+            yield call
+        except Exception:
+            if call.status == 'ok':
+                call.status = 'error'
+            raise
+        finally:
+            span.set_attribute('status', call.status)
+            if isinstance(call.status, int) and (call.status >= 500 or call.status == 429):
+                span.set_error(f"HTTP {call.status}")
+            duration = time.perf_counter() - start
+            registry.inc('api_requests_total', help_text='Appels API sortants',
+                         api=api, operation=operation, status=call.status)
+            registry.observe('api_request_duration_seconds', duration, help_text='Latence des appels API sortants',
+                             api=api, operation=operation)
+
+@contextmanager
+def track_stage(stage: str, **attributes):
+    """
+    Mesure la durée d'une étape du traitement et ouvre le span correspondant
+
+    Les `attributes` (ex: invoice_id) ne sont ajoutés qu'au span, qui est renvoyé.
+    """
+    start = time.perf_counter()
+    with trace_span(stage, **attributes) as span:
+        try:
+            yield span
+        finally:
+            registry.observe('stage_duration_seconds', time.perf_counter() - start,
+                             help_text='Durée des étapes du traitement', stage=stage)
+
+def record_throttle(seconds: float, source: str):
+    """Comptabilise une attente de limitation de débit déjà effectuée"""
+    registry.inc('throttle_seconds_total', seconds, help_text='Temps passé dans les attentes de limitation',
+                 source=source)
+    record_span('throttle', seconds, source=source)
+
+def throttle_sleep(seconds: float, source: str):
+    """time.sleep comptabilisé dans les attentes de limitation"""
+    time.sleep(seconds)
+    record_throttle(seconds, source)
+
+def count_invoice(result: str, job: str = 'sheets'):
+    """Compte une facture traitée (result: success, error, skipped...)"""
+    registry.inc('invoices_total', help_text='Factures traitées', job=job, result=result)
+
+def export_run_metrics(job: str):
+    """
+    Exporte les métriques de l'exécution (METRICS_TEXTFILE, METRICS_REPORT)
+
+    Args:
+        job: Nom de l'exécution ('sheets', 'tempo'), repris en label des jauges de fin d'exécution
+    """
+    registry.set('run_duration_seconds', time.time() - registry.started_at,
+                 help_text="Durée de la dernière exécution", job=job)
+    registry.set('last_run_timestamp_seconds', time.time(),
+                 help_text="Horodatage de fin de la dernière exécution", job=job)
+
+    textfile = os.getenv('METRICS_TEXTFILE')
+    report = os.getenv('METRICS_REPORT')
+    try:
+        if textfile:
+            registry.write_textfile(textfile)
+            print(f"✓ Métriques Prometheus écrites dans {textfile}")
+        if report:
+            registry.write_report(report)
+            print(f"✓ Rapport d'exécution écrit dans {report}")
+    except Exception as e:
+        print(f"⚠ Export des métriques impossible: {e}")
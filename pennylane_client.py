@@ -1,46 +1,83 @@
 import requests
 import os
+import json
 from datetime import datetime
-from typing import List, Dict, Optional
-from dotenv import load_dotenv
+from typing import Iterator, List, Dict, Optional
 
-load_dotenv()
+from config import load_env
+from metrics import track_api_call
+from rate_limiter import get_rate_limiter
 
 class PennylaneClient:
     """Client pour interagir avec l'API Pennylane v2"""
     
     def __init__(self):
+        load_env()
         self.api_key = os.getenv('PENNYLANE_API_KEY')
         if not self.api_key:
             raise ValueError("PENNYLANE_API_KEY non définie dans les variables d'environnement")
         
-        # URL correcte de l'API Pennylane selon la documentation
-        self.base_url = "https://app.pennylane.com/api/external/v2"
+        # URL correcte de l'API Pennylane selon la documentation (surchargeable pour les tests de charge)
+        self.base_url = os.getenv('PENNYLANE_BASE_URL', 'https://app.pennylane.com/api/external/v2').rstrip('/')
+        self.page_size = int(os.getenv('PENNYLANE_PAGE_SIZE', '100'))  # Maximum par page: 100
         self.headers = {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
         }
+        
+        # Session HTTP réutilisée (connexions keep-alive entre les pages et les polls)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.rate_limiter = get_rate_limiter('pennylane')
     
-    def get_all_invoices(self) -> List[Dict]:
+    def _get(self, url: str, operation: str = 'get', **kwargs) -> requests.Response:
+        """GET via la session partagée, en respectant la limite de débit Pennylane"""
+        self.rate_limiter.acquire()
+        with track_api_call('pennylane', operation) as call:
+            response = self.session.get(url, **kwargs)
+            call.status = response.status_code
+        return response
+    
+    def build_filter(self, *conditions) -> str:
         """
-        Récupère TOUTES les factures depuis Pennylane v2 avec pagination
+        Construit le paramètre `filter` de l'API v2
+        
+        Args:
+            conditions: Tuples (champ, opérateur, valeur), ex: ('updated_at', 'gteq', '2024-01-01')
+        """
+        return json.dumps([
+            {'field': field, 'operator': operator, 'value': value}
+            for field, operator, value in conditions
+        ])
+    
+    def iter_invoices(self, filter_expr: Optional[str] = None,
+                      raise_on_error: bool = False) -> Iterator[List[Dict]]:
+        """
+        Parcourt les factures page par page (pagination par curseur)
+        
+        Args:
+            filter_expr: Paramètre `filter` optionnel (voir build_filter)
+            raise_on_error: Propage les erreurs HTTP au lieu d'arrêter silencieusement
+            
+        Yields:
+            La liste des factures de chaque page
         """
-        all_invoices = []
         cursor = None
         page = 1
-        
-        print("Récupération de toutes les factures...")
+        total = 0
         
         while True:
             url = f"{self.base_url}/customer_invoices"
-            params = {'limit': 100}  # Maximum par page
+            params = {'limit': self.page_size}
             
+            if filter_expr:
+                params['filter'] = filter_expr
             if cursor:
                 params['cursor'] = cursor
             
             try:
                 print(f"  Page {page}...")
-                response = requests.get(url, headers=self.headers, params=params, timeout=30)
+                response = self._get(url, 'list_invoices', params=params, timeout=30)
                 response.raise_for_status()
                 
                 data = response.json()
@@ -48,8 +85,9 @@ class PennylaneClient:
                 has_more = data.get('has_more', False)
                 next_cursor = data.get('next_cursor')
                 
-                all_invoices.extend(invoices)
-                print(f"    {len(invoices)} factures récupérées (total: {len(all_invoices)})")
+                total += len(invoices)
+                print(f"    {len(invoices)} factures récupérées (total: {total})")
+                yield invoices
                 
                 if not has_more or not next_cursor:
                     break
@@ -59,11 +97,51 @@ class PennylaneClient:
                 
             except requests.exceptions.RequestException as e:
                 print(f"Erreur lors de la récupération de la page {page}: {e}")
+                if raise_on_error:
+                    raise
                 break
+    
+    def get_all_invoices(self) -> List[Dict]:
+        """
+        Récupère TOUTES les factures depuis Pennylane v2 avec pagination
+        """
+        all_invoices = []
+        
+        print("Récupération de toutes les factures...")
+        
+        for invoices in self.iter_invoices():
+            all_invoices.extend(invoices)
         
         print(f"✓ Récupération terminée: {len(all_invoices)} factures au total")
         return all_invoices
     
+    def get_invoices_updated_since(self, since: datetime, until: Optional[datetime] = None) -> List[Dict]:
+        """
+        Récupère les factures modifiées depuis une date (polling incrémental, backfill)
+        
+        Args:
+            since: Date de début (incluse)
+            until: Date de fin optionnelle (exclue)
+            
+        Raises:
+            requests.exceptions.RequestException: Si une page ne peut pas être récupérée
+        """
+        invoices = []
+        
+        conditions = [('updated_at', 'gteq', since.isoformat())]
+        if until is not None:
+            conditions.append(('updated_at', 'lt', until.isoformat()))
+            print(f"Récupération des factures modifiées du {since.isoformat()} au {until.isoformat()}...")
+        else:
+            print(f"Récupération des factures modifiées depuis {since.isoformat()}...")
+        
+        filter_expr = self.build_filter(*conditions)
+        for page in self.iter_invoices(filter_expr, raise_on_error=True):
+            invoices.extend(page)
+        
+        print(f"✓ {len(invoices)} factures modifiées")
+        return invoices
+    
     def get_invoices(self, status: Optional[str] = None, limit: int = 100, updated_at: Optional[str] = None) -> List[Dict]:
         """
         Récupère les factures depuis Pennylane v2 (pour compatibilité)
@@ -96,7 +174,7 @@ class PennylaneClient:
         try:
             print(f"Tentative de connexion à: {url}")
             print(f"Paramètres: {params}")
-            response = requests.get(url, headers=self.headers, params=params, timeout=10)
+            response = self._get(url, params=params, timeout=10)
             response.raise_for_status()
             
             # La réponse contient items, has_more, next_cursor selon la doc
@@ -107,12 +185,28 @@ class PennylaneClient:
             print(f"Erreur lors de la récupération des factures: {e}")
             return []
     
+    def get_invoice(self, invoice_id) -> Optional[Dict]:
+        """
+        Récupère une facture client par son ID Pennylane
+        """
+        url = f"{self.base_url}/customer_invoices/{invoice_id}"
+
+        try:
+            response = self._get(url, 'get_invoice', timeout=10)
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            print(f"Erreur lors de la récupération de la facture {invoice_id}: {e}")
+            return None
+
     def get_customer_details(self, customer_url: str) -> Optional[Dict]:
         """
         Récupère les détails complets d'un client via l'URL fournie
         """
         try:
-            response = requests.get(customer_url, headers=self.headers, timeout=10)
+            response = self._get(customer_url, timeout=10)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -124,7 +218,7 @@ class PennylaneClient:
         Récupère les détails des paiements via l'URL fournie
         """
         try:
-            response = requests.get(payment_url, headers=self.headers, timeout=10)
+            response = self._get(payment_url, timeout=10)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -142,7 +236,7 @@ class PennylaneClient:
         }
         
         try:
-            response = requests.get(url, headers=self.headers, params=params)
+            response = self._get(url, params=params)
             response.raise_for_status()
             data = response.json()
             invoices = data.get('items', [])
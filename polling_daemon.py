@@ -0,0 +1,78 @@
+import os
+import json
+import signal
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+class PollingDaemon:
+    """
+    Boucle de polling incrémental de Pennylane
+
+    Appelle poll(since, stop_event) toutes les `interval_minutes` minutes avec
+    la date de début du dernier poll réussi. Cette date est persistée dans
+    `state_file` pour reprendre au bon endroit après un redémarrage.
+    """
+
+    def __init__(self, poll: Callable[[datetime, threading.Event], bool],
+                 state_file: str, interval_minutes: Optional[float] = None,
+                 initial_lookback_hours: float = 24):
+        self.poll = poll
+        self.state_file = state_file
+        if interval_minutes is None:
+            interval_minutes = float(os.getenv('POLL_INTERVAL_MINUTES', '15'))
+        self.interval = timedelta(minutes=interval_minutes)
+        self.initial_lookback = timedelta(hours=initial_lookback_hours)
+        self.stop_event = threading.Event()
+
+    def load_last_poll(self) -> Optional[datetime]:
+        """Charge la date du dernier poll réussi"""
+        try:
+            if os.path.exists(self.state_file):
+                with open(self.state_file, 'r') as f:
+                    value = json.load(f).get('last_successful_poll')
+                    if value:
+                        return datetime.fromisoformat(value)
+            return None
+        except Exception as e:
+            print(f"Erreur lors du chargement de l'état du polling: {e}")
+            return None
+
+    def save_last_poll(self, poll_started_at: datetime):
+        """Sauvegarde la date du dernier poll réussi"""
+        try:
+            with open(self.state_file, 'w') as f:
+                json.dump({'last_successful_poll': poll_started_at.isoformat()}, f)
+        except Exception as e:
+            print(f"Erreur lors de la sauvegarde de l'état du polling: {e}")
+
+    def _handle_signal(self, signum, frame):
+        print(f"\nSignal {signal.Signals(signum).name} reçu, arrêt après la facture en cours...")
+        self.stop_event.set()
+
+    def run(self):
+        """Exécute la boucle jusqu'à SIGTERM/SIGINT"""
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, self._handle_signal)
+
+        print(f"Démarrage du polling incrémental (toutes les {self.interval.total_seconds() / 60:g} minutes)...")
+
+        while not self.stop_event.is_set():
+            poll_started_at = datetime.now(timezone.utc)
+            since = self.load_last_poll() or (poll_started_at - self.initial_lookback)
+
+            print(f"\n=== Poll des factures modifiées depuis {since.astimezone().strftime('%d/%m/%Y %H:%M:%S')} ===")
+            try:
+                if self.poll(since, self.stop_event):
+                    # La date de début (et non de fin) sert de borne au prochain poll :
+                    # les modifications survenues pendant ce poll seront revues.
+                    self.save_last_poll(poll_started_at)
+                else:
+                    print("⚠ Poll incomplet, il sera repris depuis la même date")
+            except Exception as e:
+                print(f"✗ Erreur lors du poll: {e}")
+
+            elapsed = datetime.now(timezone.utc) - poll_started_at
+            self.stop_event.wait(max((self.interval - elapsed).total_seconds(), 0))
+
+        print("✓ Polling arrêté proprement")
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Profilage d'une exécution de l'intégration (--profile ou PROFILE_RUN)
+
+    python main.py --auto --profile
+    PROFILE_RUN=sample python tempo_integration.py --auto
+
+Modes :
+- cprofile : cProfile, fichier .prof (snakeviz, `python -m pstats`)
+- sample : échantillonneur de piles (tous les threads), fichiers au format
+  « collapsed stacks » pour flamegraph.pl / speedscope : .collapsed (temps
+  réel) et .cpu.collapsed (échantillons où le thread était sur le CPU)
+- all (défaut) : les deux
+
+En fin d'exécution, le temps réel est ventilé entre CPU et attentes
+(E/S réseau, sleeps), avec la part des appels API et des limitations
+mesurée par metrics.py. Les fichiers sont écrits sous PROFILE_OUTPUT
+(défaut: profiles/<job>-<horodatage>).
+"""
+
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+import metrics
+
+PROFILE_MODES = ('all', 'cprofile', 'sample')
+
+# Intervalle d'échantillonnage des piles (secondes)
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+def profile_mode_from_env() -> Optional[str]:
+    """Mode demandé par PROFILE_RUN (true/all, cprofile, sample), None si désactivé"""
+    value = os.getenv('PROFILE_RUN', '').strip().lower()
+    if value in ('', 'false', '0', 'no'):
+        return None
+    if value in ('true', '1', 'yes'):
+        return 'all'
+    if value not in PROFILE_MODES:
+        raise ValueError(f"PROFILE_RUN invalide: {value} (valeurs: {', '.join(PROFILE_MODES)})")
+    return value
+
+def _thread_cpu_clock(ident: int) -> Optional[int]:
+    try:
+        return time.pthread_getcpuclockid(ident)
+    except (AttributeError, OSError):
+        # Horloge CPU par thread indisponible (hors Linux/Unix ou thread terminé)
+        return None
+
+class StackSampler:
+    """
+    Échantillonne périodiquement les piles Python de tous les threads
+
+    Un échantillon compte comme « CPU » si le thread a consommé au moins la
+    moitié de l'intervalle en temps CPU (horloge CPU du thread), sinon il
+    était bloqué (socket, sleep, verrou...).
+    """
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.wall_stacks: Counter = Counter()
+        self.cpu_stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._cpu_clocks: Dict[int, Optional[int]] = {}
+        self._last_cpu: Dict[int, float] = {}
+
+    def start(self) -> 'StackSampler':
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    @staticmethod
+    def _collapse(thread_name: str, frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+            frame = frame.f_back
+        names.append(thread_name)
+        return ';'.join(reversed(names))
+
+    def _on_cpu(self, ident: int, elapsed: float) -> bool:
+        if ident not in self._cpu_clocks:
+            self._cpu_clocks[ident] = _thread_cpu_clock(ident)
+        clock = self._cpu_clocks[ident]
+        if clock is None:
+            return False
+        try:
+            cpu = time.clock_gettime(clock)
+        except OSError:
+            return False
+        previous = self._last_cpu.get(ident, cpu)
+        self._last_cpu[ident] = cpu
+        return cpu - previous >= elapsed / 2
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = self._collapse(names.get(ident, str(ident)), frame)
+                self.wall_stacks[stack] += 1
+                if self._on_cpu(ident, elapsed):
+                    self.cpu_stacks[stack] += 1
+            self.samples += 1
+
+    @staticmethod
+    def write_collapsed(stacks: Counter, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+def _metric_sum(name: str) -> float:
+    """Somme d'une métrique (compteur ou histogramme) sur tous ses labels"""
+    total = 0.0
+    for sample in metrics.registry.to_dict().get(name, {}).get('samples', []):
+        total += sample.get('sum', sample.get('value', 0.0))
+    return total
+
+def profile_call(func: Callable, job: str, mode: str = 'all', output: Optional[str] = None,
+                 interval: float = DEFAULT_SAMPLE_INTERVAL):
+    """
+    Exécute `func` sous profilage et écrit les fichiers de profil, même si
+    `func` échoue ou appelle sys.exit
+
+    Args:
+        func: Traitement à profiler (ex: integration.run_once)
+        job: Nom de l'exécution, repris dans le nom des fichiers
+        mode: 'all', 'cprofile' ou 'sample'
+        output: Préfixe des fichiers (défaut: PROFILE_OUTPUT ou profiles/<job>-<horodatage>)
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Mode de profilage invalide: {mode} (valeurs: {', '.join(PROFILE_MODES)})")
+
+    prefix = output or os.getenv('PROFILE_OUTPUT') or \
+        os.path.join('profiles', f"{job}-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+    if os.path.dirname(prefix):
+        os.makedirs(os.path.dirname(prefix), exist_ok=True)
+
+    profiler = cProfile.Profile() if mode in ('all', 'cprofile') else None
+    sampler = StackSampler(interval) if mode in ('all', 'sample') else None
+
+    api_before = _metric_sum('api_request_duration_seconds')
+    throttle_before = _metric_sum('throttle_seconds_total')
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    if sampler:
+        sampler.start()
+    if profiler:
+        profiler.enable()
+    try:
+        return func()
+    finally:
+        if profiler:
+            profiler.disable()
+        if sampler:
+            sampler.stop()
+        summary = {
+            'job': job,
+            'mode': mode,
+            'wall_s': round(time.perf_counter() - wall_start, 3),
+            'cpu_s': round(time.process_time() - cpu_start, 3),
+            'api_s': round(_metric_sum('api_request_duration_seconds') - api_before, 3),
+            'throttle_s': round(_metric_sum('throttle_seconds_total') - throttle_before, 3),
+            'files': [],
+        }
+        summary['blocked_s'] = round(max(summary['wall_s'] - summary['cpu_s'], 0.0), 3)
+        _write_outputs(prefix, profiler, sampler, summary)
+
+def _write_outputs(prefix: str, profiler: Optional[cProfile.Profile], sampler: Optional[StackSampler],
+                   summary: Dict):
+    try:
+        if profiler:
+            profiler.dump_stats(f"{prefix}.prof")
+            summary['files'].append(f"{prefix}.prof")
+        if sampler:
+            sampler.write_collapsed(sampler.wall_stacks, f"{prefix}.collapsed")
+            sampler.write_collapsed(sampler.cpu_stacks, f"{prefix}.cpu.collapsed")
+            summary['files'] += [f"{prefix}.collapsed", f"{prefix}.cpu.collapsed"]
+            summary['samples'] = sampler.samples
+        with open(f"{prefix}.summary.json", 'w') as f:
+            json.dump(summary, f, indent=2)
+        summary['files'].append(f"{prefix}.summary.json")
+    except Exception as e:
+        print(f"⚠ Écriture du profil impossible: {e}")
+        return
+
+    wall = summary['wall_s'] or 1e-9
+    print("\n=== Profil de l'exécution ===")
+    print(f"Durée totale: {summary['wall_s']:.1f} s")
+    print(f"  CPU: {summary['cpu_s']:.1f} s ({summary['cpu_s'] / wall * 100:.0f}%)")
+    print(f"  Attentes (E/S, sleeps): {summary['blocked_s']:.1f} s ({summary['blocked_s'] / wall * 100:.0f}%)")
+    print(f"  dont appels API: {summary['api_s']:.1f} s, limitations et délais: {summary['throttle_s']:.1f} s")
+    if profiler:
+        print("\nFonctions les plus coûteuses (temps cumulé):")
+        pstats.Stats(profiler, stream=sys.stdout).sort_stats('cumulative').print_stats(15)
+    for path in summary['files']:
+        print(f"✓ Profil écrit dans {path}")
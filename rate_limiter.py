@@ -0,0 +1,67 @@
+import os
+import time
+import threading
+from typing import Dict, Optional
+
+from metrics import record_throttle
+
+# Débits par défaut (requêtes/seconde) de chaque API, surchargeables par variable d'environnement
+DEFAULT_RATES = {
+    'pennylane': ('PENNYLANE_RATE_LIMIT', 4.0),
+    'sheets': ('SHEETS_RATE_LIMIT', 1.0),
+    'tempo': ('TEMPO_RATE_LIMIT', 5.0),
+    'armado': ('ARMADO_RATE_LIMIT', 5.0),
+}
+
+class RateLimiter:
+    """Limiteur de débit (seau à jetons) partagé entre threads"""
+
+    def __init__(self, rate: float, burst: float = 1.0, name: Optional[str] = None):
+        self.rate = rate
+        self.name = name
+        self.capacity = max(burst, 1.0)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Attend qu'un jeton soit disponible
+
+        Returns:
+            Temps d'attente en secondes
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+
+            # Le jeton est réservé immédiatement : les appels concurrents
+            # attendent chacun leur tour au lieu de se réveiller ensemble.
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+            if self.name:
+                record_throttle(wait, f"rate_limiter:{self.name}")
+        return wait
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(name: str) -> RateLimiter:
+    """Retourne le limiteur partagé d'une API ('pennylane', 'sheets', 'tempo', 'armado')"""
+    with _limiters_lock:
+        if name not in _limiters:
+            env_var, default_rate = DEFAULT_RATES.get(name, (f'{name.upper()}_RATE_LIMIT', 0.0))
+            _limiters[name] = RateLimiter(float(os.getenv(env_var, str(default_rate))), name=name)
+        return _limiters[name]
+
+def reset_rate_limiters():
+    """Oublie les limiteurs créés (les débits seront relus depuis l'environnement)"""
+    with _limiters_lock:
+        _limiters.clear()
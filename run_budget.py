@@ -0,0 +1,59 @@
+import time
+from typing import Optional
+
+# Code de sortie d'une exécution partielle (EX_TEMPFAIL) : le travail restant
+# sera repris à la prochaine exécution
+EXIT_PARTIAL = 75
+
+class RunBudget:
+    """
+    Budget de temps d'une exécution
+
+    Mesure la durée de chaque facture traitée (moyenne mobile exponentielle)
+    pour prédire le coût de la suivante, et indique quand il faut arrêter de
+    prendre de nouvelles factures pour garder le temps de sauvegarder l'état.
+    """
+
+    def __init__(self, budget_seconds: float, reserve_seconds: Optional[float] = None,
+                 initial_item_estimate: float = 10.0, safety_factor: float = 1.5,
+                 smoothing: float = 0.3):
+        self.budget_seconds = budget_seconds
+        # Temps réservé à la sauvegarde de l'état et au vidage des buffers
+        self.reserve_seconds = reserve_seconds if reserve_seconds is not None else max(30.0, budget_seconds * 0.05)
+        self.safety_factor = safety_factor
+        self.smoothing = smoothing
+        self.started_at = time.monotonic()
+        self.item_estimate = initial_item_estimate
+        self.items_measured = 0
+        self.exhausted = False
+
+    def elapsed(self) -> float:
+        """Temps écoulé depuis le début de l'exécution (secondes)"""
+        return time.monotonic() - self.started_at
+
+    def remaining(self) -> float:
+        """Temps restant avant l'échéance (secondes)"""
+        return self.budget_seconds - self.elapsed()
+
+    def record_item(self, duration: float):
+        """Enregistre la durée de traitement d'une facture"""
+        if self.items_measured == 0:
+            self.item_estimate = duration
+        else:
+            self.item_estimate = self.smoothing * duration + (1 - self.smoothing) * self.item_estimate
+        self.items_measured += 1
+
+    def predicted_item_cost(self) -> float:
+        """Coût prévu de la prochaine facture, marge de sécurité incluse"""
+        return self.item_estimate * self.safety_factor
+
+    def can_start_item(self) -> bool:
+        """True s'il reste assez de temps pour traiter une facture de plus"""
+        if self.remaining() - self.reserve_seconds < self.predicted_item_cost():
+            self.exhausted = True
+        return not self.exhausted
+
+    def summary(self) -> str:
+        """Résumé lisible de la consommation du budget"""
+        return (f"{self.elapsed():.0f}s écoulées sur {self.budget_seconds:.0f}s, "
+                f"{self.items_measured} facture(s) mesurée(s), ~{self.item_estimate:.1f}s/facture")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Lecture incrémentale des changements de statut des tâches Google Sheets
+
+Les opérateurs passent les tâches de « À faire » à un autre statut dans la
+feuille. Chaque poll lit les colonnes ID, Statut et Numéro de facture en une
+seule requête (values.batchGet) et compare chaque ligne à son empreinte
+(ID + statut) du poll précédent, conservée dans un fichier d'état : seules
+les tâches dont le statut a changé sont renvoyées.
+
+    python sheet_changes.py                      # un poll, changements sur stdout (JSON Lines)
+    python sheet_changes.py --interval 5 --output changes.jsonl
+
+Une tâche absente de l'état est comparée au statut initial « À faire » : le
+premier poll renvoie donc toutes les tâches déjà traitées.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+INITIAL_STATUS = 'À faire'
+
+class TaskStatusReader:
+    """Renvoie les tâches dont le statut a changé depuis le poll précédent"""
+
+    def __init__(self, sheets_client, state_file: Optional[str] = None):
+        self.sheets_client = sheets_client
+        self.state_file = state_file or os.getenv('SHEET_CHANGES_STATE', 'sheet_changes_state.json')
+        self.fingerprints = self.load_state()
+
+    def load_state(self) -> Dict[str, List[str]]:
+        """Charge les empreintes (numéro de facture → [ID, statut]) du dernier poll"""
+        try:
+            if os.path.exists(self.state_file):
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    return json.load(f).get('fingerprints', {})
+            return {}
+        except Exception as e:
+            print(f"Erreur lors du chargement de l'état des statuts: {e}")
+            return {}
+
+    def save_state(self):
+        """Sauvegarde les empreintes (écriture atomique)"""
+        temp_path = f"{self.state_file}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'last_poll': datetime.now().isoformat(), 'fingerprints': self.fingerprints},
+                      f, ensure_ascii=False)
+        os.replace(temp_path, self.state_file)
+
+    def poll(self, on_changes: Optional[Callable[[List[Dict]], None]] = None) -> List[Dict]:
+        """
+        Lit la feuille et renvoie les changements de statut
+
+        Args:
+            on_changes: Appelé avec les changements avant la sauvegarde de l'état : si
+                l'appel échoue, les mêmes changements sont renvoyés au poll suivant
+
+        Returns:
+            Liste de {'invoice_number', 'id', 'row', 'previous_status', 'status'}
+        """
+        rows = self.sheets_client.read_task_statuses()
+
+        changes = []
+        fingerprints = {}
+        for invoice_number, row in rows.items():
+            fingerprint = [row['id'], row['status']]
+            fingerprints[invoice_number] = fingerprint
+            previous = self.fingerprints.get(invoice_number)
+            if previous == fingerprint:
+                continue
+            previous_status = previous[1] if previous else INITIAL_STATUS
+            if row['status'] != previous_status:
+                changes.append({
+                    'invoice_number': invoice_number,
+                    'id': row['id'],
+                    'row': row['row'],
+                    'previous_status': previous_status,
+                    'status': row['status'],
+                })
+
+        if on_changes and changes:
+            on_changes(changes)
+        # Les tâches archivées ou supprimées sortent de l'état
+        self.fingerprints = fingerprints
+        self.save_state()
+        return changes
+
+def main():
+    parser = argparse.ArgumentParser(description='Changements de statut des tâches Google Sheets')
+    parser.add_argument('--interval', type=float, default=None,
+                        help='Poll toutes les N minutes jusqu\'à Ctrl+C (défaut: un seul poll)')
+    parser.add_argument('--output', default=None, help='Ajoute les changements à ce fichier JSON Lines (défaut: stdout)')
+    parser.add_argument('--state', default=None, help='Fichier d\'état (défaut: SHEET_CHANGES_STATE ou sheet_changes_state.json)')
+    args = parser.parse_args()
+
+    from google_sheets_client import GoogleSheetsClient
+    reader = TaskStatusReader(GoogleSheetsClient(), args.state)
+
+    def write_changes(changes: List[Dict]):
+        lines = ''.join(json.dumps(change, ensure_ascii=False) + '\n' for change in changes)
+        if args.output:
+            with open(args.output, 'a', encoding='utf-8') as f:
+                f.write(lines)
+        else:
+            sys.stdout.write(lines)
+
+    try:
+        while True:
+            changes = reader.poll(write_changes)
+            print(f"✓ {len(changes)} changement(s) de statut", file=sys.stderr)
+            if args.interval is None:
+                return
+            time.sleep(args.interval * 60)
+    except KeyboardInterrupt:
+        print("✓ Lecture des changements arrêtée", file=sys.stderr)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Destinations des tâches créées à partir des factures (--task-sink ou TASK_SINK)
+
+Une destination expose la même interface que GoogleSheetsClient :
+create_task(task_data), upsert_tasks(tasks) et flush(). Destinations :
+- sheets (défaut) : la feuille Google Sheets
+- sqlite[:chemin] : base SQLite locale (défaut: TASK_SINK_DB ou tasks.db)
+- csv[:chemin] : fichier CSV réécrit au flush (défaut: tasks.csv)
+- parquet[:chemin] : fichier Parquet réécrit au flush (défaut: tasks.parquet, pyarrow requis)
+
+Plusieurs destinations séparées par des virgules sont alimentées ensemble.
+Combinée à une destination locale, la feuille Google Sheets ne reçoit que
+l'état final des tâches, en un seul lot au flush :
+
+    python main.py --since 2024-01-01 --task-sink sqlite:backfill.db,sheets
+
+Avec sqlite, chaque tâche pas encore recopiée est marquée dans la base
+(colonne mirrored) : après un arrêt brutal avant le flush, l'exécution
+suivante la reprend et l'envoie à la feuille. Les destinations csv et
+parquet ne sont écrites qu'au flush et ne gardent pas cet état.
+"""
+
+import os
+import csv
+import json
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from google_sheets_client import derive_task_id
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Colonnes des destinations locales
+TASK_FIELDS = ('id', 'status', 'date', 'invoice_number', 'client_name', 'task_name',
+               'payment_status', 'champs_modifies', 'commentaire_interne')
+
+def latest_by_invoice(tasks: List[Dict]) -> Dict[str, Dict]:
+    """Une tâche par facture (la dernière du lot l'emporte)"""
+    latest = {}
+    for index, task_data in enumerate(tasks):
+        latest[task_data.get('invoice_number') or f'#{index}'] = task_data
+    return latest
+
+def task_record(task_data: Dict, timestamp: str) -> Dict:
+    """Ligne d'une destination locale pour une tâche"""
+    return {
+        'id': derive_task_id(task_data),
+        'status': 'À faire',
+        'date': timestamp,
+        'invoice_number': task_data.get('invoice_number', ''),
+        'client_name': task_data.get('client_name', ''),
+        'task_name': task_data.get('task_name', 'Règlement de facture'),
+        'payment_status': task_data.get('payment_status', ''),
+        'champs_modifies': task_data.get('champs_modifies', ''),
+        'commentaire_interne': task_data.get('commentaire_interne', ''),
+    }
+
+class TaskSink(ABC):
+    """
+    Destination locale des tâches, avec le numéro de facture comme clé
+
+    Une tâche dont l'ID (dérivé de la facture et de son état de paiement) est
+    déjà enregistré n'est pas réécrite ; un autre ID remplace la ligne.
+    """
+
+    name = 'local'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _existing_id(self, key: str) -> Optional[str]:
+        """ID de la tâche enregistrée pour la facture, None si elle est absente"""
+
+    @abstractmethod
+    def _store(self, key: str, record: Dict, task_data: Dict):
+        """Enregistre (ou remplace) la ligne de la facture"""
+
+    def _commit(self):
+        pass
+
+    def upsert_tasks(self, tasks: List[Dict]) -> Dict[str, List[str]]:
+        """
+        Écrit un lot de tâches
+
+        Returns:
+            Numéros de facture par résultat : {'created': [...], 'updated': [...], 'skipped': [...]}
+        """
+        result = {'created': [], 'updated': [], 'skipped': []}
+        timestamp = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+        with self._lock:
+            for task_data in latest_by_invoice(tasks).values():
+                record = task_record(task_data, timestamp)
+                key = record['invoice_number'] or record['id']
+                existing_id = self._existing_id(key)
+                if existing_id == record['id']:
+                    result['skipped'].append(record['invoice_number'])
+                    continue
+                self._store(key, record, task_data)
+                result['updated' if existing_id else 'created'].append(record['invoice_number'])
+            self._commit()
+        return result
+
+    def create_task(self, task_data: Dict) -> bool:
+        """Écrit une tâche (voir upsert_tasks)"""
+        try:
+            self.upsert_tasks([task_data])
+            return True
+        except Exception as e:
+            print(f"Erreur lors de l'écriture de la tâche ({self.name}): {e}")
+            return False
+
+    def flush(self) -> bool:
+        """Écrit les tâches en attente ; True si rien ne reste en attente"""
+        return True
+
+class SqliteTaskSink(TaskSink):
+    """Tâches enregistrées dans une base SQLite locale"""
+
+    name = 'sqlite'
+
+    def __init__(self, db_path: Optional[str] = None):
+        super().__init__()
+        self.db_path = db_path or os.getenv('TASK_SINK_DB', 'tasks.db')
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            '''CREATE TABLE IF NOT EXISTS tasks (
+                invoice_key TEXT PRIMARY KEY,
+                id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                date TEXT NOT NULL,
+                invoice_number TEXT,
+                client_name TEXT,
+                task_name TEXT,
+                payment_status TEXT,
+                champs_modifies TEXT,
+                commentaire_interne TEXT,
+                data TEXT NOT NULL,
+                mirrored INTEGER NOT NULL DEFAULT 0
+            )'''
+        )
+        # Bases créées avant la colonne mirrored : leurs tâches seront recopiées une fois
+        columns = [row[1] for row in self._conn.execute('PRAGMA table_info(tasks)')]
+        if 'mirrored' not in columns:
+            self._conn.execute('ALTER TABLE tasks ADD COLUMN mirrored INTEGER NOT NULL DEFAULT 0')
+        self._conn.commit()
+
+    def _existing_id(self, key: str) -> Optional[str]:
+        row = self._conn.execute('SELECT id FROM tasks WHERE invoice_key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _store(self, key: str, record: Dict, task_data: Dict):
+        # La ligne remplacée repart avec mirrored = 0 : la tâche est à recopier
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO tasks (invoice_key, {', '.join(TASK_FIELDS)}, data) "
+            f"VALUES (?, {', '.join('?' for _ in TASK_FIELDS)}, ?)",
+            (key, *(record[field] for field in TASK_FIELDS), json.dumps(task_data, ensure_ascii=False, default=str))
+        )
+
+    def _commit(self):
+        self._conn.commit()
+
+    def load_tasks(self) -> List[Dict]:
+        """Données des tâches enregistrées, dans l'ordre d'écriture"""
+        with self._lock:
+            rows = self._conn.execute('SELECT data FROM tasks ORDER BY rowid').fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def pending_mirror(self) -> Dict[str, Dict]:
+        """Données des tâches pas encore recopiées vers les miroirs, par clé de facture"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT invoice_key, data FROM tasks WHERE mirrored = 0 ORDER BY rowid'
+            ).fetchall()
+        return {key: json.loads(data) for key, data in rows}
+
+    def mark_mirrored(self, tasks: Dict[str, Dict]):
+        """Marque les tâches recopiées (une ligne réécrite depuis avec un autre ID reste à recopier)"""
+        with self._lock:
+            self._conn.executemany(
+                'UPDATE tasks SET mirrored = 1 WHERE invoice_key = ? AND id = ?',
+                [(key, derive_task_id(task_data)) for key, task_data in tasks.items()]
+            )
+            self._conn.commit()
+
+class CsvTaskSink(TaskSink):
+    """Tâches gardées en mémoire et écrites dans un fichier CSV au flush"""
+
+    name = 'csv'
+    default_path = 'tasks.csv'
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__()
+        self.path = path or self.default_path
+        self._records: Dict[str, Dict] = self._load() if os.path.exists(self.path) else {}
+        self._dirty = False
+
+    def _load(self) -> Dict[str, Dict]:
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            return {record['invoice_number'] or record['id']: record for record in csv.DictReader(f)}
+
+    def _save(self, records: List[Dict], path: str):
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=TASK_FIELDS)
+            writer.writeheader()
+            writer.writerows(records)
+
+    def _existing_id(self, key: str) -> Optional[str]:
+        record = self._records.get(key)
+        return record['id'] if record else None
+
+    def _store(self, key: str, record: Dict, task_data: Dict):
+        self._records[key] = record
+        self._dirty = True
+
+    def flush(self) -> bool:
+        """Réécrit le fichier (écriture atomique) si des tâches ont changé"""
+        with self._lock:
+            if not self._dirty:
+                return True
+            temp_path = f"{self.path}.tmp"
+            self._save(list(self._records.values()), temp_path)
+            os.replace(temp_path, self.path)
+            self._dirty = False
+        return True
+
+class ParquetTaskSink(CsvTaskSink):
+    """Tâches gardées en mémoire et écrites dans un fichier Parquet au flush (pyarrow requis)"""
+
+    name = 'parquet'
+    default_path = 'tasks.parquet'
+
+    def __init__(self, path: Optional[str] = None):
+        if not PYARROW_AVAILABLE:
+            raise ValueError("Destination parquet indisponible : installer pyarrow (pip install pyarrow)")
+        super().__init__(path)
+
+    def _load(self) -> Dict[str, Dict]:
+        records = pyarrow.parquet.read_table(self.path).to_pylist()
+        return {record['invoice_number'] or record['id']: record for record in records}
+
+    def _save(self, records: List[Dict], path: str):
+        table = pyarrow.table({field: [record[field] for record in records] for field in TASK_FIELDS})
+        pyarrow.parquet.write_table(table, path)
+
+class FanOutTaskSink:
+    """
+    Alimente plusieurs destinations
+
+    Les destinations de `sinks` reçoivent chaque tâche immédiatement (le résultat
+    est celui de la première). Celles de `mirrors` ne reçoivent que la dernière
+    tâche de chaque facture, en un seul lot au flush.
+
+    La première destination qui garde l'état de recopie (pending_mirror et
+    mark_mirrored, voir SqliteTaskSink) fournit à la création les tâches
+    restées en attente lors d'une exécution précédente.
+    """
+
+    name = 'fanout'
+
+    def __init__(self, sinks: List, mirrors: Optional[List] = None):
+        if not sinks:
+            raise ValueError("Au moins une destination de tâches est requise")
+        self.sinks = sinks
+        self.mirrors = mirrors or []
+        self._lock = threading.Lock()
+        self._mirror_pending: Dict[str, Dict] = {}
+        self._mirror_state = next((sink for sink in sinks if hasattr(sink, 'pending_mirror')), None)
+        if self.mirrors and self._mirror_state is not None:
+            self._mirror_pending = self._mirror_state.pending_mirror()
+            if self._mirror_pending:
+                print(f"⧗ {len(self._mirror_pending)} tâche(s) d'une exécution précédente à recopier")
+
+    def upsert_tasks(self, tasks: List[Dict]) -> Dict[str, List[str]]:
+        results = [sink.upsert_tasks(tasks) for sink in self.sinks]
+        if self.mirrors:
+            with self._lock:
+                for task_data in tasks:
+                    self._mirror_pending[task_data.get('invoice_number') or derive_task_id(task_data)] = task_data
+        return results[0]
+
+    def create_task(self, task_data: Dict) -> bool:
+        try:
+            self.upsert_tasks([task_data])
+            return True
+        except Exception as e:
+            print(f"Erreur lors de l'écriture de la tâche: {e}")
+            return False
+
+    def flush(self) -> bool:
+        """Vide chaque destination puis envoie l'état final des tâches aux miroirs"""
+        flushed = all([sink.flush() for sink in self.sinks])
+        with self._lock:
+            pending = dict(self._mirror_pending)
+        if not pending:
+            return flushed and all([mirror.flush() for mirror in self.mirrors])
+
+        for mirror in self.mirrors:
+            try:
+                result = mirror.upsert_tasks(list(pending.values()))
+                print(f"✓ {len(pending)} tâche(s) recopiée(s) ({len(result['created'])} créée(s), "
+                      f"{len(result['updated'])} mise(s) à jour)")
+                flushed = mirror.flush() and flushed
+            except Exception as e:
+                print(f"⚠ Recopie de {len(pending)} tâche(s) échouée, nouvel essai au prochain flush: {e}")
+                return False
+        if self._mirror_state is not None:
+            self._mirror_state.mark_mirrored(pending)
+        with self._lock:
+            # Une tâche reçue pendant la recopie reste en attente
+            for key, task_data in pending.items():
+                if self._mirror_pending.get(key) is task_data:
+                    del self._mirror_pending[key]
+        return flushed
+
+LOCAL_SINKS = {
+    'sqlite': SqliteTaskSink,
+    'csv': CsvTaskSink,
+    'parquet': ParquetTaskSink,
+}
+
+def parse_task_sink_spec(spec: str) -> List[tuple]:
+    """'sqlite:tasks.db,sheets' → [('sqlite', 'tasks.db'), ('sheets', None)]"""
+    entries = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        kind, _, path = item.partition(':')
+        kind = kind.lower()
+        if kind != 'sheets' and kind not in LOCAL_SINKS:
+            raise ValueError(f"Destination de tâches inconnue: {kind} (valeurs: sheets, {', '.join(LOCAL_SINKS)})")
+        entries.append((kind, path or None))
+    if not entries:
+        raise ValueError("Aucune destination de tâches configurée")
+    return entries
+
+def mirrors_to_sheets(spec: str) -> bool:
+    """True si Google Sheets est alimenté en miroir d'une destination locale"""
+    kinds = {kind for kind, _ in parse_task_sink_spec(spec)}
+    return 'sheets' in kinds and len(kinds) > 1
+
+def build_task_sink(spec: str, sheets_factory: Callable):
+    """
+    Crée la destination décrite par `spec` (voir l'en-tête du module)
+
+    Args:
+        spec: Destinations séparées par des virgules (ex: 'sheets', 'sqlite:tasks.db,sheets')
+        sheets_factory: Renvoie le client Google Sheets (créé seulement s'il est utilisé)
+    """
+    entries = parse_task_sink_spec(spec)
+    local_sinks = [LOCAL_SINKS[kind](path) for kind, path in entries if kind != 'sheets']
+    uses_sheets = any(kind == 'sheets' for kind, _ in entries)
+
+    if not local_sinks:
+        return sheets_factory()
+    if len(local_sinks) == 1 and not uses_sheets:
+        return local_sinks[0]
+    return FanOutTaskSink(local_sinks, [sheets_factory()] if uses_sheets else [])
@@ -3,23 +3,26 @@ import base64
 import requests
 import json
 from datetime import datetime
+from functools import cached_property
 from typing import Dict, Optional, Union
-from dotenv import load_dotenv
+
+from config import load_env
+from metrics import track_api_call
+from rate_limiter import get_rate_limiter
 
 # Import optionnel pour éviter les erreurs si le client email n'est pas configuré
 try:
-    from tempo_email_client import TempoEmailClient
+    from tempo_email_client import get_email_client
     EMAIL_AVAILABLE = True
 except ImportError:
     EMAIL_AVAILABLE = False
-    TempoEmailClient = None
-
-load_dotenv()
+    get_email_client = None
 
 class TempoClient:
     """Client pour l'API Tempo - Gestion des règlements de factures"""
     
     def __init__(self):
+        load_env()
         self.base_url = os.getenv('TEMPO_BASE_URL')
         self.dossier = os.getenv('TEMPO_DOSSIER')
         self.username = os.getenv('TEMPO_USERNAME')
@@ -32,15 +35,14 @@ class TempoClient:
         if self.base_url.endswith('/'):
             self.base_url = self.base_url.rstrip('/')
         
-        # Initialiser le client email si disponible
-        self.email_client = None
-        if EMAIL_AVAILABLE:
-            try:
-                self.email_client = TempoEmailClient()
-                print("✅ Client email Office365 initialisé")
-            except Exception as e:
-                print(f"⚠ Client email non disponible: {e}")
-                self.email_client = None
+        # Session HTTP réutilisée (connexions keep-alive entre les appels)
+        self.session = requests.Session()
+        self.rate_limiter = get_rate_limiter('tempo')
+    
+    @cached_property
+    def email_client(self):
+        """Client email partagé, créé au premier usage (None si non configuré)"""
+        return get_email_client() if EMAIL_AVAILABLE else None
     
     def _get_auth_header(self) -> str:
         """Génère l'en-tête d'authentification Basic Auth"""
@@ -75,7 +77,10 @@ class TempoClient:
         """
         try:
             url = f"{self.base_url}/FACTURE?Dossier={self.dossier}&ID={id_facture}"
-            response = requests.get(url, headers=self._get_headers())
+            self.rate_limiter.acquire()
+            with track_api_call('tempo', 'get_facture') as call:
+                response = self.session.get(url, headers=self._get_headers())
+                call.status = response.status_code
             
             if response.status_code == 200:
                 return response.json()
@@ -244,7 +249,10 @@ class TempoClient:
             print(f"URL: {url}")
             print(f"Payload: {json.dumps(payload, indent=2)}")
             
-            response = requests.post(url, headers=self._get_headers(), json=payload)
+            self.rate_limiter.acquire()
+            with track_api_call('tempo', 'post_reglement') as call:
+                response = self.session.post(url, headers=self._get_headers(), json=payload)
+                call.status = response.status_code
             
             print(f"Réponse: {response.status_code}")
             if response.text:
@@ -5,19 +5,26 @@ Gère l'envoi d'emails d'alerte en cas d'erreurs
 """
 
 import os
+import io
+import csv
+import gzip
 import smtplib
+import threading
+from email.mime.base import MIMEBase
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from email.mime.application import MIMEApplication
 from datetime import datetime
-from typing import List, Dict, Optional
-from dotenv import load_dotenv
+from typing import Iterable, List, Dict, Optional, Tuple
 
-load_dotenv()
+from config import load_env
+from metrics import track_api_call
 
 class TempoEmailClient:
     """Client pour l'envoi d'emails Office365 - Alertes Tempo"""
     
     def __init__(self):
+        load_env()
         self.smtp_host = 'smtp.office365.com'
         self.smtp_port = 587
         self.username = os.getenv('OFFICE365_USER')
@@ -51,7 +58,8 @@ class TempoEmailClient:
     
     def send_alert_email(self, subject: str, html_content: str, 
                         recipients: Optional[List[str]] = None,
-                        error_details: Optional[Dict] = None) -> bool:
+                        error_details: Optional[Dict] = None,
+                        attachments: Optional[List[MIMEBase]] = None) -> bool:
         """
         Envoie un email d'alerte
         
@@ -60,6 +68,7 @@ class TempoEmailClient:
             html_content: Contenu HTML de l'email
             recipients: Liste des destinataires (optionnel)
             error_details: Détails de l'erreur (optionnel)
+            attachments: Pièces jointes MIME déjà construites (optionnel)
             
         Returns:
             True si succès, False sinon
@@ -73,8 +82,8 @@ class TempoEmailClient:
                 print("⚠ Aucun destinataire configuré pour les alertes")
                 return False
             
-            # Créer le message
-            msg = MIMEMultipart('alternative')
+            # Créer le message ('mixed' dès qu'il y a des pièces jointes)
+            msg = MIMEMultipart('mixed' if attachments else 'alternative')
             msg['From'] = f"{self.sender_name} <{self.sender_email}>"
             msg['To'] = ', '.join(recipients)
             msg['Subject'] = f"[ALERTE TEMPO] {subject}"
@@ -87,8 +96,12 @@ class TempoEmailClient:
             html_part = MIMEText(html_content, 'html', 'utf-8')
             msg.attach(html_part)
             
+            # Ajouter les pièces jointes
+            for attachment in attachments or []:
+                msg.attach(attachment)
+            
             # Envoyer l'email
-            with smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
+            with track_api_call('smtp', 'send'), smtplib.SMTP(self.smtp_host, self.smtp_port) as server:
                 server.starttls()
                 server.login(self.username, self.password)
                 
@@ -187,78 +200,101 @@ class TempoEmailClient:
         return self.send_alert_email(subject, html_content)
     
     def send_integration_summary(self, processed_count: int, error_count: int,
-                               details: List[Dict]) -> bool:
+                               details: Iterable[Dict]) -> bool:
         """
         Envoie un résumé de l'intégration
         
+        Le corps HTML ne contient que les statistiques agrégées : le détail
+        de chaque opération est écrit au fil de l'eau dans un CSV compressé
+        (gzip) joint à l'email, pour que le message garde une taille fixe
+        quel que soit le nombre d'opérations.
+        
         Args:
             processed_count: Nombre de règlements traités
             error_count: Nombre d'erreurs
-            details: Détails des opérations
+            details: Détails des opérations (liste ou itérable)
             
         Returns:
             True si succès, False sinon
         """
         subject = f"Résumé intégration Tempo - {processed_count} traités, {error_count} erreurs"
         
-        # Générer le résumé des opérations
-        operations_summary = ""
-        for op in details:
-            status_icon = "✅" if op.get('success') else "❌"
-            operations_summary += f"""
-            <tr>
-                <td>{status_icon}</td>
-                <td>{op.get('invoice_number', 'N/A')}</td>
-                <td>{op.get('operation_type', 'N/A')}</td>
-                <td>{op.get('amount', 'N/A')}€</td>
-                <td>{op.get('message', 'N/A')}</td>
-            </tr>
-            """
+        now = datetime.now()
+        attachment_name = f"operations_tempo_{now.strftime('%Y%m%d_%H%M')}.csv.gz"
+        attachment, operations_count, total_amount = self._build_operations_attachment(
+            details, attachment_name
+        )
         
-        html_content = f"""
-        <h2>📊 Résumé de l'intégration Tempo</h2>
+        total_count = processed_count + error_count
+        success_rate = (processed_count / total_count * 100) if total_count > 0 else 0.0
         
-        <h3>Statistiques :</h3>
-        <ul>
-            <li><strong>Date/heure :</strong> {datetime.now().strftime('%d/%m/%Y %H:%M')}</li>
-            <li><strong>Règlements traités :</strong> {processed_count}</li>
-            <li><strong>Erreurs rencontrées :</strong> {error_count}</li>
-            <li><strong>Taux de succès :</strong> {(processed_count/(processed_count+error_count)*100):.1f}%</li>
-        </ul>
+        html_parts = [
+            "<h2>📊 Résumé de l'intégration Tempo</h2>",
+            "<h3>Statistiques :</h3>",
+            "<ul>",
+            f"<li><strong>Date/heure :</strong> {now.strftime('%d/%m/%Y %H:%M')}</li>",
+            f"<li><strong>Règlements traités :</strong> {processed_count}</li>",
+            f"<li><strong>Erreurs rencontrées :</strong> {error_count}</li>",
+            f"<li><strong>Taux de succès :</strong> {success_rate:.1f}%</li>",
+            f"<li><strong>Montant total des opérations :</strong> {total_amount:.2f}€</li>",
+            "</ul>",
+            "<h3>Détail des opérations :</h3>",
+            f"<p>{operations_count} opération(s) détaillée(s) dans la pièce jointe "
+            f"<code>{attachment_name}</code> (CSV compressé).</p>",
+            "<p><em>Ce résumé a été généré automatiquement par l'intégration Tempo.</em></p>",
+        ]
         
-        <h3>Détail des opérations :</h3>
-        <table border="1" style="border-collapse: collapse; width: 100%;">
-            <thead>
-                <tr style="background-color: #f0f0f0;">
-                    <th>Statut</th>
-                    <th>Facture</th>
-                    <th>Opération</th>
-                    <th>Montant</th>
-                    <th>Message</th>
-                </tr>
-            </thead>
-            <tbody>
-                {operations_summary}
-            </tbody>
-        </table>
+        return self.send_alert_email(subject, "\n".join(html_parts), attachments=[attachment])
+    
+    def _build_operations_attachment(self, details: Iterable[Dict],
+                                     filename: str) -> Tuple[MIMEApplication, int, float]:
+        """
+        Écrit les opérations dans un CSV compressé (gzip) en une seule passe
         
-        <p><em>Ce résumé a été généré automatiquement par l'intégration Tempo.</em></p>
+        Returns:
+            Tuple (pièce jointe MIME, nombre d'opérations, montant total)
         """
+        buffer = io.BytesIO()
+        operations_count = 0
+        total_amount = 0.0
         
-        return self.send_alert_email(subject, html_content)
+        with gzip.GzipFile(fileobj=buffer, mode='wb') as gz:
+            with io.TextIOWrapper(gz, encoding='utf-8', newline='') as text:
+                writer = csv.writer(text, delimiter=';')
+                writer.writerow(['statut', 'facture', 'operation', 'montant', 'message'])
+                
+                for op in details:
+                    amount = op.get('amount')
+                    try:
+                        total_amount += float(amount or 0)
+                    except (TypeError, ValueError):
+                        pass
+                    
+                    writer.writerow([
+                        'succes' if op.get('success') else 'echec',
+                        op.get('invoice_number', 'N/A'),
+                        op.get('operation_type', 'N/A'),
+                        amount if amount is not None else 'N/A',
+                        op.get('message', 'N/A'),
+                    ])
+                    operations_count += 1
+        
+        attachment = MIMEApplication(buffer.getvalue(), 'gzip')
+        attachment.add_header('Content-Disposition', 'attachment', filename=filename)
+        return attachment, operations_count, total_amount
     
     def _format_error_details(self, error_details: Dict) -> str:
         """Formate les détails d'erreur en HTML"""
-        html = "<h3>Détails techniques de l'erreur :</h3><ul>"
+        html_parts = ["<h3>Détails techniques de l'erreur :</h3><ul>"]
         
         for key, value in error_details.items():
             if isinstance(value, dict):
-                html += f"<li><strong>{key}:</strong> <pre>{self._format_payload(value)}</pre></li>"
+                html_parts.append(f"<li><strong>{key}:</strong> <pre>{self._format_payload(value)}</pre></li>")
             else:
-                html += f"<li><strong>{key}:</strong> {value}</li>"
+                html_parts.append(f"<li><strong>{key}:</strong> {value}</li>")
         
-        html += "</ul>"
-        return html
+        html_parts.append("</ul>")
+        return "".join(html_parts)
     
     def _format_payload(self, payload: Dict) -> str:
         """Formate un payload en JSON lisible"""
@@ -267,3 +303,26 @@ class TempoEmailClient:
             return json.dumps(payload, indent=2, ensure_ascii=False)
         except:
             return str(payload)
+
+_shared_client = None
+_shared_client_ready = False
+_shared_client_lock = threading.Lock()
+
+def get_email_client() -> Optional[TempoEmailClient]:
+    """
+    Client email partagé par TempoClient et TempoIntegration, créé au premier appel
+
+    Returns:
+        Le client, ou None si Office365 n'est pas configuré
+    """
+    global _shared_client, _shared_client_ready
+    with _shared_client_lock:
+        if not _shared_client_ready:
+            try:
+                _shared_client = TempoEmailClient()
+                print("✅ Client email Office365 initialisé")
+            except Exception as e:
+                print(f"⚠ Client email non disponible: {e}")
+                _shared_client = None
+            _shared_client_ready = True
+        return _shared_client
@@ -7,42 +7,52 @@ basé sur les données de Pennylane
 
 import os
 import json
-import time
+import threading
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-from dotenv import load_dotenv
+from functools import cached_property
+from typing import List, Dict, Optional, Tuple
 
 from pennylane_client import PennylaneClient
+from invoice_record import InvoiceRecord, as_invoice_record, normalize_invoices
+from label_parsing import extract_invoice_number
+from invoice_columns import select_paid_on, select_paid_since
 from tempo_client import TempoClient
+from config import load_env
+from metrics import track_stage, throttle_sleep, count_invoice, export_run_metrics
+from tracing import flush_traces
+from profiling import PROFILE_MODES, profile_call, profile_mode_from_env
 
 # Import optionnel pour éviter les erreurs si le client email n'est pas configuré
 try:
-    from tempo_email_client import TempoEmailClient
+    from tempo_email_client import get_email_client
     EMAIL_AVAILABLE = True
 except ImportError:
     EMAIL_AVAILABLE = False
-    TempoEmailClient = None
+    get_email_client = None
 
-load_dotenv()
+load_env()
 
 class TempoIntegration:
     """Intégration entre Pennylane et Tempo pour l'automatisation des règlements"""
     
     def __init__(self):
-        self.pennylane_client = PennylaneClient()
-        self.tempo_client = TempoClient()
         self.processed_reglements_file = 'processed_reglements.json'
         self.processed_reglements = self.load_processed_reglements()
-        
-        # Initialiser le client email si disponible
-        self.email_client = None
-        if EMAIL_AVAILABLE:
-            try:
-                self.email_client = TempoEmailClient()
-                print("✅ Client email Office365 initialisé")
-            except Exception as e:
-                print(f"⚠ Client email non disponible: {e}")
-                self.email_client = None
+        self._state_lock = threading.Lock()
+    
+    # Clients créés au premier usage : un démarrage ne paie que les dépendances utilisées
+    @cached_property
+    def pennylane_client(self) -> PennylaneClient:
+        return PennylaneClient()
+    
+    @cached_property
+    def tempo_client(self) -> TempoClient:
+        return TempoClient()
+    
+    @cached_property
+    def email_client(self):
+        """Client email partagé avec TempoClient (None si non configuré)"""
+        return get_email_client() if EMAIL_AVAILABLE else None
     
     def load_processed_reglements(self) -> Dict[str, Dict]:
         """Charge la liste des règlements déjà traités"""
@@ -58,8 +68,10 @@ class TempoIntegration:
     def save_processed_reglements(self):
         """Sauvegarde la liste des règlements traités"""
         try:
+            with self._state_lock:
+                reglements = dict(self.processed_reglements)
             with open(self.processed_reglements_file, 'w') as f:
-                json.dump(self.processed_reglements, f, indent=2)
+                json.dump(reglements, f, indent=2)
         except Exception as e:
             print(f"Erreur lors de la sauvegarde des règlements traités: {e}")
     
@@ -69,122 +81,118 @@ class TempoIntegration:
     
     def extract_invoice_number_from_label(self, label: str) -> Optional[int]:
         """Extrait le numéro de facture du label Pennylane"""
-        if not label:
-            return None
-        
-        try:
-            # Format: "Facture EURO DISNEY ASSOCIES SAS - 20498 (label généré)"
-            if ' - ' in label:
-                parts = label.split(' - ')
-                if len(parts) >= 2:
-                    # Prendre la deuxième partie et extraire le numéro
-                    second_part = parts[1]
-                    # Chercher un nombre dans cette partie
-                    import re
-                    numbers = re.findall(r'\d+', second_part)
-                    if numbers:
-                        return int(numbers[0])
-            return None
-        except:
-            return None
+        return extract_invoice_number(label)
     
-    def get_payment_amount(self, invoice: Dict) -> float:
+    def get_payment_amount(self, invoice: InvoiceRecord) -> float:
         """Calcule le montant payé pour une facture"""
-        try:
-            total_amount = float(invoice.get('amount', 0) or 0)
-            remaining_amount = float(invoice.get('remaining_amount_with_tax', 0) or 0)
-            return total_amount - remaining_amount
-        except:
-            return 0.0
+        return as_invoice_record(invoice).paid_amount
     
-    def is_invoice_fully_paid(self, invoice: Dict) -> bool:
+    def is_invoice_fully_paid(self, invoice: InvoiceRecord) -> bool:
         """Vérifie si une facture est entièrement payée"""
-        try:
-            remaining_amount = float(invoice.get('remaining_amount_with_tax', 0) or 0)
-            return remaining_amount <= 0
-        except:
-            return False
+        return as_invoice_record(invoice).is_fully_paid
     
-    def process_invoice_payment(self, invoice: Dict) -> bool:
-        """Traite le paiement d'une facture en l'enregistrant dans Tempo"""
-        try:
-            invoice_id = invoice.get('id')
-            invoice_number = self.extract_invoice_number_from_label(invoice.get('label', ''))
+    def process_invoice_payment(self, invoice: InvoiceRecord, payment_date: Optional[datetime] = None) -> bool:
+        """
+        Traite le paiement d'une facture en l'enregistrant dans Tempo
+        
+        Args:
+            invoice: Facture Pennylane
+            payment_date: Date de règlement (défaut: aujourd'hui)
+        """
+        invoice = as_invoice_record(invoice)
+        with track_stage('process_invoice', invoice_id=invoice.id, job='tempo') as span:
+            try:
+                invoice_id = invoice.id
+                invoice_number = invoice.tempo_invoice_number
+                span.set_attribute('invoice_number', invoice_number)
             
-            if not invoice_number:
-                print(f"⚠ Impossible d'extraire le numéro de facture pour {invoice_id}")
-                return False
+                if not invoice_number:
+                    print(f"⚠ Impossible d'extraire le numéro de facture pour {invoice_id}")
+                    return False
             
-            # Calculer le montant payé
-            payment_amount = self.get_payment_amount(invoice)
-            if payment_amount <= 0:
-                print(f"⚠ Aucun montant payé pour la facture {invoice_number}")
-                return False
+                # Calculer le montant payé
+                payment_amount = invoice.paid_amount
+                if payment_amount <= 0:
+                    print(f"⚠ Aucun montant payé pour la facture {invoice_number}")
+                    return False
             
-            # Vérifier si c'est un paiement total ou partiel
-            is_fully_paid = self.is_invoice_fully_paid(invoice)
+                # Vérifier si c'est un paiement total ou partiel
+                is_fully_paid = invoice.is_fully_paid
             
-            # Date de règlement (aujourd'hui par défaut)
-            payment_date = datetime.now()
-            payment_date_str = payment_date.strftime('%Y%m%d')
+                # Date de règlement (aujourd'hui par défaut)
+                payment_date = payment_date or datetime.now()
+                payment_date_str = payment_date.strftime('%Y%m%d')
             
-            # Générer la clé unique du règlement
-            reglement_key = self.get_reglement_key(invoice_id, payment_date_str, payment_amount)
+                # Générer la clé unique du règlement
+                reglement_key = self.get_reglement_key(invoice_id, payment_date_str, payment_amount)
             
-            # Vérifier si déjà traité
-            if reglement_key in self.processed_reglements:
-                print(f"⚠ Règlement déjà traité pour la facture {invoice_number}")
-                return True
+                # Vérifier si déjà traité
+                if reglement_key in self.processed_reglements:
+                    print(f"⚠ Règlement déjà traité pour la facture {invoice_number}")
+                    return True
             
-            print(f"\n=== Traitement du règlement ===")
-            print(f"Facture Pennylane ID: {invoice_id}")
-            print(f"Numéro de facture Tempo: {invoice_number}")
-            print(f"Montant payé: {payment_amount}€")
-            print(f"Date de règlement: {payment_date_str}")
-            print(f"Type: {'Total' if is_fully_paid else 'Partiel'}")
+                print(f"\n=== Traitement du règlement ===")
+                print(f"Facture Pennylane ID: {invoice_id}")
+                print(f"Numéro de facture Tempo: {invoice_number}")
+                print(f"Montant payé: {payment_amount}€")
+                print(f"Date de règlement: {payment_date_str}")
+                print(f"Type: {'Total' if is_fully_paid else 'Partiel'}")
             
-            # Enregistrer dans Tempo
-            success = False
-            if is_fully_paid:
-                # Cas A: Règlement total
-                success = self.tempo_client.enregistrer_reglement_total(
-                    invoice_number, payment_date_str
-                )
-            else:
-                # Cas B: Règlement partiel
-                success = self.tempo_client.enregistrer_reglement_partiel(
-                    invoice_number, payment_amount, payment_date_str
-                )
+                # Enregistrer dans Tempo
+                success = False
+                if is_fully_paid:
+                    # Cas A: Règlement total
+                    success = self.tempo_client.enregistrer_reglement_total(
+                        invoice_number, payment_date_str
+                    )
+                else:
+                    # Cas B: Règlement partiel
+                    success = self.tempo_client.enregistrer_reglement_partiel(
+                        invoice_number, payment_amount, payment_date_str
+                    )
             
-            if success:
-                # Marquer comme traité
-                self.processed_reglements[reglement_key] = {
-                    'invoice_id': invoice_id,
-                    'invoice_number': invoice_number,
-                    'payment_amount': payment_amount,
-                    'payment_date': payment_date_str,
-                    'is_fully_paid': is_fully_paid,
-                    'processed_at': datetime.now().isoformat()
-                }
+                if success:
+                    # Marquer comme traité
+                    with self._state_lock:
+                        self.processed_reglements[reglement_key] = {
+                            'invoice_id': invoice_id,
+                            'invoice_number': invoice_number,
+                            'payment_amount': payment_amount,
+                            'payment_date': payment_date_str,
+                            'is_fully_paid': is_fully_paid,
+                            'processed_at': datetime.now().isoformat()
+                        }
                 
-                print(f"✓ Règlement enregistré avec succès dans Tempo")
+                    print(f"✓ Règlement enregistré avec succès dans Tempo")
                 
-                # Vérifier l'état dans Tempo
-                print("\nVérification de l'état dans Tempo...")
-                tempo_facture = self.tempo_client.get_facture(invoice_number)
-                if tempo_facture:
-                    print("✓ État récupéré depuis Tempo")
+                    # Vérifier l'état dans Tempo
+                    print("\nVérification de l'état dans Tempo...")
+                    tempo_facture = self.tempo_client.get_facture(invoice_number)
+                    if tempo_facture:
+                        print("✓ État récupéré depuis Tempo")
+                    else:
+                        print("⚠ Impossible de récupérer l'état depuis Tempo")
+                
+                    return True
                 else:
-                    print("⚠ Impossible de récupérer l'état depuis Tempo")
+                    print(f"✗ Échec de l'enregistrement dans Tempo")
+                    span.set_error('Règlement non enregistré dans Tempo')
+                    return False
                 
-                return True
-            else:
-                print(f"✗ Échec de l'enregistrement dans Tempo")
+            except Exception as e:
+                print(f"✗ Erreur lors du traitement du paiement: {e}")
+                span.set_error(f"{type(e).__name__}: {e}")
                 return False
-                
-        except Exception as e:
-            print(f"✗ Erreur lors du traitement du paiement: {e}")
-            return False
+    
+    def select_paid_invoices(self, all_invoices: List[InvoiceRecord], day) -> Tuple[List[InvoiceRecord], List[InvoiceRecord]]:
+        """
+        Sélectionne les factures (hors avoirs) avec paiement mises à jour le jour donné
+        
+        Returns:
+            (factures hors avoirs, factures avec paiement)
+        """
+        # Hors avoirs, avec paiement ET mises à jour ce jour-là (voir invoice_columns.py)
+        return select_paid_on(normalize_invoices(all_invoices), day)
     
     def process_paid_invoices_today(self):
         """Traite les factures passées en statut payé aujourd'hui"""
@@ -193,30 +201,12 @@ class TempoIntegration:
         print(f"Début: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
         
         # Récupérer toutes les factures Pennylane
-        all_invoices = self.pennylane_client.get_all_invoices()
+        with track_stage('fetch_invoices'):
+            # Conversion unique en factures compactes (voir invoice_record.py)
+            all_invoices = normalize_invoices(self.pennylane_client.get_all_invoices())
         
-        # Filtrer uniquement les factures (pas les avoirs)
-        regular_invoices = [inv for inv in all_invoices if inv.get('status') != 'credit_note']
-        
-        # Filtrer les factures avec paiement ET mises à jour aujourd'hui
-        paid_invoices_today = []
-        
-        for invoice in regular_invoices:
-            # Vérifier si la facture a été mise à jour aujourd'hui
-            updated_at = invoice.get('updated_at')
-            if not updated_at:
-                continue
-            
-            try:
-                # Parser la date ISO
-                updated_date = datetime.fromisoformat(updated_at.replace('Z', '+00:00'))
-                if updated_date.date() == datetime.now().date():
-                    # Vérifier s'il y a un paiement
-                    payment_amount = self.get_payment_amount(invoice)
-                    if payment_amount > 0:
-                        paid_invoices_today.append(invoice)
-            except:
-                continue
+        with track_stage('select_invoices'):
+            regular_invoices, paid_invoices_today = self.select_paid_invoices(all_invoices, datetime.now().date())
         
         print(f"Nombre total de factures analysées: {len(regular_invoices)}")
         print(f"Factures payées aujourd'hui: {len(paid_invoices_today)}")
@@ -232,38 +222,41 @@ class TempoIntegration:
         
         for invoice in paid_invoices_today:
             try:
-                if self.process_invoice_payment(invoice):
+                success = self.process_invoice_payment(invoice)
+                count_invoice('success' if success else 'error', job='tempo')
+                if success:
                     processed_count += 1
                     operation_details.append({
                         'success': True,
-                        'invoice_number': self.extract_invoice_number_from_label(invoice.get('label', '')),
+                        'invoice_number': invoice.tempo_invoice_number,
                         'operation_type': 'Règlement automatique',
-                        'amount': self.get_payment_amount(invoice),
+                        'amount': invoice.paid_amount,
                         'message': 'Succès'
                     })
                 else:
                     error_count += 1
                     operation_details.append({
                         'success': False,
-                        'invoice_number': self.extract_invoice_number_from_label(invoice.get('label', '')),
+                        'invoice_number': invoice.tempo_invoice_number,
                         'operation_type': 'Règlement automatique',
-                        'amount': self.get_payment_amount(invoice),
+                        'amount': invoice.paid_amount,
                         'message': 'Échec du traitement'
                     })
                 
                 # Délai entre les traitements pour éviter les quotas
-                time.sleep(1)
+                throttle_sleep(1, 'invoice_delay')
                 
             except Exception as e:
                 error_count += 1
+                count_invoice('error', job='tempo')
                 error_msg = str(e)
-                print(f"✗ Erreur lors du traitement de la facture {invoice.get('id')}: {error_msg}")
+                print(f"✗ Erreur lors du traitement de la facture {invoice.id}: {error_msg}")
                 
                 operation_details.append({
                     'success': False,
-                    'invoice_number': self.extract_invoice_number_from_label(invoice.get('label', '')),
+                    'invoice_number': invoice.tempo_invoice_number,
                     'operation_type': 'Règlement automatique',
-                    'amount': self.get_payment_amount(invoice),
+                    'amount': invoice.paid_amount,
                     'message': f'Exception: {error_msg}'
                 })
         
@@ -326,24 +319,107 @@ class TempoIntegration:
         except Exception as e:
             print(f"Erreur lors du traitement: {e}")
             raise
+        finally:
+            export_run_metrics('tempo')
+            flush_traces()
     
-    def run_scheduled(self):
-        """Exécute le traitement de manière planifiée"""
-        print("Démarrage du traitement planifié (tous les midis à 12h00)...")
+    def poll_updates(self, since: datetime, stop_event: Optional[threading.Event] = None) -> bool:
+        """
+        Enregistre dans Tempo les paiements des factures modifiées depuis `since`
         
-        import schedule
+        Args:
+            since: Date de début du dernier poll réussi
+            stop_event: Événement d'arrêt vérifié entre deux factures
+            
+        Returns:
+            True si toutes les factures ont été traitées, False sinon (poll à reprendre)
+        """
+        invoices = normalize_invoices(self.pennylane_client.get_invoices_updated_since(since))
         
-        # Traitement tous les midis à 12h00
-        schedule.every().day.at("12:00").do(self.run_once)
+        paid_invoices = select_paid_since(invoices, since)
         
-        # Traitement initial
-        print("Exécution du traitement initial...")
-        self.run_once()
+        print(f"Factures payées à traiter: {len(paid_invoices)}")
         
-        # Boucle de surveillance
-        while True:
-            schedule.run_pending()
-            time.sleep(60)  # Vérifier toutes les minutes
+        processed_count = 0
+        error_count = 0
+        stopped = False
+        
+        for invoice in paid_invoices:
+            if stop_event is not None and stop_event.is_set():
+                stopped = True
+                break
+            
+            if self.process_invoice_payment(invoice):
+                processed_count += 1
+                count_invoice('success', job='tempo')
+            else:
+                error_count += 1
+                count_invoice('error', job='tempo')
+            
+            # Délai entre les traitements pour éviter les quotas
+            throttle_sleep(1, 'invoice_delay')
+        
+        if processed_count > 0:
+            self.save_processed_reglements()
+            print(f"\n{processed_count} règlements traités avec succès")
+        
+        if error_count > 0:
+            print(f"⚠ {error_count} erreurs rencontrées, les factures seront reprises au prochain poll")
+        
+        return not stopped and error_count == 0
+    
+    def backfill_partition(self, start: datetime, end: datetime) -> bool:
+        """
+        Enregistre dans Tempo les paiements des factures modifiées dans [start, end[
+        
+        Returns:
+            True si toutes les factures de la partition ont été traitées
+        """
+        invoices = normalize_invoices(self.pennylane_client.get_invoices_updated_since(start, until=end))
+        
+        failed_count = 0
+        for invoice in select_paid_since(invoices, start, until=end):
+            # La date de modification sert de date de règlement
+            if not self.process_invoice_payment(invoice, payment_date=invoice.updated_at):
+                failed_count += 1
+        
+        self.save_processed_reglements()
+        return failed_count == 0
+    
+    def run_backfill(self, since: str, until: Optional[str] = None,
+                     granularity: str = 'day', workers: int = 4) -> bool:
+        """
+        Rattrape les règlements Tempo sur une période (dates AAAA-MM-JJ incluses)
+        
+        Args:
+            since: Premier jour à traiter
+            until: Dernier jour à traiter (défaut: aujourd'hui)
+            granularity: Découpage en partitions 'day' ou 'week'
+            workers: Nombre de partitions traitées en parallèle
+            
+        Returns:
+            True si toutes les partitions sont terminées
+        """
+        from backfill import BackfillRunner, parse_date
+        
+        until_date = parse_date(until) if until else datetime.now().date()
+        runner = BackfillRunner(self.backfill_partition, 'tempo_backfill_checkpoint.json', workers=workers)
+        try:
+            return runner.run(parse_date(since), until_date, granularity)
+        finally:
+            export_run_metrics('tempo')
+            flush_traces()
+    
+    def run_scheduled(self, interval_minutes: Optional[float] = None):
+        """Surveillance continue : polling incrémental de Pennylane jusqu'à SIGTERM"""
+        from polling_daemon import PollingDaemon
+        
+        daemon = PollingDaemon(
+            self.poll_updates,
+            state_file='tempo_poll_state.json',
+            interval_minutes=interval_minutes
+        )
+        daemon.run()
 
 def main():
     """Fonction principale"""
@@ -352,7 +428,15 @@ def main():
     parser = argparse.ArgumentParser(description='Intégration Pennylane - Tempo')
     parser.add_argument('--auto', action='store_true', help='Mode automatique pour GitHub Actions')
     parser.add_argument('--once', action='store_true', help='Exécution unique')
-    parser.add_argument('--scheduled', action='store_true', help='Mode planifié')
+    parser.add_argument('--scheduled', action='store_true', help='Mode planifié (polling incrémental continu)')
+    parser.add_argument('--daemon', action='store_true', help='Alias de --scheduled')
+    parser.add_argument('--since', type=str, default=None, help='Backfill : premier jour à traiter (AAAA-MM-JJ)')
+    parser.add_argument('--until', type=str, default=None, help='Backfill : dernier jour à traiter (AAAA-MM-JJ, défaut: aujourd\'hui)')
+    parser.add_argument('--partition', choices=['day', 'week'], default='day', help='Backfill : découpage de la période')
+    parser.add_argument('--workers', type=int, default=4, help='Backfill : partitions traitées en parallèle')
+    parser.add_argument('--interval', type=float, default=None, help='Intervalle du polling en minutes (défaut: POLL_INTERVAL_MINUTES ou 15)')
+    parser.add_argument('--profile', nargs='?', const='all', choices=PROFILE_MODES, default=None,
+                        help='Profile l\'exécution unique ou le backfill : cprofile, sample ou all (défaut: PROFILE_RUN)')
     
     args = parser.parse_args()
     
@@ -361,11 +445,29 @@ def main():
     try:
         integration = TempoIntegration()
         
-        if args.auto:
+        # Profilage optionnel de l'exécution unique / du backfill
+        profile_mode = args.profile or profile_mode_from_env()
+        run_once = integration.run_once
+        run_backfill = integration.run_backfill
+        if profile_mode:
+            print(f"⏱ Profilage activé ({profile_mode})")
+            run_once = lambda: profile_call(integration.run_once, 'tempo', profile_mode)
+            run_backfill = lambda *backfill_args: profile_call(
+                lambda: integration.run_backfill(*backfill_args), 'tempo-backfill', profile_mode)
+        
+        if args.since:
+            # Mode backfill : rattrapage d'une période
+            print("Mode backfill...")
+            if not integration.run_initial_setup():
+                print("✗ Échec de la configuration initiale")
+                exit(1)
+            if not run_backfill(args.since, args.until, args.partition, args.workers):
+                exit(1)
+        elif args.auto:
             # Mode automatique pour GitHub Actions
             print("Mode automatique activé (GitHub Actions)")
             if integration.run_initial_setup():
-                integration.run_once()
+                run_once()
                 print("✓ Traitement automatique terminé avec succès")
             else:
                 print("✗ Échec de la configuration initiale")
@@ -374,15 +476,15 @@ def main():
             # Mode exécution unique
             print("Mode exécution unique...")
             if integration.run_initial_setup():
-                integration.run_once()
+                run_once()
             else:
                 print("✗ Échec de la configuration initiale")
                 exit(1)
-        elif args.scheduled:
+        elif args.scheduled or args.daemon:
             # Mode planifié
             print("Mode planifié...")
             if integration.run_initial_setup():
-                integration.run_scheduled()
+                integration.run_scheduled(interval_minutes=args.interval)
             else:
                 print("✗ Échec de la configuration initiale")
                 exit(1)
@@ -394,19 +496,19 @@ def main():
             
             print("\nChoisissez le mode d'exécution:")
             print("1. Exécution unique (traitement des factures payées aujourd'hui)")
-            print("2. Surveillance continue (tous les midis à 12h00)")
+            print("2. Surveillance continue (polling incrémental de Pennylane)")
             
             choice = input("\nVotre choix (1 ou 2): ").strip()
             
             if choice == "1":
                 print("\nExécution unique...")
-                integration.run_once()
+                run_once()
             elif choice == "2":
                 print("\nDémarrage de la surveillance continue...")
-                integration.run_scheduled()
+                integration.run_scheduled(interval_minutes=args.interval)
             else:
                 print("Choix invalide. Exécution unique par défaut.")
-                integration.run_once()
+                run_once()
             
     except Exception as e:
         print(f"Erreur lors de l'initialisation: {e}")
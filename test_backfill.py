@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date
+
+from backfill import BackfillRunner, split_partitions, partition_key
+from rate_limiter import RateLimiter
+
+class TestSplitPartitions(unittest.TestCase):
+    """Tests unitaires pour le découpage en partitions"""
+
+    def test_daily_partitions(self):
+        """Un intervalle de 3 jours donne 3 partitions contiguës"""
+        partitions = split_partitions(date(2024, 1, 1), date(2024, 1, 3))
+        self.assertEqual(
+            [partition_key(p) for p in partitions],
+            ['2024-01-01/2024-01-02', '2024-01-02/2024-01-03', '2024-01-03/2024-01-04']
+        )
+
+    def test_weekly_partitions_are_truncated(self):
+        """La dernière semaine s'arrête au dernier jour demandé"""
+        partitions = split_partitions(date(2024, 1, 1), date(2024, 1, 10), 'week')
+        self.assertEqual(
+            [partition_key(p) for p in partitions],
+            ['2024-01-01/2024-01-08', '2024-01-08/2024-01-11']
+        )
+
+    def test_invalid_range(self):
+        """Une date de fin antérieure est refusée"""
+        with self.assertRaises(ValueError):
+            split_partitions(date(2024, 1, 2), date(2024, 1, 1))
+
+class TestBackfillRunner(unittest.TestCase):
+    """Tests unitaires pour le rattrapage avec points de reprise"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.checkpoint_file = os.path.join(self.tmp_dir, 'checkpoint.json')
+        self.processed = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _process(self, fail_on=None):
+        def process(start, end):
+            with self.lock:
+                self.processed.append(start.date().isoformat())
+            return start.date().isoformat() != fail_on
+        return process
+
+    def test_resume_skips_completed_partitions(self):
+        """Une partition en échec est reprise, les autres non"""
+        runner = BackfillRunner(self._process(fail_on='2024-01-02'), self.checkpoint_file, workers=3)
+        self.assertFalse(runner.run(date(2024, 1, 1), date(2024, 1, 3)))
+        self.assertEqual(sorted(self.processed), ['2024-01-01', '2024-01-02', '2024-01-03'])
+
+        self.processed.clear()
+        runner = BackfillRunner(self._process(), self.checkpoint_file, workers=3)
+        self.assertTrue(runner.run(date(2024, 1, 1), date(2024, 1, 3)))
+        self.assertEqual(self.processed, ['2024-01-02'])
+
+    def test_exception_marks_partition_incomplete(self):
+        """Une exception dans une partition ne bloque pas les autres"""
+        def process(start, end):
+            if start.day == 1:
+                raise RuntimeError('API indisponible')
+            return True
+
+        runner = BackfillRunner(process, self.checkpoint_file, workers=2)
+        self.assertFalse(runner.run(date(2024, 1, 1), date(2024, 1, 2)))
+        self.assertEqual(runner.completed, {'2024-01-02/2024-01-03'})
+
+class TestRateLimiter(unittest.TestCase):
+    """Tests unitaires pour le limiteur de débit partagé"""
+
+    def test_rate_is_shared_between_threads(self):
+        """Plusieurs threads se partagent le même débit"""
+        limiter = RateLimiter(rate=50)
+        start = time.monotonic()
+
+        threads = [threading.Thread(target=lambda: [limiter.acquire() for _ in range(5)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # 20 jetons à 50/s dont 1 disponible immédiatement : au moins ~0.38 s
+        self.assertGreaterEqual(time.monotonic() - start, 0.35)
+
+    def test_zero_rate_disables_limit(self):
+        """Un débit nul désactive la limite"""
+        self.assertEqual(RateLimiter(rate=0).acquire(), 0.0)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,36 @@
+import unittest
+
+from bench_hot_paths import build_cases, build_integrations, case_input, compare_results, measure
+from generate_invoices import InvoiceGenerator
+from invoice_record import normalize_invoices
+
+def result(seconds, peak_kib):
+    return {'size': 1000, 'seconds': seconds, 'ns_per_invoice': seconds * 1e6, 'peak_kib': peak_kib}
+
+class TestBenchHotPaths(unittest.TestCase):
+    """Tests de la suite de benchmarks"""
+
+    def test_all_cases_run(self):
+        """Chaque cas s'exécute sur un petit jeu et produit une mesure"""
+        invoices = list(InvoiceGenerator(seed=1).iter_invoices(200))
+        records = normalize_invoices(invoices)
+        for name, func in build_cases(*build_integrations()).items():
+            measurement = measure(func, case_input(name, invoices, records), repeat=1)
+            self.assertEqual(measurement['size'], 200, name)
+            self.assertGreater(measurement['seconds'], 0, name)
+
+    def test_regression_detection(self):
+        """Les hausses au-delà du seuil sont signalées, le bruit est ignoré"""
+        baseline = {'results': {'a@1000': result(0.100, 1000), 'b@1000': result(0.001, 10), 'c@1000': result(0.1, 10)}}
+        current = {'results': {'a@1000': result(0.150, 1000), 'b@1000': result(0.0015, 10),
+                               'c@1000': result(0.1, 20), 'new@1000': result(1, 1)}}
+
+        regressions = compare_results(current, baseline, threshold=0.2)
+
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith('a@1000: temps'))
+        self.assertTrue(regressions[1].startswith('c@1000: mémoire'))
+        self.assertEqual(compare_results(current, baseline, threshold=0.6, memory_threshold=1.5), [])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,37 @@
+import time
+import unittest
+from unittest.mock import patch
+
+from bench_throughput import SleepMeter, percentile, run_scenario
+
+class TestBenchThroughput(unittest.TestCase):
+    """Tests du banc de débit de bout en bout"""
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_sleep_meter_scales_and_projects(self):
+        """Les délais fixes sont raccourcis, la durée d'origine est extrapolée"""
+        meter = SleepMeter(scale=0.01)
+        with patch('time.sleep', meter.sleep):
+            time.sleep(1)
+        self.assertEqual(meter.projected[__name__], 1)
+        self.assertLess(meter.actual[__name__], 0.5)
+
+    def test_scenario_report(self):
+        """Un scénario complet produit débit, appels par destination et latences par étape"""
+        report = run_scenario(150, latency='none', sleep_scale=0.001, rate_limits=False)
+
+        self.assertGreater(report['processed'], 0)
+        # Une écriture par tâche, plus la lecture unique de l'index des tâches existantes
+        self.assertAlmostEqual(report['api_calls_per_invoice']['sheets'], 1.0 + 1 / report['processed'])
+        self.assertIn('invoice.total', report['stages'])
+        self.assertEqual(report['stages']['invoice.total']['count'], report['processed'])
+        # Une seconde d'attente fixe par facture dans process_paid_invoices_today
+        self.assertAlmostEqual(report['sleep_by_source_s']['main'], report['processed'])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
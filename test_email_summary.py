@@ -0,0 +1,73 @@
+import csv
+import gzip
+import io
+import unittest
+from unittest.mock import patch, MagicMock
+
+from tempo_email_client import TempoEmailClient
+
+class TestIntegrationSummary(unittest.TestCase):
+    """Tests unitaires pour le résumé d'intégration Tempo"""
+
+    def setUp(self):
+        """Configuration des tests"""
+        with patch.dict('os.environ', {
+            'OFFICE365_USER': 'user@test.fr',
+            'OFFICE365_PASSWORD': 'secret',
+            'TEMPO_ALERT_EMAILS': 'ops@test.fr'
+        }):
+            self.client = TempoEmailClient()
+
+    def _send_summary(self, details):
+        """Envoie le résumé avec un serveur SMTP mocké et retourne le message"""
+        with patch('smtplib.SMTP') as mock_smtp:
+            server = MagicMock()
+            mock_smtp.return_value.__enter__.return_value = server
+            self.assertTrue(self.client.send_integration_summary(len(details), 0, details))
+            return server.send_message.call_args[0][0]
+
+    def _operations(self, count):
+        return [
+            {
+                'success': True,
+                'invoice_number': 20000 + i,
+                'operation_type': 'Règlement automatique',
+                'amount': 10.0,
+                'message': 'Succès'
+            }
+            for i in range(count)
+        ]
+
+    def test_details_are_in_compressed_attachment(self):
+        """Le détail des opérations est dans le CSV compressé, pas dans le corps"""
+        msg = self._send_summary(self._operations(3))
+
+        html_part, attachment = msg.get_payload()
+        html = html_part.get_payload(decode=True).decode('utf-8')
+        self.assertNotIn('20001', html)
+        self.assertIn('30.00€', html)
+
+        self.assertTrue(attachment.get_filename().endswith('.csv.gz'))
+        content = gzip.decompress(attachment.get_payload(decode=True)).decode('utf-8')
+        rows = list(csv.reader(io.StringIO(content), delimiter=';'))
+        self.assertEqual(rows[0], ['statut', 'facture', 'operation', 'montant', 'message'])
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[2][1], '20001')
+
+    def test_body_size_does_not_depend_on_operations(self):
+        """Le corps HTML garde la même taille quel que soit le volume"""
+        small = self._send_summary(self._operations(1)).get_payload()[0]
+        large = self._send_summary(self._operations(5000)).get_payload()[0]
+
+        small_html = small.get_payload(decode=True).decode('utf-8')
+        large_html = large.get_payload(decode=True).decode('utf-8')
+        self.assertLess(abs(len(large_html) - len(small_html)), 50)
+
+    def test_summary_without_operations(self):
+        """Pas de division par zéro sans opération"""
+        msg = self._send_summary([])
+        html = msg.get_payload()[0].get_payload(decode=True).decode('utf-8')
+        self.assertIn('0.0%', html)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,415 @@
+import os
+import json
+import time
+import uuid
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from fake_apis import FakeApiServer, FaultProfile, parse_a1_range
+from rate_limiter import RateLimiter
+
+def make_invoices(count):
+    return [
+        {
+            'id': i,
+            'invoice_number': f'F-{i}',
+            'label': f'Facture CLIENT {i} - {20000 + i} (label généré)',
+            'amount': '100.0',
+            'remaining_amount_with_tax': '0.0',
+            'status': 'paid',
+            'updated_at': f'2024-01-{1 + i % 28:02d}T10:00:00+01:00'
+        }
+        for i in range(count)
+    ]
+
+class TestFakeApis(unittest.TestCase):
+    """Tests des APIs simulées utilisées avec les vrais clients"""
+
+    def setUp(self):
+        self.server = FakeApiServer(make_invoices(250)).start()
+        self.env = patch.dict(os.environ, self.server.env())
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.server.stop()
+
+    def test_pennylane_cursor_pagination_and_filter(self):
+        """Pagination par curseur et filtre updated_at"""
+        from pennylane_client import PennylaneClient
+
+        client = PennylaneClient()
+        client.rate_limiter = RateLimiter(0)
+
+        self.assertEqual(len(client.get_all_invoices()), 250)
+        self.assertEqual(self.server.request_counts[('pennylane', 'GET')], 3)
+
+        since = datetime.fromisoformat('2024-01-27T00:00:00+01:00')
+        invoices = client.get_invoices_updated_since(since)
+        self.assertEqual({invoice['updated_at'][:10] for invoice in invoices}, {'2024-01-27', '2024-01-28'})
+        self.assertIsNone(client.get_invoice(9999))
+
+    def test_sheets_task_written_to_fake_spreadsheet(self):
+        """Le client Google Sheets écrit dans le classeur simulé"""
+        from google_sheets_client import GoogleSheetsClient
+
+        client = GoogleSheetsClient()
+        client.rate_limiter = RateLimiter(0)
+        client.setup_headers()
+
+        self.assertTrue(client.create_task({'task_name': 'Règlement de facture',
+                                            'client_name': 'CLIENT', 'invoice_number': 'F-1'}))
+        row = client.sheets_service.spreadsheets().values().get(
+            spreadsheetId=os.environ['SPREADSHEET_ID'], range=f"{self.server.sheet_name}!A2:S2"
+        ).execute()['values'][0]
+        self.assertEqual((row[1], row[3], row[11], row[18]), ('À faire', 'Règlement de facture', 'CLIENT', 'F-1'))
+
+    def test_sheet_metadata_fetched_once(self):
+        """Création de la feuille et des en-têtes avec une seule lecture des métadonnées"""
+        from google_sheets_client import GoogleSheetsClient
+
+        with patch.dict(os.environ, {'SPREADSHEET_NAME': 'Nouvelles tâches'}):
+            client = GoogleSheetsClient()
+        client.rate_limiter = RateLimiter(0)
+        client.setup_spreadsheet()
+
+        # Métadonnées + index des tâches existantes
+        self.assertEqual(self.server.request_counts[('sheets', 'GET')], 2)
+        self.assertIsNotNone(client.get_sheet_id('Nouvelles tâches'))
+        self.assertEqual(client.get_sheet_id(), client.get_sheet_id('Nouvelles tâches'))
+        self.assertEqual(self.server.request_counts[('sheets', 'GET')], 2)
+        # Feuille, en-têtes et mise en forme dans un seul batchUpdate
+        self.assertEqual(self.server.request_counts[('sheets', 'POST')], 1)
+        self.assertEqual(self.server.spreadsheet.get_values('Nouvelles tâches!A1:B1')['values'], [['ID', 'Statut']])
+
+    def test_request_batch_maps_results(self):
+        """Requêtes regroupées : une requête HTTP, réponse ou erreur rendue à chaque appelant"""
+        from googleapiclient.errors import HttpError
+        from google_sheets_client import GoogleSheetsClient
+
+        client = GoogleSheetsClient()
+        client.rate_limiter = RateLimiter(0)
+        spreadsheet_id = os.environ['SPREADSHEET_ID']
+        with client.batch() as batch:
+            written = batch.add(client._values.update(
+                spreadsheetId=spreadsheet_id, range=f"{self.server.sheet_name}!A2",
+                valueInputOption='RAW', body={'values': [['x']]}), 'values.update')
+            missing = batch.add(client._values.get(spreadsheetId=spreadsheet_id, range='Absente!A1'), 'values.get')
+            resized = batch.add_sheet_requests([{'updateSheetProperties': {
+                'properties': {'sheetId': client.get_sheet_id(), 'gridProperties': {'rowCount': 50}},
+                'fields': 'gridProperties.rowCount'}}])
+
+        self.assertEqual(self.server.request_counts[('sheets', 'POST')], 1)
+        self.assertEqual(written.result()['updatedCells'], 1)
+        self.assertEqual(resized.result(), [{}])
+        with self.assertRaises(HttpError):
+            missing.result()
+
+    def test_sheet_dedupe_index(self):
+        """Une facture déjà présente dans la feuille n'est pas réécrite, sans état local"""
+        from google_sheets_client import GoogleSheetsClient
+
+        task = {'task_name': 'Règlement partiel de facture', 'client_name': 'CLIENT', 'invoice_number': 'F-1'}
+        first = GoogleSheetsClient()
+        first.rate_limiter = RateLimiter(0)
+        first.setup_spreadsheet()
+        first.setup_headers()
+        self.assertTrue(first.create_task(task))
+        self.assertTrue(first.create_task(dict(task, invoice_number='F-2')))
+
+        # Nouveau runner : l'index est relu depuis la feuille
+        second = GoogleSheetsClient()
+        second.rate_limiter = RateLimiter(0)
+        self.assertEqual(set(second.load_task_index()), {'F-1', 'F-2'})
+        writes = self.server.request_counts[('sheets', 'PUT')]
+        self.assertTrue(second.create_task(task))
+        self.assertEqual(self.server.request_counts[('sheets', 'PUT')], writes)
+
+        # Paiement devenu total : la ligne existante est mise à jour, la suivante est ajoutée après
+        self.assertTrue(second.create_task(dict(task, task_name='Règlement de facture')))
+        self.assertTrue(second.create_task(dict(task, invoice_number='F-3')))
+        rows = second.sheets_service.spreadsheets().values().get(
+            spreadsheetId=os.environ['SPREADSHEET_ID'], range=f"{self.server.sheet_name}!A1:S5"
+        ).execute()['values']
+        self.assertEqual([(row[3], row[18]) for row in rows[1:]],
+                         [('Règlement de facture', 'F-1'), ('Règlement partiel de facture', 'F-2'),
+                          ('Règlement partiel de facture', 'F-3')])
+
+    def test_upsert_tasks_batch(self):
+        """Un lot de tâches : une mise à jour groupée et un ajout groupé, en un aller-retour"""
+        from google_sheets_client import GoogleSheetsClient
+
+        client = GoogleSheetsClient()
+        client.rate_limiter = RateLimiter(0)
+        client.setup_headers()
+        partial = {'task_name': 'Règlement partiel de facture', 'client_name': 'CLIENT'}
+        client.upsert_tasks([dict(partial, invoice_number='F-1'), dict(partial, invoice_number='F-2')])
+
+        posts = self.server.request_counts[('sheets', 'POST')]
+        result = client.upsert_tasks([
+            dict(partial, invoice_number='F-1', task_name='Règlement de facture', commentaire_interne='payée'),
+            dict(partial, invoice_number='F-2'),
+            dict(partial, invoice_number='F-3'),
+            dict(partial, invoice_number='F-4'),
+        ])
+        self.assertEqual(result, {'created': ['F-3', 'F-4'], 'updated': ['F-1'], 'skipped': ['F-2']})
+        # Mise à jour et ajout dans la même requête HTTP multipart
+        self.assertEqual(self.server.request_counts[('sheets', 'POST')], posts + 1)
+
+        rows = client.sheets_service.spreadsheets().values().get(
+            spreadsheetId=os.environ['SPREADSHEET_ID'], range=f"{self.server.sheet_name}!A2:S5"
+        ).execute()['values']
+        self.assertEqual([(row[3], row[7], row[18]) for row in rows],
+                         [('Règlement de facture', 'payée', 'F-1'), ('Règlement partiel de facture', '', 'F-2'),
+                          ('Règlement partiel de facture', '', 'F-3'), ('Règlement partiel de facture', '', 'F-4')])
+        self.assertEqual(client.load_task_index()['F-4']['row'], 5)
+
+    def test_deterministic_task_ids(self):
+        """ID dérivé de la facture et de son état de paiement ; anciennes lignes à ID aléatoire reconnues"""
+        from google_sheets_client import GoogleSheetsClient
+
+        client = GoogleSheetsClient()
+        client.rate_limiter = RateLimiter(0)
+        client.setup_headers()
+        partial = {'invoice_id': 7, 'invoice_number': 'F-7', 'task_name': 'Règlement partiel de facture',
+                   'payment_status': 'Partiellement payée', 'payment_amount': '50.00€'}
+        task_id = client.generate_unique_id(partial)
+        self.assertEqual(task_id, GoogleSheetsClient().generate_unique_id(dict(partial)))
+        self.assertNotEqual(task_id, client.generate_unique_id(dict(partial, payment_amount='80.00€')))
+
+        client.upsert_tasks([partial])
+        self.assertEqual(client.load_task_index()['F-7']['id'], task_id)
+        result = client.upsert_tasks([partial, dict(partial, invoice_id=8, invoice_number='F-8')])
+        self.assertEqual(result, {'created': ['F-8'], 'updated': [], 'skipped': ['F-7']})
+
+        # Second paiement partiel : même nom de tâche, nouvel ID écrit dans la ligne
+        result = client.upsert_tasks([dict(partial, payment_amount='80.00€')])
+        self.assertEqual(result['updated'], ['F-7'])
+        self.assertNotEqual(client.load_task_index()['F-7']['id'], task_id)
+
+        # Ligne écrite avec un ID aléatoire : comparée sur le nom de la tâche
+        client._task_rows['F-8']['id'] = str(uuid.uuid4())
+        result = client.upsert_tasks([dict(partial, invoice_id=8, invoice_number='F-8', payment_amount='60.00€')])
+        self.assertEqual(result['skipped'], ['F-8'])
+
+        # Index vidé par un autre lot en échec juste après l'écriture : create_task ne le relit pas
+        upsert = client._upsert_tasks
+        def upsert_then_reset(tasks):
+            outcome = upsert(tasks)
+            client._task_rows = None
+            return outcome
+        with patch.object(client, '_upsert_tasks', side_effect=upsert_then_reset):
+            self.assertTrue(client.create_task(dict(partial, invoice_id=8, invoice_number='F-8',
+                                                    payment_amount='60.00€')))
+
+    def test_write_behind_buffer(self):
+        """Tâches écrites par lots depuis la file, journal repris après un arrêt brutal"""
+        import tempfile
+        from google_sheets_client import GoogleSheetsClient
+
+        journal = os.path.join(tempfile.mkdtemp(), 'journal.jsonl')
+        env = {'SHEETS_WRITE_BEHIND': 'true', 'SHEETS_JOURNAL_FILE': journal,
+               'SHEETS_FLUSH_SIZE': '2', 'SHEETS_FLUSH_INTERVAL': '60'}
+        task = {'task_name': 'Règlement de facture', 'client_name': 'CLIENT'}
+        with patch.dict(os.environ, env):
+            client = GoogleSheetsClient()
+        client.rate_limiter = RateLimiter(0)
+        client.setup_headers()
+
+        for number in ('F-1', 'F-2', 'F-3'):
+            self.assertTrue(client.create_task(dict(task, invoice_number=number)))
+        # Lot de 2 écrit par le thread de fond, la troisième tâche reste dans le journal
+        deadline = time.monotonic() + 5
+        while client.write_buffer.pending_count > 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with open(journal) as f:
+            self.assertEqual(len(f.readlines()), 1)
+        self.assertTrue(client.flush())
+        self.assertEqual(os.path.getsize(journal), 0)
+
+        # Arrêt brutal : journal avec une tâche et une ligne tronquée, repris par un nouveau client
+        with open(journal, 'w') as f:
+            f.write(json.dumps(dict(task, invoice_number='F-4')) + '\n{"task_na')
+        with patch.dict(os.environ, env):
+            restarted = GoogleSheetsClient()
+        restarted.rate_limiter = RateLimiter(0)
+        self.assertEqual(restarted.write_buffer.pending_count, 1)
+        self.assertTrue(restarted.flush())
+
+        rows = self.server.spreadsheet.get_values(f"{self.server.sheet_name}!S2:S")['values']
+        self.assertEqual(rows, [['F-1'], ['F-2'], ['F-3'], ['F-4']])
+
+    def test_write_behind_flushes_after_interval(self):
+        """Une tâche seule (lot incomplet) est écrite une fois SHEETS_FLUSH_INTERVAL écoulé"""
+        import tempfile
+        from google_sheets_client import GoogleSheetsClient
+
+        journal = os.path.join(tempfile.mkdtemp(), 'journal.jsonl')
+        env = {'SHEETS_WRITE_BEHIND': 'true', 'SHEETS_JOURNAL_FILE': journal,
+               'SHEETS_FLUSH_SIZE': '50', 'SHEETS_FLUSH_INTERVAL': '0.3'}
+        with patch.dict(os.environ, env):
+            client = GoogleSheetsClient()
+        client.rate_limiter = RateLimiter(0)
+        client.setup_headers()
+
+        self.assertTrue(client.create_task({'task_name': 'Règlement de facture', 'invoice_number': 'F-1'}))
+        self.assertEqual(client.write_buffer.pending_count, 1)
+        deadline = time.monotonic() + 5
+        while client.write_buffer.pending_count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(client.write_buffer.pending_count, 0)
+        self.assertEqual(os.path.getsize(journal), 0)
+        self.assertEqual(self.server.spreadsheet.get_values(f'{self.server.sheet_name}!S2')['values'], [['F-1']])
+
+    def test_archive_tasks(self):
+        """Tâches traitées anciennes déplacées dans les onglets mensuels, grille réduite"""
+        from google_sheets_client import GoogleSheetsClient, ARCHIVE_SPARE_ROWS
+
+        client = GoogleSheetsClient()
+        client.rate_limiter = RateLimiter(0)
+        client.setup_headers()
+        recent = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+        tasks = [
+            ('1', 'Fait', '05/01/2024 10:00:00', 'F-1'),
+            ('2', 'À faire', '06/01/2024 10:00:00', 'F-2'),
+            ('3', 'Fait', '07/01/2024 10:00:00', 'F-3'),
+            ('4', 'Fait', '03/02/2024 10:00:00', 'F-4'),
+            ('5', 'Fait', recent, 'F-5'),
+        ]
+        self.server.spreadsheet.update_values(f"{self.server.sheet_name}!A2",
+                                              [[i, status, date] + [''] * 15 + [number]
+                                               for i, status, date, number in tasks])
+        self.assertIn('F-1', client.load_task_index())
+
+        result = client.archive_tasks(30)
+        self.assertEqual(result, {'archived': 3, 'tabs': {'Archive 2024-01': 2, 'Archive 2024-02': 1}})
+
+        spreadsheet = self.server.spreadsheet
+        live = spreadsheet.get_values(f"{self.server.sheet_name}!A:S")['values']
+        self.assertEqual([row[0] for row in live], ['ID', '2', '5'])
+        self.assertEqual(spreadsheet.sheets[self.server.sheet_name]['properties']['gridProperties']['rowCount'],
+                         3 + ARCHIVE_SPARE_ROWS)
+        january = spreadsheet.get_values('Archive 2024-01!A:S')['values']
+        self.assertEqual([(row[0], row[18]) for row in january[1:]], [('1', 'F-1'), ('3', 'F-3')])
+        self.assertEqual(january[0][0], 'ID')
+
+        # Index relu : F-1 archivée est de nouveau absente de la feuille des tâches
+        self.assertEqual(set(client.load_task_index()), {'F-2', 'F-5'})
+        self.assertEqual(client.archive_tasks(30)['archived'], 0)
+
+    @patch('metrics.time.sleep')
+    def test_injected_5xx_are_retried(self, mock_sleep):
+        """Les erreurs 5xx injectées passent par les retries du client Armado"""
+        from armado_client import ArmadoClient
+
+        self.server.profiles['armado'] = FaultProfile(error_rate_5xx=1.0)
+        client = ArmadoClient()
+        client.rate_limiter = RateLimiter(0)
+
+        with self.assertRaises(Exception):
+            client.find_bill_id_by_reference('F-1')
+        self.assertEqual(self.server.status_counts[('armado', 503)], client.max_retries)
+
+        self.server.profiles['armado'] = FaultProfile()
+        self.assertEqual(client.find_bill_id_by_reference('F-1'), 1)
+
+    def test_quota_returns_429(self):
+        """Le quota par minute renvoie 429 avec Retry-After"""
+        import requests
+
+        self.server.profiles['tempo'] = FaultProfile(quota_per_minute=2)
+        url = f"{os.environ['TEMPO_BASE_URL']}/FACTURE?Dossier=FAKE&ID=1"
+        statuses = [requests.get(url, auth=('fake', 'fake')).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+class TestA1Range(unittest.TestCase):
+    """Tests de la notation A1"""
+
+    def test_parse_ranges(self):
+        self.assertEqual(parse_a1_range("'Mes tâches'!A1:H1"), ('Mes tâches', 0, 0, 0, 7))
+        self.assertEqual(parse_a1_range('Tâches!A:A'), ('Tâches', 0, None, 0, 0))
+        self.assertEqual(parse_a1_range('Tâches!S12'), ('Tâches', 11, 11, 18, 18))
+
+class TestPaymentUpdates(unittest.TestCase):
+    """Facture partiellement payée puis payée : deux exécutions de main.py contre les APIs simulées"""
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        from rate_limiter import reset_rate_limiters
+
+        updated_at = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%dT10:00:00+01:00')
+        self.invoice = {'id': 7, 'invoice_number': '20007', 'label': 'Facture CLIENT - 20007 (label généré)',
+                        'amount': '100.0', 'remaining_amount_with_tax': '40.0', 'status': 'partially_paid',
+                        'updated_at': updated_at}
+        self.server = FakeApiServer([self.invoice]).start()
+        env = dict(self.server.env(), PENNYLANE_RATE_LIMIT='0', SHEETS_RATE_LIMIT='0',
+                   TEMPO_RATE_LIMIT='0', ARMADO_RATE_LIMIT='0')
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp_dir)
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.addCleanup(os.chdir, self.cwd)
+        self.addCleanup(self.server.stop)
+        for patcher in (patch.dict(os.environ, env), patch('time.sleep')):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        reset_rate_limiters()
+        self.addCleanup(reset_rate_limiters)
+
+    def _integration(self):
+        from main import PennylaneSheetsIntegration
+
+        integration = PennylaneSheetsIntegration()
+        integration.sheets_client.setup_headers()
+        return integration
+
+    def _rows(self):
+        return self.server.spreadsheet.get_values(f'{self.server.sheet_name}!A2:S10').get('values', [])
+
+    def _pay_in_full(self):
+        self.invoice.update(remaining_amount_with_tax='0.0', status='paid')
+
+    def _assert_row_updated_and_synced(self):
+        rows = self._rows()
+        self.assertEqual([(row[3], row[18]) for row in rows], [('Règlement de facture', '20007')])
+        self.assertEqual(self.server.tempo_factures['20007']['FactureRegle'], 'OUI')
+        self.assertEqual([bill['reference'] for bill in self.server.armado_bills.values()
+                          if bill['paymentDate']], ['20007'])
+
+    def test_batch_run_updates_row_when_paid(self):
+        """Exécution quotidienne : la ligne partielle est mise à jour et le règlement envoyé"""
+        self.assertTrue(self._integration().process_paid_invoices_today())
+        self.assertEqual([row[3] for row in self._rows()], ['Règlement partiel de facture'])
+        self.assertEqual(self.server.tempo_reglements, [])
+
+        # Exécution suivante (nouveau processus, processed_items.json relu)
+        self._pay_in_full()
+        self.assertTrue(self._integration().process_paid_invoices_today())
+        self._assert_row_updated_and_synced()
+
+        # Même état de paiement : rien n'est renvoyé
+        reglements = len(self.server.tempo_reglements)
+        self.assertTrue(self._integration().process_paid_invoices_today())
+        self.assertEqual(len(self.server.tempo_reglements), reglements)
+
+    def test_poll_and_webhook_follow_new_payments(self):
+        """Polling puis webhook : chaque nouveau paiement passe le filtre des factures déjà traitées"""
+        integration = self._integration()
+        since = datetime.now().astimezone() - timedelta(days=2)
+        self.assertTrue(integration.poll_updates(since))
+        first_id = self._rows()[0][0]
+
+        # Second acompte signalé par webhook : même nom de tâche, nouvel ID
+        self.invoice.update(remaining_amount_with_tax='20.0')
+        self.assertTrue(integration.process_invoice_event('7'))
+        self.assertEqual(len(self._rows()), 1)
+        self.assertNotEqual(self._rows()[0][0], first_id)
+
+        self._pay_in_full()
+        self.assertTrue(integration.poll_updates(since))
+        self._assert_row_updated_and_synced()
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
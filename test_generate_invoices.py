@@ -0,0 +1,60 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from generate_invoices import InvoiceGenerator
+from main import PennylaneSheetsIntegration
+from tempo_integration import TempoIntegration
+
+END = datetime(2024, 6, 1, 12, 0, tzinfo=timezone(timedelta(hours=1)))
+
+class TestInvoiceGenerator(unittest.TestCase):
+    """Tests du générateur de factures synthétiques"""
+
+    def setUp(self):
+        self.generator = InvoiceGenerator(seed=42, end=END)
+        self.invoices = list(self.generator.iter_invoices(2000))
+
+    def test_deterministic_per_index(self):
+        """Une facture ne dépend que de la graine et de son index"""
+        self.assertEqual(self.generator.invoice(1500), self.invoices[1500])
+        self.assertEqual(list(self.generator.iter_invoices(10, start=100)), self.invoices[100:110])
+        self.assertNotEqual(InvoiceGenerator(seed=43, end=END).invoice(0), self.invoices[0])
+
+    def test_labels_parse_back(self):
+        """Les libellés générés sont analysés par les extracteurs existants"""
+        integration = PennylaneSheetsIntegration.__new__(PennylaneSheetsIntegration)
+        tempo = TempoIntegration.__new__(TempoIntegration)
+
+        prefixes = set()
+        for invoice in self.invoices:
+            label = invoice['label']
+            if ' - ' not in label:
+                self.assertEqual(integration.extract_client_name(label), label)
+                continue
+            prefixes.add(label.split(' ')[0] if label.split(' ')[0] in ('Facture', 'Avoir') else '')
+            self.assertEqual(integration.extract_client_name(label), invoice['customer']['name'])
+            self.assertEqual(tempo.extract_invoice_number_from_label(label), 20000 + invoice['id'] - 1)
+        self.assertEqual(prefixes, {'Facture', 'Avoir', ''})
+
+    def test_payment_mix(self):
+        """Avoirs, paiements partiels et factures payées sont présents et cohérents"""
+        by_status = {}
+        for invoice in self.invoices:
+            by_status.setdefault(invoice['status'], []).append(invoice)
+
+        for invoice in by_status['credit_note']:
+            self.assertLess(float(invoice['amount']), 0)
+        for invoice in by_status['partially_paid']:
+            self.assertLess(0, float(invoice['remaining_amount_with_tax']))
+            self.assertLess(float(invoice['remaining_amount_with_tax']), float(invoice['amount']))
+        for invoice in by_status['paid']:
+            self.assertEqual(float(invoice['remaining_amount_with_tax']), 0)
+
+    def test_updated_at_is_skewed_towards_recent_days(self):
+        """La majorité des modifications se concentre sur les derniers jours"""
+        ages = [(END - datetime.fromisoformat(invoice['updated_at'])).days for invoice in self.invoices]
+        self.assertTrue(all(0 <= age <= 365 for age in ages))
+        self.assertGreater(sum(1 for age in ages if age < 7) / len(ages), 0.5)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
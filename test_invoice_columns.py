@@ -0,0 +1,64 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from generate_invoices import InvoiceGenerator
+from invoice_columns import (NUMPY_AVAILABLE, InvoiceColumns, classify_window, daily_summary, select_paid_on,
+                             select_paid_since, select_with_payment_since)
+from invoice_record import normalize_invoices
+
+END = datetime(2024, 6, 1, 12, 0, tzinfo=timezone(timedelta(hours=1)))
+
+class TestInvoiceColumns(unittest.TestCase):
+    """Tests de la classification en colonnes"""
+
+    def setUp(self):
+        invoices = list(InvoiceGenerator(seed=3, end=END, recent_bias=3.0).iter_invoices(3000))
+        invoices.append({'id': 'sans-date', 'status': 'paid', 'amount': '10', 'remaining_amount_with_tax': '0'})
+        invoices.append({'id': 'sans-fuseau', 'status': 'paid', 'amount': '10', 'remaining_amount_with_tax': '0',
+                         'updated_at': '2024-05-31T09:00:00'})
+        self.records = normalize_invoices(invoices)
+
+    def test_row_wise_selection(self):
+        regular, paid, partial = classify_window(self.records, END.date() - timedelta(days=1))
+        self.assertTrue(paid and partial)
+        self.assertTrue(all(inv.payment_status == 'Payée' for inv in paid))
+        self.assertTrue(all(inv.updated_on(END.date() - timedelta(days=1)) for inv in paid + partial))
+        self.assertEqual(len(regular), sum(1 for inv in self.records if not inv.is_credit_note))
+
+        since = END - timedelta(days=2)
+        self.assertEqual(select_paid_since(self.records, since, END),
+                         [inv for inv in self.records if not inv.is_credit_note and inv.updated_since(since)
+                          and not inv.updated_since(END) and inv.paid_amount > 0])
+
+        summary = daily_summary(self.records, END.date() - timedelta(days=2), END.date())
+        self.assertEqual([entry['day'] for entry in summary], [END.date() - timedelta(days=2 - i) for i in range(3)])
+        self.assertEqual((summary[1]['paid'], summary[1]['partially_paid']), (len(paid), len(partial)))
+
+    @unittest.skipUnless(NUMPY_AVAILABLE, 'numpy non installé')
+    def test_vectorized_matches_row_wise(self):
+        """Mêmes factures, dans le même ordre, pour chaque fenêtre"""
+        columns = InvoiceColumns(self.records)
+        for days in range(0, 10, 3):
+            start_day = END.date() - timedelta(days=days)
+            self.assertEqual(classify_window(self.records, start_day, END.date(), columns),
+                             classify_window(self.records, start_day, END.date()))
+            self.assertEqual(select_paid_on(self.records, start_day, columns),
+                             select_paid_on(self.records, start_day))
+
+        since = END - timedelta(days=2, hours=5)
+        for until in (None, END - timedelta(hours=3)):
+            self.assertEqual(select_with_payment_since(self.records, since, until, columns),
+                             select_with_payment_since(self.records, since, until))
+            self.assertEqual(select_paid_since(self.records, since, until, columns),
+                             select_paid_since(self.records, since, until))
+        self.assertEqual(daily_summary(self.records, END.date() - timedelta(days=30), END.date(), columns),
+                         daily_summary(self.records, END.date() - timedelta(days=30), END.date()))
+        self.assertEqual(classify_window([], END.date(), columns=InvoiceColumns([])), ([], [], []))
+
+    @unittest.skipIf(NUMPY_AVAILABLE, 'numpy installé')
+    def test_columns_require_numpy(self):
+        with self.assertRaises(ValueError):
+            InvoiceColumns(self.records)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,71 @@
+import unittest
+from datetime import date, datetime, timedelta, timezone
+
+from invoice_record import InvoiceRecord, as_invoice_record, normalize_invoices
+
+PARIS = timezone(timedelta(hours=1))
+
+def api_invoice(**fields):
+    invoice = {
+        'id': 7,
+        'invoice_number': 'F-7',
+        'label': 'Facture EURO DISNEY ASSOCIES SAS - 20498 (label généré)',
+        'status': 'partially_paid',
+        'date': '2024-05-02',
+        'amount': '100.00',
+        'remaining_amount_with_tax': '40.00',
+        'updated_at': '2024-06-01T23:30:00+01:00',
+        'customer': {'id': 3, 'name': 'EURO DISNEY ASSOCIES SAS'},
+        'payments': [{'amount': '60.00'}],
+    }
+    invoice.update(fields)
+    return invoice
+
+class TestInvoiceRecord(unittest.TestCase):
+    """Tests de la normalisation des factures Pennylane"""
+
+    def test_fields_parsed_once(self):
+        record = InvoiceRecord.from_api(api_invoice())
+        self.assertEqual((record.amount, record.remaining_amount, record.paid_amount), (100.0, 40.0, 60.0))
+        self.assertEqual(record.updated_at, datetime(2024, 6, 1, 23, 30, tzinfo=PARIS))
+        self.assertEqual(record.client_name, 'EURO DISNEY ASSOCIES SAS')
+        self.assertEqual(record.tempo_invoice_number, 20498)
+        self.assertEqual(record.payment_status, 'Partiellement payée')
+        self.assertFalse(hasattr(record, '__dict__'))
+
+    def test_missing_or_invalid_values(self):
+        record = InvoiceRecord.from_api({'id': 1, 'amount': None, 'remaining_amount_with_tax': 'n/a',
+                                         'updated_at': 'hier', 'label': None})
+        self.assertEqual((record.amount, record.remaining_amount), (0.0, 0.0))
+        self.assertIsNone(record.updated_at)
+        self.assertFalse(record.updated_on(date(2024, 6, 1)))
+        self.assertEqual((record.client_name, record.tempo_invoice_number), ('N/A', None))
+
+    def test_payment_status(self):
+        for amount, remaining, expected in (('100', '0', 'Payée'), ('100', '100', None), ('-50', '-50', 'Payée')):
+            record = InvoiceRecord.from_api(api_invoice(amount=amount, remaining_amount_with_tax=remaining))
+            self.assertEqual(record.payment_status, expected, (amount, remaining))
+
+    def test_processed_key_follows_payment_state(self):
+        """Une facture partiellement payée puis payée n'a pas la même clé de traitement"""
+        partial = InvoiceRecord.from_api(api_invoice())
+        paid = InvoiceRecord.from_api(api_invoice(status='paid', remaining_amount_with_tax='0'))
+        self.assertEqual(partial.processed_key, '7:Partiellement payée:60.00')
+        self.assertNotEqual(paid.processed_key, partial.processed_key)
+        self.assertEqual(InvoiceRecord.from_api(api_invoice()).processed_key, partial.processed_key)
+
+    def test_update_window(self):
+        """Jour de modification dans le fuseau de l'API, comparaison avec fuseau pour le polling"""
+        record = InvoiceRecord.from_api(api_invoice(updated_at='2024-06-01T22:30:00Z'))
+        self.assertTrue(record.updated_on(date(2024, 6, 1)))
+        self.assertTrue(record.updated_between(date(2024, 5, 30), date(2024, 6, 1)))
+        self.assertTrue(record.updated_since(datetime(2024, 6, 1, 22, 30, tzinfo=timezone.utc)))
+        self.assertFalse(record.updated_since(datetime(2024, 6, 2, tzinfo=PARIS)))
+
+    def test_normalize_keeps_records(self):
+        record = InvoiceRecord.from_api(api_invoice())
+        self.assertIs(as_invoice_record(record), record)
+        self.assertEqual(normalize_invoices([record, api_invoice()]), [record, record])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
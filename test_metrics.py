@@ -0,0 +1,98 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import metrics
+from metrics import MetricsRegistry, track_api_call, track_stage, export_run_metrics
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Tests du registre de métriques"""
+
+    def test_prometheus_format(self):
+        """Compteurs et histogrammes au format texte Prometheus"""
+        registry = MetricsRegistry()
+        registry.inc('api_requests_total', help_text='Appels', api='tempo', status=200)
+        registry.inc('api_requests_total', api='tempo', status=200)
+        registry.observe('stage_duration_seconds', 0.03, buckets=(0.01, 0.05, 1.0), stage='fetch')
+        registry.observe('stage_duration_seconds', 0.5, buckets=(0.01, 0.05, 1.0), stage='fetch')
+
+        text = registry.to_prometheus()
+        self.assertIn('# HELP pennylane_sync_api_requests_total Appels', text)
+        self.assertIn('# TYPE pennylane_sync_api_requests_total counter', text)
+        self.assertIn('pennylane_sync_api_requests_total{api="tempo",status="200"} 2.0', text)
+        self.assertIn('pennylane_sync_stage_duration_seconds_bucket{stage="fetch",le="0.01"} 0', text)
+        self.assertIn('pennylane_sync_stage_duration_seconds_bucket{stage="fetch",le="0.05"} 1', text)
+        self.assertIn('pennylane_sync_stage_duration_seconds_bucket{stage="fetch",le="+Inf"} 2', text)
+        self.assertIn('pennylane_sync_stage_duration_seconds_count{stage="fetch"} 2', text)
+
+    def test_label_values_are_escaped(self):
+        registry = MetricsRegistry()
+        registry.set('info', 1, source='a"b')
+        self.assertIn('pennylane_sync_info{source="a\\"b"} 1', registry.to_prometheus())
+
+class TestTracking(unittest.TestCase):
+    """Tests des mesures d'appels API et d'étapes"""
+
+    def setUp(self):
+        metrics.registry.reset()
+
+    def test_api_call_status(self):
+        """Statut renseigné par l'appelant, 'error' sur exception"""
+        with track_api_call('tempo', 'get_facture') as call:
+            call.status = 200
+        with self.assertRaises(ValueError):
+            with track_api_call('tempo', 'get_facture'):
+                raise ValueError('boom')
+        with self.assertRaises(ValueError):
+            with track_api_call('sheets', 'values.get') as call:
+                call.status = 429
+                raise ValueError('quota')
+
+        self.assertEqual(metrics.registry.get('api_requests_total', api='tempo', operation='get_facture', status=200), 1)
+        self.assertEqual(metrics.registry.get('api_requests_total', api='tempo', operation='get_facture', status='error'), 1)
+        self.assertEqual(metrics.registry.get('api_requests_total', api='sheets', operation='values.get', status=429), 1)
+
+    @patch('metrics.time.sleep')
+    def test_stage_and_throttle(self, mock_sleep):
+        with track_stage('fetch_invoices'):
+            metrics.throttle_sleep(2, 'invoice_delay')
+        mock_sleep.assert_called_once_with(2)
+        self.assertEqual(metrics.registry.get('throttle_seconds_total', source='invoice_delay'), 2)
+        self.assertEqual(metrics.registry.to_dict()['stage_duration_seconds']['samples'][0]['count'], 1)
+
+class TestExport(unittest.TestCase):
+    """Tests de l'export de fin d'exécution"""
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_export_textfile_and_report(self):
+        textfile = os.path.join(self.tmpdir, 'sync.prom')
+        report = os.path.join(self.tmpdir, 'report.json')
+        metrics.count_invoice('success')
+
+        with patch.dict(os.environ, {'METRICS_TEXTFILE': textfile, 'METRICS_REPORT': report}):
+            export_run_metrics('sheets')
+
+        with open(textfile) as f:
+            self.assertIn('pennylane_sync_invoices_total{job="sheets",result="success"} 1.0', f.read())
+        with open(report) as f:
+            data = json.load(f)
+        self.assertIn('run_duration_seconds', data['metrics'])
+        # Pas de fichier temporaire laissé par l'écriture atomique
+        self.assertEqual(sorted(os.listdir(self.tmpdir)), ['report.json', 'sync.prom'])
+
+    def test_export_disabled_without_env(self):
+        with patch.dict(os.environ, {}, clear=True):
+            export_run_metrics('tempo')
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,58 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from polling_daemon import PollingDaemon
+
+class TestPollingDaemon(unittest.TestCase):
+    """Tests unitaires pour le polling incrémental"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.tmp_dir, 'poll_state.json')
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _daemon(self, result):
+        def poll(since, stop_event):
+            self.calls.append(since)
+            stop_event.set()
+            return result
+        return PollingDaemon(poll, self.state_file, interval_minutes=1, initial_lookback_hours=2)
+
+    def test_first_poll_uses_initial_lookback(self):
+        """Sans état, le premier poll remonte de initial_lookback"""
+        before = datetime.now(timezone.utc)
+        daemon = self._daemon(True)
+        daemon.run()
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertAlmostEqual((before - self.calls[0]).total_seconds(), 7200, delta=5)
+        self.assertGreaterEqual(daemon.load_last_poll(), before)
+
+    def test_poll_resumes_from_saved_state(self):
+        """Le poll reprend depuis la date du dernier poll réussi"""
+        last_poll = datetime(2024, 1, 15, 10, 0, tzinfo=timezone.utc)
+        with open(self.state_file, 'w') as f:
+            json.dump({'last_successful_poll': last_poll.isoformat()}, f)
+
+        self._daemon(True).run()
+        self.assertEqual(self.calls, [last_poll])
+
+    def test_failed_poll_does_not_advance_state(self):
+        """Un poll incomplet ne fait pas avancer la date"""
+        last_poll = datetime.now(timezone.utc) - timedelta(hours=1)
+        with open(self.state_file, 'w') as f:
+            json.dump({'last_successful_poll': last_poll.isoformat()}, f)
+
+        daemon = self._daemon(False)
+        daemon.run()
+        self.assertEqual(daemon.load_last_poll(), last_poll)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,66 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from profiling import profile_call, profile_mode_from_env
+
+def busy_then_sleep():
+    deadline = time.process_time() + 0.1
+    while time.process_time() < deadline:
+        pass
+    time.sleep(0.1)
+    return 'ok'
+
+class TestProfiling(unittest.TestCase):
+    """Tests du profilage des exécutions"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.prefix = os.path.join(self.tmpdir, 'profiles', 'run')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_writes_profiles_and_cpu_breakdown(self):
+        """Fichiers .prof / collapsed et ventilation CPU / attentes"""
+        result = profile_call(busy_then_sleep, 'test', 'all', output=self.prefix, interval=0.002)
+        self.assertEqual(result, 'ok')
+
+        for suffix in ('.prof', '.collapsed', '.cpu.collapsed', '.summary.json'):
+            self.assertTrue(os.path.exists(self.prefix + suffix), suffix)
+
+        with open(self.prefix + '.summary.json') as f:
+            summary = json.load(f)
+        self.assertGreaterEqual(summary['wall_s'], 0.2)
+        self.assertGreaterEqual(summary['cpu_s'], 0.09)
+        self.assertGreaterEqual(summary['blocked_s'], 0.08)
+
+        with open(self.prefix + '.collapsed') as f:
+            stacks = f.read()
+        self.assertIn('MainThread;', stacks)
+        self.assertIn('test_profiling:busy_then_sleep', stacks)
+
+    def test_profile_written_on_exit(self):
+        """Le profil est écrit même si le traitement appelle sys.exit"""
+        def run_once():
+            raise SystemExit(75)
+
+        with self.assertRaises(SystemExit):
+            profile_call(run_once, 'test', 'cprofile', output=self.prefix)
+        self.assertTrue(os.path.exists(self.prefix + '.prof'))
+        self.assertFalse(os.path.exists(self.prefix + '.collapsed'))
+
+    def test_mode_from_env(self):
+        for value, expected in (('', None), ('false', None), ('true', 'all'), ('sample', 'sample')):
+            with patch.dict(os.environ, {'PROFILE_RUN': value}):
+                self.assertEqual(profile_mode_from_env(), expected)
+        with patch.dict(os.environ, {'PROFILE_RUN': 'perf'}):
+            with self.assertRaises(ValueError):
+                profile_mode_from_env()
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
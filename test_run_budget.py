@@ -0,0 +1,114 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+
+from run_budget import RunBudget, EXIT_PARTIAL
+
+class TestRunBudget(unittest.TestCase):
+    """Tests unitaires pour le budget de temps"""
+
+    @patch('run_budget.time.monotonic')
+    def test_stops_when_next_item_would_exceed_budget(self, mock_monotonic):
+        """Plus de nouvelle facture quand le coût prévu dépasse le temps restant"""
+        mock_monotonic.return_value = 0
+        budget = RunBudget(100, reserve_seconds=10, initial_item_estimate=1, safety_factor=1)
+        self.assertTrue(budget.can_start_item())
+
+        budget.record_item(20)
+        mock_monotonic.return_value = 60
+        # Restant 40s - réserve 10s = 30s >= 20s prévues
+        self.assertTrue(budget.can_start_item())
+
+        mock_monotonic.return_value = 75
+        # Restant 25s - réserve 10s = 15s < 20s prévues
+        self.assertFalse(budget.can_start_item())
+        self.assertTrue(budget.exhausted)
+
+    def test_estimate_follows_measured_latency(self):
+        """L'estimation suit la latence mesurée"""
+        budget = RunBudget(100, smoothing=0.5)
+        budget.record_item(4)
+        budget.record_item(8)
+        self.assertEqual(budget.item_estimate, 6)
+
+class TestPartialRun(unittest.TestCase):
+    """Tests de l'exécution partielle de l'intégration"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp_dir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp_dir)
+
+    def _integration(self, invoices, time_budget):
+        from main import PennylaneSheetsIntegration
+
+        with patch('main.PennylaneClient'), patch('main.GoogleSheetsClient'), patch('main.TempoClient'):
+            integration = PennylaneSheetsIntegration(test_mode=True, time_budget=time_budget)
+            # Les clients sont créés au premier accès
+            integration.pennylane_client.get_all_invoices.return_value = invoices
+            integration.sheets_client.create_task.return_value = True
+        return integration
+
+    def _invoices(self, count):
+        updated_at = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%dT10:00:00+01:00')
+        return [
+            {
+                'id': i,
+                'invoice_number': f'F-{i}',
+                'label': f'Facture CLIENT {i} - {20000 + i} (label généré)',
+                'amount': '100.0',
+                'remaining_amount_with_tax': '0.0',
+                'status': 'paid',
+                'updated_at': updated_at
+            }
+            for i in range(count)
+        ]
+
+    @patch('main.time.sleep')
+    def test_exhausted_budget_saves_state_and_resume_date(self, mock_sleep):
+        """Un budget épuisé sauvegarde l'état et la date de reprise"""
+        integration = self._integration(self._invoices(5), time_budget=60)
+        integration.budget.reserve_seconds = 0
+        integration.budget.item_estimate = 0
+
+        calls = []
+
+        def create_task(task_data):
+            calls.append(task_data)
+            if len(calls) == 2:
+                integration.budget.budget_seconds = 0
+            return True
+
+        integration.sheets_client.create_task.side_effect = create_task
+
+        self.assertFalse(integration.process_paid_invoices_today())
+        self.assertEqual(len(calls), 2)
+
+        with open('processed_items.json') as f:
+            self.assertEqual(sorted(json.load(f)), ['0:Payée:100.00', '1:Payée:100.00'])
+        self.assertEqual(integration.load_resume_date(), (datetime.now() - timedelta(days=1)).date())
+
+        with self.assertRaises(SystemExit) as context:
+            integration.run_once()
+        self.assertEqual(context.exception.code, EXIT_PARTIAL)
+
+    @patch('main.time.sleep')
+    def test_complete_run_clears_resume_state(self, mock_sleep):
+        """Une exécution complète supprime l'état de reprise"""
+        integration = self._integration(self._invoices(2), time_budget=None)
+        integration.save_resume_date((datetime.now() - timedelta(days=3)).date())
+
+        self.assertTrue(integration.process_paid_invoices_today())
+        self.assertEqual(integration.sheets_client.create_task.call_count, 2)
+        self.assertFalse(os.path.exists('resume_state.json'))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
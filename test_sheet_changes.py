@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fake_apis import FakeApiServer
+from rate_limiter import RateLimiter
+from sheet_changes import TaskStatusReader
+
+class TestTaskStatusReader(unittest.TestCase):
+    """Tests de la lecture incrémentale des statuts"""
+
+    def setUp(self):
+        self.server = FakeApiServer([]).start()
+        self.env = patch.dict(os.environ, self.server.env())
+        self.env.start()
+        self.tmpdir = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.tmpdir, 'state.json')
+
+        from google_sheets_client import GoogleSheetsClient
+        self.client = GoogleSheetsClient()
+        self.client.rate_limiter = RateLimiter(0)
+        self.client.setup_headers()
+        self.client.upsert_tasks([{'task_name': 'Règlement de facture', 'invoice_number': f'F-{i}'}
+                                  for i in range(1, 4)])
+
+    def tearDown(self):
+        self.env.stop()
+        self.server.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def set_status(self, row: int, status: str):
+        self.server.spreadsheet.update_values(f"{self.server.sheet_name}!B{row}", [[status]])
+
+    def test_only_changed_rows_returned(self):
+        reader = TaskStatusReader(self.client, self.state_file)
+        self.assertEqual(reader.poll(), [])
+
+        self.set_status(3, 'Fait')
+        gets = self.server.request_counts[('sheets', 'GET')]
+        changes = reader.poll()
+        self.assertEqual(self.server.request_counts[('sheets', 'GET')], gets + 1)
+        self.assertEqual([(c['invoice_number'], c['row'], c['previous_status'], c['status']) for c in changes],
+                         [('F-2', 3, 'À faire', 'Fait')])
+        self.assertEqual(reader.poll(), [])
+
+        # Reprise depuis le fichier d'état
+        self.set_status(2, 'En cours')
+        self.assertEqual([c['invoice_number'] for c in TaskStatusReader(self.client, self.state_file).poll()],
+                         ['F-1'])
+
+    def test_failed_callback_keeps_changes(self):
+        reader = TaskStatusReader(self.client, self.state_file)
+        self.set_status(2, 'Fait')
+
+        def fail(changes):
+            raise RuntimeError('tableau de bord indisponible')
+
+        with self.assertRaises(RuntimeError):
+            reader.poll(fail)
+        received = []
+        reader.poll(received.extend)
+        self.assertEqual([c['invoice_number'] for c in received], ['F-1'])
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
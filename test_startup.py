@@ -0,0 +1,52 @@
+import os
+import sys
+import tempfile
+import subprocess
+import unittest
+from unittest.mock import patch
+
+import tempo_email_client
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class TestLazyStartup(unittest.TestCase):
+    """Tests du démarrage paresseux des clients"""
+
+    def run_python(self, code: str) -> str:
+        env = {key: value for key, value in os.environ.items()
+               if not key.startswith(('PENNYLANE_', 'SPREADSHEET_', 'TEMPO_', 'OFFICE365_'))}
+        env['PYTHONPATH'] = PACKAGE_DIR
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            result = subprocess.run([sys.executable, '-c', code], cwd=tmp_dir, env=env,
+                                    capture_output=True, text=True, timeout=60)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return result.stdout
+
+    def test_integration_starts_without_clients(self):
+        """Construire l'intégration ne crée aucun client ni n'importe googleapiclient.discovery"""
+        output = self.run_python(
+            "import sys\n"
+            "from main import PennylaneSheetsIntegration\n"
+            "from tempo_integration import TempoIntegration\n"
+            "integration = PennylaneSheetsIntegration(test_mode=True)\n"
+            "TempoIntegration()\n"
+            "print('googleapiclient.discovery' in sys.modules, 'sheets_client' in vars(integration))\n"
+            "try:\n"
+            "    integration.pennylane_client\n"
+            "except ValueError as e:\n"
+            "    print('ValueError')\n"
+        )
+        self.assertEqual(output.split(), ['False', 'False', 'ValueError'])
+
+    def test_email_client_shared(self):
+        """Un seul client email pour TempoClient et TempoIntegration"""
+        env = {'OFFICE365_USER': 'user@example.com', 'OFFICE365_PASSWORD': 'secret'}
+        with patch.dict(os.environ, env), \
+                patch.object(tempo_email_client, '_shared_client_ready', False), \
+                patch.object(tempo_email_client, '_shared_client', None):
+            first = tempo_email_client.get_email_client()
+            self.assertIsNotNone(first)
+            self.assertIs(tempo_email_client.get_email_client(), first)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,141 @@
+import os
+import csv
+import shutil
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from task_sinks import (PYARROW_AVAILABLE, CsvTaskSink, FanOutTaskSink, ParquetTaskSink, SqliteTaskSink, TaskSink,
+                        build_task_sink, parse_task_sink_spec)
+
+PARTIAL = {'invoice_id': 1, 'invoice_number': 'F-1', 'task_name': 'Règlement partiel de facture',
+           'payment_status': 'Partiellement payée', 'payment_amount': '50.00€', 'client_name': 'CLIENT'}
+PAID = dict(PARTIAL, task_name='Règlement de facture', payment_status='Payée', payment_amount='100.00€')
+
+class TestLocalSinks(unittest.TestCase):
+    """Tests des destinations locales des tâches"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_sqlite_upsert(self):
+        """Tâche identique ignorée, nouvel état de paiement mis à jour, sans doublon"""
+        path = os.path.join(self.tmpdir, 'tasks.db')
+        sink = SqliteTaskSink(path)
+        self.assertEqual(sink.upsert_tasks([PARTIAL, dict(PARTIAL, invoice_id=2, invoice_number='F-2')]),
+                         {'created': ['F-1', 'F-2'], 'updated': [], 'skipped': []})
+
+        reopened = SqliteTaskSink(path)
+        self.assertEqual(reopened.upsert_tasks([PARTIAL, PAID]), {'created': [], 'updated': ['F-1'], 'skipped': []})
+        self.assertEqual(reopened.upsert_tasks([PAID])['skipped'], ['F-1'])
+        self.assertEqual([task['payment_status'] for task in reopened.load_tasks()], ['Partiellement payée', 'Payée'])
+
+    def test_csv_written_on_flush(self):
+        path = os.path.join(self.tmpdir, 'tasks.csv')
+        sink = CsvTaskSink(path)
+        self.assertTrue(sink.create_task(PARTIAL))
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(sink.flush())
+
+        reloaded = CsvTaskSink(path)
+        self.assertEqual(reloaded.upsert_tasks([PARTIAL])['skipped'], ['F-1'])
+        reloaded.upsert_tasks([PAID])
+        reloaded.flush()
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([(row['invoice_number'], row['task_name']) for row in rows],
+                         [('F-1', 'Règlement de facture')])
+
+    def test_incomplete_sink_rejected_at_creation(self):
+        class NoStore(TaskSink):
+            def _existing_id(self, key):
+                return None
+
+        with self.assertRaises(TypeError):
+            NoStore()
+
+    @unittest.skipUnless(PYARROW_AVAILABLE, 'pyarrow non installé')
+    def test_parquet_roundtrip(self):
+        path = os.path.join(self.tmpdir, 'tasks.parquet')
+        sink = ParquetTaskSink(path)
+        sink.create_task(PARTIAL)
+        sink.flush()
+        self.assertEqual(ParquetTaskSink(path).upsert_tasks([PARTIAL])['skipped'], ['F-1'])
+
+    @unittest.skipIf(PYARROW_AVAILABLE, 'pyarrow installé')
+    def test_parquet_requires_pyarrow(self):
+        with self.assertRaises(ValueError):
+            ParquetTaskSink(os.path.join(self.tmpdir, 'tasks.parquet'))
+
+class TestFanOut(unittest.TestCase):
+    """Tests de l'alimentation de plusieurs destinations"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_mirror_receives_final_state_once(self):
+        """Google Sheets en miroir : un seul lot avec le dernier état de chaque facture"""
+        sheets = Mock()
+        sheets.upsert_tasks.return_value = {'created': ['F-1', 'F-2'], 'updated': [], 'skipped': []}
+        sink = build_task_sink(f"sqlite:{os.path.join(self.tmpdir, 'tasks.db')},sheets", lambda: sheets)
+        self.assertIsInstance(sink, FanOutTaskSink)
+
+        for task in (PARTIAL, dict(PARTIAL, invoice_id=2, invoice_number='F-2'), PAID):
+            self.assertTrue(sink.create_task(task))
+        sheets.upsert_tasks.assert_not_called()
+
+        self.assertTrue(sink.flush())
+        sheets.upsert_tasks.assert_called_once()
+        mirrored = sheets.upsert_tasks.call_args[0][0]
+        self.assertEqual([(task['invoice_number'], task['payment_status']) for task in mirrored],
+                         [('F-1', 'Payée'), ('F-2', 'Partiellement payée')])
+
+        # Rien de nouveau : pas de second envoi
+        sink.flush()
+        sheets.upsert_tasks.assert_called_once()
+
+    def test_failed_mirror_kept_for_next_flush(self):
+        sheets = Mock()
+        sheets.upsert_tasks.side_effect = [RuntimeError('quota'),
+                                           {'created': ['F-1'], 'updated': [], 'skipped': []}]
+        sink = FanOutTaskSink([CsvTaskSink(os.path.join(self.tmpdir, 'tasks.csv'))], [sheets])
+        sink.create_task(PARTIAL)
+        self.assertFalse(sink.flush())
+        self.assertTrue(sink.flush())
+        self.assertEqual(sheets.upsert_tasks.call_count, 2)
+
+    def test_pending_mirror_survives_crash(self):
+        """Arrêt brutal avant le flush : la recopie reprend depuis la base SQLite"""
+        path = os.path.join(self.tmpdir, 'tasks.db')
+        sheets = Mock()
+        sheets.upsert_tasks.return_value = {'created': ['F-1', 'F-2'], 'updated': [], 'skipped': []}
+        crashed = FanOutTaskSink([SqliteTaskSink(path)], [sheets])
+        crashed.create_task(PARTIAL)
+        crashed.create_task(dict(PARTIAL, invoice_id=2, invoice_number='F-2'))
+
+        restarted = FanOutTaskSink([SqliteTaskSink(path)], [sheets])
+        restarted.create_task(PAID)
+        self.assertTrue(restarted.flush())
+        mirrored = sheets.upsert_tasks.call_args[0][0]
+        self.assertEqual([(task['invoice_number'], task['payment_status']) for task in mirrored],
+                         [('F-1', 'Payée'), ('F-2', 'Partiellement payée')])
+
+        # Tout est recopié : rien à reprendre à l'exécution suivante
+        self.assertEqual(SqliteTaskSink(path).pending_mirror(), {})
+        FanOutTaskSink([SqliteTaskSink(path)], [sheets]).flush()
+        sheets.upsert_tasks.assert_called_once()
+
+    def test_sheets_only_spec_returns_client(self):
+        sheets = Mock()
+        self.assertIs(build_task_sink('sheets', lambda: sheets), sheets)
+        with self.assertRaises(ValueError):
+            parse_task_sink_spec('mysql:tasks')
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import tracing
+from metrics import track_api_call, track_stage, record_throttle
+from tracing import JsonlSpanExporter, OtlpSpanExporter, Span, load_spans, summarize_slowest, trace_span
+
+class TestTracing(unittest.TestCase):
+    """Tests des spans et de l'export JSON Lines"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'traces.jsonl')
+        self.exporter = JsonlSpanExporter(self.path)
+        tracing.set_exporters([self.exporter])
+
+    def tearDown(self):
+        tracing.set_exporters(None)
+        self.exporter._file.close()
+        shutil.rmtree(self.tmpdir)
+
+    def read_spans(self):
+        self.exporter.flush()
+        return {span['name']: span for span in load_spans(self.path)}
+
+    def test_child_spans_attached_to_invoice(self):
+        """Appels API et attentes rattachés au span racine de la facture"""
+        with track_stage('process_invoice', invoice_id=42):
+            with track_api_call('tempo', 'post_reglement') as call:
+                call.status = 200
+            record_throttle(0.5, 'rate_limiter:tempo')
+            with self.assertRaises(RuntimeError):
+                with track_api_call('armado', 'get', attempt=1):
+                    raise RuntimeError('timeout')
+
+        spans = self.read_spans()
+        root = spans['process_invoice']
+        self.assertIsNone(root['parent_id'])
+        self.assertEqual(root['attributes'], {'invoice_id': 42})
+        for name in ('tempo.post_reglement', 'throttle', 'armado.get'):
+            self.assertEqual(spans[name]['parent_id'], root['span_id'])
+            self.assertEqual(spans[name]['trace_id'], root['trace_id'])
+
+        self.assertEqual(spans['tempo.post_reglement']['attributes']['status'], 200)
+        self.assertAlmostEqual(spans['throttle']['duration_ms'], 500, delta=50)
+        self.assertEqual(spans['armado.get']['status'], 'error')
+        self.assertEqual(spans['armado.get']['attributes']['attempt'], 1)
+
+    @patch('metrics.time.sleep')
+    def test_armado_retries_and_backoff(self, mock_sleep):
+        """Chaque tentative Armado et chaque backoff produisent un span"""
+        from fake_apis import FakeApiServer, FaultProfile
+        from armado_client import ArmadoClient
+        from rate_limiter import RateLimiter
+
+        with FakeApiServer([], {'armado': FaultProfile(error_rate_5xx=1.0)}) as server, \
+                patch.dict(os.environ, server.env()):
+            client = ArmadoClient()
+            client.rate_limiter = RateLimiter(0)
+            with trace_span('invoice'):
+                with self.assertRaises(Exception):
+                    client.find_bill_id_by_reference('F-1')
+
+        self.exporter.flush()
+        spans = load_spans(self.path)
+        attempts = [span for span in spans if span['name'] == 'armado.get']
+        backoffs = [span for span in spans if span['name'] == 'throttle']
+        self.assertEqual([span['attributes']['attempt'] for span in attempts], list(range(1, client.max_retries + 1)))
+        self.assertTrue(all(span['status'] == 'error' for span in attempts))
+        self.assertEqual(len(backoffs), client.max_retries - 1)
+
+    def test_summarize_slowest(self):
+        with trace_span('slow'):
+            record_throttle(0.2, 'invoice_delay')
+        with trace_span('fast'):
+            pass
+
+        self.exporter.flush()
+        summary = summarize_slowest(load_spans(self.path), count=1)
+        self.assertEqual(summary[0]['span']['name'], 'slow')
+        self.assertIn('throttle', summary[0]['breakdown'])
+
+class TestDisabledTracing(unittest.TestCase):
+
+    def test_noop_without_exporter(self):
+        tracing.set_exporters([])
+        try:
+            with trace_span('process_invoice') as span:
+                span.set_attribute('result', 'success')
+            self.assertIs(span, tracing.NOOP_SPAN)
+        finally:
+            tracing.set_exporters(None)
+
+class TestOtlpExporter(unittest.TestCase):
+
+    def test_otlp_payload(self):
+        exporter = OtlpSpanExporter('http://localhost:4318/', service_name='test')
+        parent = Span('process_invoice', attributes={'invoice_id': 7})
+        child = Span('tempo.get_facture', parent, {'api': 'tempo', 'status': 404})
+        child.end_ns = parent.end_ns = child.start_ns + 1000
+
+        payload = exporter.to_otlp([parent, child])
+        spans = payload['resourceSpans'][0]['scopeSpans'][0]['spans']
+        self.assertEqual(exporter.url, 'http://localhost:4318/v1/traces')
+        self.assertEqual(spans[1]['parentSpanId'], spans[0]['spanId'])
+        self.assertEqual(spans[1]['kind'], 3)
+        self.assertIn({'key': 'status', 'value': {'intValue': '404'}}, spans[1]['attributes'])
+
+    @patch('tracing.requests.post', side_effect=ConnectionError('refused'))
+    def test_unreachable_collector_does_not_raise(self, mock_post):
+        exporter = OtlpSpanExporter('http://localhost:4318')
+        span = Span('invoice')
+        span.end_ns = span.start_ns
+        exporter.export(span)
+        exporter.flush()
+        exporter.flush()
+        mock_post.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
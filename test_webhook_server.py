@@ -0,0 +1,139 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import requests
+
+from invoice_queue import DurableInvoiceQueue
+from webhook_server import (
+    PennylaneWebhookServer, WEBHOOK_PATH, SIGNATURE_HEADER,
+    compute_signature, extract_invoice_ids
+)
+
+class TestDurableInvoiceQueue(unittest.TestCase):
+    """Tests unitaires pour la file persistante"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'queue.db')
+        self.queue = DurableInvoiceQueue(self.db_path, max_attempts=2, retry_delay=0)
+
+    def tearDown(self):
+        self.queue.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_put_deduplicates_pending_invoices(self):
+        """Une facture déjà en attente n'est pas ajoutée deux fois"""
+        self.assertTrue(self.queue.put(123, 'customer_invoice.updated'))
+        self.assertFalse(self.queue.put('123'))
+        self.assertEqual(self.queue.pending_count(), 1)
+
+    def test_get_and_ack(self):
+        """Un élément réservé puis acquitté sort de la file"""
+        self.queue.put(1)
+        entry = self.queue.get(timeout=0)
+        self.assertEqual(entry['invoice_id'], '1')
+        self.assertIsNone(self.queue.get(timeout=0))
+
+        self.queue.ack(entry['id'])
+        self.assertEqual(self.queue.pending_count(), 0)
+
+    def test_nack_retries_then_gives_up(self):
+        """Un échec est réessayé jusqu'au nombre maximal de tentatives"""
+        self.queue.put(1)
+        self.assertTrue(self.queue.nack(self.queue.get(timeout=0)['id'], 'erreur'))
+        entry = self.queue.get(timeout=1)
+        self.assertEqual(entry['attempts'], 1)
+        self.assertFalse(self.queue.nack(entry['id'], 'erreur'))
+        self.assertEqual(self.queue.pending_count(), 0)
+
+    def test_processing_entries_survive_restart(self):
+        """Un élément en cours lors d'un arrêt est repris au redémarrage"""
+        self.queue.put(1)
+        self.queue.get(timeout=0)
+        self.queue.close()
+
+        self.queue = DurableInvoiceQueue(self.db_path)
+        self.assertEqual(self.queue.get(timeout=0)['invoice_id'], '1')
+
+class TestWebhookServer(unittest.TestCase):
+    """Tests du serveur de webhooks"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.queue = DurableInvoiceQueue(os.path.join(self.tmp_dir, 'queue.db'))
+        self.processed = []
+        self.done = threading.Event()
+
+    def tearDown(self):
+        self.queue.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def _process(self, invoice_id):
+        self.processed.append(invoice_id)
+        self.done.set()
+        return True
+
+    def test_extract_invoice_ids(self):
+        """Les différents formats d'événements sont reconnus"""
+        self.assertEqual(extract_invoice_ids({'data': {'id': 1}}), ['1'])
+        self.assertEqual(extract_invoice_ids({'data': {'customer_invoice': {'id': 2}}}), ['2'])
+        self.assertEqual(extract_invoice_ids([{'invoice_id': 3}, {'customer_invoice': {'id': 4}}]), ['3', '4'])
+        self.assertEqual(extract_invoice_ids({'event': 'ping'}), [])
+
+    def test_event_is_queued_and_processed(self):
+        """Un webhook reçu est traité par le worker"""
+        server = PennylaneWebhookServer(self._process, queue=self.queue, host='127.0.0.1', port=0)
+        server.start()
+        try:
+            url = f"http://127.0.0.1:{server.port}{WEBHOOK_PATH}"
+            response = requests.post(url, json={'event': 'customer_invoice.updated', 'data': {'id': 42}})
+            self.assertEqual(response.status_code, 202)
+            self.assertTrue(self.done.wait(5))
+            self.assertEqual(self.processed, ['42'])
+        finally:
+            server.stop()
+
+    def test_pending_tasks_flushed_when_queue_empty_and_on_stop(self):
+        """Tâches en attente écrites après une rafale d'événements, puis à l'arrêt"""
+        flushes = []
+        server = PennylaneWebhookServer(self._process, queue=self.queue, host='127.0.0.1', port=0,
+                                        flush=lambda: flushes.append(list(self.processed)))
+        server.start()
+        try:
+            url = f"http://127.0.0.1:{server.port}{WEBHOOK_PATH}"
+            requests.post(url, json=[{'invoice_id': 1}, {'invoice_id': 2}])
+            deadline = time.monotonic() + 5
+            while flushes[-1:] != [['1', '2']] and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(flushes[-1], ['1', '2'])
+            flush_count = len(flushes)
+        finally:
+            server.stop()
+        self.assertEqual(len(flushes), flush_count + 1)
+
+    def test_invalid_signature_is_rejected(self):
+        """Avec un secret configuré, une signature invalide est refusée"""
+        with patch.dict('os.environ', {'PENNYLANE_WEBHOOK_SECRET': 'secret'}):
+            server = PennylaneWebhookServer(self._process, queue=self.queue, host='127.0.0.1', port=0)
+        server.start()
+        try:
+            url = f"http://127.0.0.1:{server.port}{WEBHOOK_PATH}"
+            body = json.dumps({'invoice_id': 7}).encode()
+
+            response = requests.post(url, data=body, headers={SIGNATURE_HEADER: 'sha256=bad'})
+            self.assertEqual(response.status_code, 401)
+
+            signature = compute_signature('secret', body)
+            response = requests.post(url, data=body, headers={SIGNATURE_HEADER: signature})
+            self.assertEqual(response.status_code, 202)
+        finally:
+            server.stop()
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Traces d'exécution : un span racine par facture, des spans enfants par appel API
+
+Chaque facture ouvre un span racine ; les appels Pennylane, Sheets, Tempo,
+Armado et SMTP (une tentative = un span), les attentes des limiteurs de
+débit et les backoffs des retries y sont rattachés comme enfants.
+
+Export (désactivé par défaut, aucun coût hors configuration) :
+- TRACE_FILE : fichier JSON Lines, un span par ligne
+- OTEL_EXPORTER_OTLP_ENDPOINT : collecteur OpenTelemetry local (OTLP/HTTP JSON,
+  ex: http://localhost:4318), nom du service dans OTEL_SERVICE_NAME
+
+Analyse rapide d'un fichier de traces :
+
+    python tracing.py traces.jsonl --slowest 10
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import random
+import argparse
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+import requests
+
+# Taille des lots envoyés au collecteur OTLP
+OTLP_BATCH_SIZE = 256
+
+_random = random.SystemRandom()
+
+class Span:
+    """Span en cours ou terminé"""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'start_ns', 'end_ns', 'attributes', 'status', 'error')
+
+    def __init__(self, name: str, parent: Optional['Span'] = None, attributes: Optional[Dict] = None,
+                 start_ns: Optional[int] = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else f"{_random.getrandbits(128):032x}"
+        self.span_id = f"{_random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns = None
+        self.attributes = {key: value for key, value in (attributes or {}).items() if value is not None}
+        self.status = 'ok'
+        self.error = None
+
+    def set_attribute(self, key: str, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_error(self, message: str):
+        self.status = 'error'
+        self.error = message
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start_ns / 1e9,
+            'duration_ms': round(self.duration_ms, 3),
+            'status': self.status,
+            'error': self.error,
+            'attributes': self.attributes,
+        }
+
+class _NoopSpan:
+    """Span utilisé quand les traces sont désactivées"""
+
+    def set_attribute(self, key: str, value):
+        pass
+
+    def set_error(self, message: str):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class JsonlSpanExporter:
+    """Écrit les spans terminés dans un fichier JSON Lines"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+class OtlpSpanExporter:
+    """Envoie les spans par lots à un collecteur OpenTelemetry (OTLP/HTTP, encodage JSON)"""
+
+    def __init__(self, endpoint: str, service_name: str = 'pennylane-sync', timeout: float = 5.0):
+        self.url = endpoint.rstrip('/') + '/v1/traces'
+        self.service_name = service_name
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pending: List[Span] = []
+        self._warned = False
+
+    def export(self, span: Span):
+        with self._lock:
+            self._pending.append(span)
+            ready = len(self._pending) >= OTLP_BATCH_SIZE
+        if ready:
+            self.flush()
+
+    def to_otlp(self, spans: List[Span]) -> Dict:
+        """Corps de la requête OTLP pour une liste de spans"""
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': self.service_name}}]},
+                'scopeSpans': [{
+                    'scope': {'name': 'pennylane_sync'},
+                    'spans': [{
+                        'traceId': span.trace_id,
+                        'spanId': span.span_id,
+                        'parentSpanId': span.parent_id or '',
+                        'name': span.name,
+                        'kind': 3 if 'api' in span.attributes else 1,  # CLIENT / INTERNAL
+                        'startTimeUnixNano': str(span.start_ns),
+                        'endTimeUnixNano': str(span.end_ns),
+                        'attributes': [{'key': key, 'value': _otlp_value(value)}
+                                       for key, value in span.attributes.items()],
+                        'status': {'code': 2, 'message': span.error or ''} if span.status == 'error' else {'code': 1},
+                    } for span in spans],
+                }],
+            }]
+        }
+
+    def flush(self):
+        with self._lock:
+            spans, self._pending = self._pending, []
+        if not spans:
+            return
+        try:
+            response = requests.post(self.url, json=self.to_otlp(spans), timeout=self.timeout)
+            response.raise_for_status()
+        except Exception as e:
+            # Le collecteur est optionnel : on prévient une seule fois sans interrompre le traitement
+            if not self._warned:
+                print(f"⚠ Envoi des traces vers {self.url} impossible: {e}")
+                self._warned = True
+
+_current_span: ContextVar[Optional[Span]] = ContextVar('current_span', default=None)
+_exporters: Optional[List] = None
+_config_lock = threading.Lock()
+
+def _configured_exporters() -> List:
+    global _exporters
+    if _exporters is None:
+        with _config_lock:
+            if _exporters is None:
+                exporters = []
+                if os.getenv('TRACE_FILE'):
+                    exporters.append(JsonlSpanExporter(os.getenv('TRACE_FILE')))
+                if os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT'):
+                    exporters.append(OtlpSpanExporter(os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT'),
+                                                      os.getenv('OTEL_SERVICE_NAME', 'pennylane-sync')))
+                _exporters = exporters
+    return _exporters
+
+def set_exporters(exporters: Optional[List]):
+    """Remplace les exportateurs (None : relire la configuration à la prochaine trace)"""
+    global _exporters
+    with _config_lock:
+        _exporters = exporters
+
+def flush_traces():
+    """Vide les exportateurs (fin d'exécution)"""
+    for exporter in _exporters or []:
+        exporter.flush()
+
+atexit.register(flush_traces)
+
+def _finish(span: Span, exporters: List):
+    span.end_ns = time.time_ns()
+    for exporter in exporters:
+        exporter.export(span)
+
+@contextmanager
+def trace_span(name: str, **attributes) -> Iterator[Span]:
+    """
+    Ouvre un span, enfant du span courant (ou racine d'une nouvelle trace)
+
+    Usage:
+        with trace_span('process_invoice', invoice_id=42) as span:
+            span.set_attribute('result', 'success')
+    """
+    exporters = _configured_exporters()
+    if not exporters:
+        yield NOOP_SPAN
+        return
+
+    span = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.set_error(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current_span.reset(token)
+        _finish(span, exporters)
+
+def record_span(name: str, duration: float, **attributes):
+    """Enregistre un span déjà terminé (ex: une attente), d'une durée en secondes"""
+    exporters = _configured_exporters()
+    if not exporters:
+        return
+    span = Span(name, _current_span.get(), attributes, start_ns=time.time_ns() - int(duration * 1e9))
+    _finish(span, exporters)
+
+def load_spans(path: str) -> List[Dict]:
+    """Lit un fichier de traces JSON Lines"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def summarize_slowest(spans: List[Dict], count: int = 10, root_name: Optional[str] = None) -> List[Dict]:
+    """
+    Spans racines les plus longs, avec le temps cumulé par nom de span descendant
+    (les durées d'un span et de ses propres enfants se recouvrent)
+
+    Args:
+        root_name: Ne retient que les spans racines de ce nom (ex: process_invoice)
+
+    Returns:
+        Liste de {'span': racine, 'breakdown': {nom d'enfant: durée ms}}
+    """
+    children = defaultdict(list)
+    for span in spans:
+        if span['parent_id']:
+            children[span['parent_id']].append(span)
+
+    def collect(span_id: str, breakdown: Dict[str, float]):
+        for child in children.get(span_id, []):
+            breakdown[child['name']] += child['duration_ms']
+            collect(child['span_id'], breakdown)
+
+    roots = sorted((span for span in spans
+                    if not span['parent_id'] and (root_name is None or span['name'] == root_name)),
+                   key=lambda span: -span['duration_ms'])
+    summary = []
+    for root in roots[:count]:
+        breakdown = defaultdict(float)
+        collect(root['span_id'], breakdown)
+        summary.append({'span': root, 'breakdown': dict(breakdown)})
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse d'un fichier de traces JSON Lines")
+    parser.add_argument('trace_file', help='Fichier écrit via TRACE_FILE')
+    parser.add_argument('--slowest', type=int, default=10, help='Nombre de spans racines à afficher')
+    parser.add_argument('--root', default='process_invoice',
+                        help="Nom des spans racines analysés (vide: tous, y compris les attentes entre factures)")
+    args = parser.parse_args()
+
+    spans = load_spans(args.trace_file)
+    print(f"{len(spans)} spans lus dans {args.trace_file}\n")
+    for entry in summarize_slowest(spans, args.slowest, args.root or None):
+        root = entry['span']
+        attributes = ' '.join(f"{key}={value}" for key, value in root['attributes'].items())
+        print(f"{root['duration_ms']:>10.1f} ms  {root['name']}  {attributes}"
+              f"{'  ✗ ' + root['error'] if root.get('error') else ''}")
+        for name, duration in sorted(entry['breakdown'].items(), key=lambda item: -item[1]):
+            print(f"{'':>14}{duration:>10.1f} ms  {name}")
+
+if __name__ == '__main__':
+    sys.exit(main())
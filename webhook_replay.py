@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Rejoue des événements webhook Pennylane enregistrés (JSON Lines)
+vers un serveur lancé avec `python main.py --serve`
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import requests
+
+from webhook_server import WEBHOOK_PATH, SIGNATURE_HEADER, compute_signature
+
+def replay_events(events_file: str, url: str, delay: float = 0.0) -> int:
+    """
+    Envoie chaque événement du fichier au serveur de webhooks
+
+    Returns:
+        Nombre d'événements refusés par le serveur
+    """
+    secret = os.getenv('PENNYLANE_WEBHOOK_SECRET')
+    sent_count = 0
+    error_count = 0
+
+    with open(events_file, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+
+            body = line.encode('utf-8')
+            headers = {'Content-Type': 'application/json'}
+            if secret:
+                headers[SIGNATURE_HEADER] = compute_signature(secret, body)
+
+            try:
+                response = requests.post(url, data=body, headers=headers, timeout=10)
+                if response.status_code == 202:
+                    sent_count += 1
+                    print(f"✓ Événement {line_number}: {response.json().get('received')}")
+                else:
+                    error_count += 1
+                    print(f"✗ Événement {line_number}: HTTP {response.status_code} - {response.text}")
+            except requests.exceptions.RequestException as e:
+                error_count += 1
+                print(f"✗ Événement {line_number}: {e}")
+
+            if delay:
+                time.sleep(delay)
+
+    print(f"\n{sent_count} événement(s) envoyé(s), {error_count} erreur(s)")
+    return error_count
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description='Rejeu des webhooks Pennylane enregistrés')
+    parser.add_argument('events_file', help='Fichier JSON Lines des événements (voir WEBHOOK_RECORD_FILE)')
+    parser.add_argument('--url', default=f"http://localhost:{os.getenv('WEBHOOK_PORT', '8080')}{WEBHOOK_PATH}",
+                        help='URL du serveur de webhooks')
+    parser.add_argument('--delay', type=float, default=0.0, help='Délai entre deux événements (secondes)')
+    args = parser.parse_args()
+
+    error_count = replay_events(args.events_file, args.url, args.delay)
+    sys.exit(1 if error_count else 0)
+
+if __name__ == "__main__":
+    main()
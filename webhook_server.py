@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Serveur de webhooks Pennylane
+Reçoit les événements de modification de factures, les place dans une
+file persistante et les traite au fil de l'eau avec l'intégration existante.
+Les tâches en attente (écriture différée, recopie vers Google Sheets) sont
+écrites dès que la file est vide, et à l'arrêt du serveur.
+"""
+
+import os
+import hmac
+import json
+import hashlib
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional
+
+from invoice_queue import DurableInvoiceQueue
+
+WEBHOOK_PATH = '/webhooks/pennylane'
+SIGNATURE_HEADER = 'X-Webhook-Signature'
+
+def extract_invoice_ids(payload) -> List[str]:
+    """
+    Extrait les IDs de factures d'un événement webhook
+
+    Formats acceptés :
+    - {"data": {"id": 123}} ou {"data": {"customer_invoice": {"id": 123}}}
+    - {"customer_invoice": {"id": 123}} ou {"invoice_id": 123}
+    - une liste d'événements de ces formes
+    """
+    if isinstance(payload, list):
+        ids = []
+        for event in payload:
+            ids.extend(extract_invoice_ids(event))
+        return ids
+
+    if not isinstance(payload, dict):
+        return []
+
+    if payload.get('invoice_id') is not None:
+        return [str(payload['invoice_id'])]
+
+    for key in ('customer_invoice', 'data'):
+        item = payload.get(key)
+        if isinstance(item, dict):
+            ids = extract_invoice_ids(item)
+            if ids:
+                return ids
+            if item.get('id') is not None:
+                return [str(item['id'])]
+
+    return []
+
+def compute_signature(secret: str, body: bytes) -> str:
+    """Calcule la signature HMAC-SHA256 d'un corps de requête"""
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+class PennylaneWebhookServer:
+    """Serveur HTTP recevant les webhooks Pennylane et traitant la file associée"""
+
+    def __init__(self, process_invoice: Callable[[str], bool],
+                 queue: Optional[DurableInvoiceQueue] = None,
+                 host: Optional[str] = None, port: Optional[int] = None,
+                 flush: Optional[Callable[[], None]] = None):
+        self.process_invoice = process_invoice
+        self.flush = flush
+        self.queue = queue or DurableInvoiceQueue()
+        self.host = host or os.getenv('WEBHOOK_HOST', '0.0.0.0')
+        self.port = port if port is not None else int(os.getenv('WEBHOOK_PORT', '8080'))
+        self.secret = os.getenv('PENNYLANE_WEBHOOK_SECRET')
+        self.record_file = os.getenv('WEBHOOK_RECORD_FILE')
+
+        self._stop_event = threading.Event()
+        self._record_lock = threading.Lock()
+        self._worker = None
+        self._http_thread = None
+        self.httpd = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self.port = self.httpd.server_address[1]
+
+    def _make_handler(self):
+        server = self
+
+        class WebhookHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/health':
+                    self._send_json(200, {'status': 'ok', 'pending': server.queue.pending_count()})
+                else:
+                    self._send_json(404, {'error': 'not found'})
+
+            def do_POST(self):
+                if self.path != WEBHOOK_PATH:
+                    self._send_json(404, {'error': 'not found'})
+                    return
+
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+
+                if server.secret:
+                    expected = compute_signature(server.secret, body)
+                    if not hmac.compare_digest(expected, self.headers.get(SIGNATURE_HEADER, '')):
+                        self._send_json(401, {'error': 'invalid signature'})
+                        return
+
+                try:
+                    payload = json.loads(body or b'{}')
+                except json.JSONDecodeError:
+                    self._send_json(400, {'error': 'invalid json'})
+                    return
+
+                server.record_event(payload)
+                event_type = payload.get('event') if isinstance(payload, dict) else None
+                invoice_ids = extract_invoice_ids(payload)
+                queued = [invoice_id for invoice_id in invoice_ids if server.queue.put(invoice_id, event_type)]
+
+                self._send_json(202, {'received': invoice_ids, 'queued': queued})
+
+            def _send_json(self, status: int, data):
+                content = json.dumps(data).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                print(f"[Webhook] {self.address_string()} - {format % args}")
+
+        return WebhookHandler
+
+    def record_event(self, payload):
+        """Enregistre l'événement brut (JSON Lines) pour pouvoir le rejouer"""
+        if not self.record_file:
+            return
+        with self._record_lock:
+            with open(self.record_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(payload, ensure_ascii=False) + '\n')
+
+    def _flush(self):
+        """Écrit les tâches en attente (une erreur n'arrête pas le worker)"""
+        if self.flush is None:
+            return
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"[Webhook] ⚠ Écriture des tâches en attente échouée: {e}")
+
+    def _work(self):
+        """Boucle du worker : traite les factures de la file une par une"""
+        processed = False
+        while not self._stop_event.is_set():
+            entry = self.queue.get(timeout=1)
+            if entry is None:
+                # File vide après un traitement (factures remises en file comprises)
+                if processed:
+                    self._flush()
+                    processed = False
+                continue
+
+            invoice_id = entry['invoice_id']
+            print(f"\n[Webhook] Traitement de la facture {invoice_id} ({datetime.now().strftime('%H:%M:%S')})")
+            try:
+                success = self.process_invoice(invoice_id)
+                error = '' if success else 'Échec du traitement'
+            except Exception as e:
+                success = False
+                error = str(e)
+
+            if success:
+                self.queue.ack(entry['id'])
+            elif self.queue.nack(entry['id'], error):
+                print(f"[Webhook] ⚠ Facture {invoice_id} remise en file: {error}")
+            else:
+                print(f"[Webhook] ✗ Facture {invoice_id} abandonnée après {self.queue.max_attempts} tentatives: {error}")
+
+            # Une rafale d'événements est écrite en un seul lot, dès que la file est vide
+            processed = True
+            if self.queue.pending_count() == 0:
+                self._flush()
+                processed = False
+
+    def start(self):
+        """Démarre le worker et le serveur HTTP en arrière-plan"""
+        self._worker = threading.Thread(target=self._work, name='webhook-worker', daemon=True)
+        self._worker.start()
+        self._http_thread = threading.Thread(target=self.httpd.serve_forever, name='webhook-http', daemon=True)
+        self._http_thread.start()
+        print(f"✓ Serveur de webhooks démarré sur http://{self.host}:{self.port}{WEBHOOK_PATH}")
+
+    def serve_forever(self):
+        """Démarre le serveur et bloque jusqu'à l'interruption (Ctrl+C)"""
+        self.start()
+        try:
+            self._stop_event.wait()
+        except KeyboardInterrupt:
+            print("\nArrêt du serveur de webhooks...")
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Arrête le serveur HTTP et le worker, puis écrit les tâches en attente"""
+        self._stop_event.set()
+        if self._http_thread:
+            self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._worker:
+            self._worker.join(timeout=5)
+        self._flush()